@@ -1,35 +1,449 @@
-from collections import OrderedDict
-from functools import wraps
-from typing import Callable, Tuple, Any
+from collections import Counter
+from functools import partial, wraps
+import logging
+import threading
+import time
+from typing import Callable, Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+from weakref import WeakSet
+
+from .cache_policies import (
+    MISSING,
+    Cache,
+    CacheStats,
+    ShardedCache,
+    make_cache,
+    make_sharded_cache,
+)
+from .disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# All the functions decorated with `cache_results` that are still alive.
+_registry: "WeakSet[Callable]" = WeakSet()
+
+# A single argument of these types is its own key, as no tuple key can equal it.
+_FAST_TYPES = frozenset({int, str})
+
+
+class _KwargsMark:
+    """
+    Separates the positional and the keyword arguments in a key. It is
+    pickled by reference, so keys stored on disk cannot be confused with
+    keys containing other objects.
+    """
+
+    __slots__ = ()
+
+    def __reduce__(self) -> str:
+        return "_KWARGS_MARK"
+
+
+_KWARGS_MARK = _KwargsMark()
+
+
+class CacheInfo(NamedTuple):
+    """
+    The statistics of a cached function, returned by its `cache_info()`.
+
+    Attributes
+    ----------
+    hits : int
+        The number of calls answered from the cache.
+    misses : int
+        The number of calls that computed the result.
+    evictions : int
+        The number of results evicted or expired.
+    max_size : int or None
+        The maximum number of cached results, None if unbounded.
+    size : int
+        The current number of cached results.
+    average_compute_time : float
+        The average time to compute a result, in seconds.
+    time_saved : float
+        The estimated time saved by the hits, in seconds.
+    """
+
+    hits: int
+    misses: int
+    evictions: int
+    max_size: Optional[int]
+    size: int
+    average_compute_time: float
+    time_saved: float
+
+
+class HotKeySampler:
+    """
+    Counts the keys of every `every`-th call to find the most used keys.
+
+    The counts are approximate: only a sample of the calls is counted, and
+    when more than `max_keys` keys are tracked, the less used half is
+    forgotten. The counts are guarded by a lock, so the sampler can be
+    shared by threads; the hook is called outside the lock.
+
+    Parameters
+    ----------
+    every : int
+        The sampling interval in calls.
+    hook : Callable[[Hashable], Any], optional
+        Called with the key of every sampled call.
+    max_keys : int, optional
+        The maximum number of tracked keys. Defaults to 1000.
+    """
+
+    def __init__(
+        self,
+        every: int,
+        hook: Optional[Callable[[Hashable], Any]] = None,
+        max_keys: int = 1000,
+    ) -> None:
+        self.every = every
+        self.hook = hook
+        self.max_keys = max_keys
+        self.counts: Counter = Counter()
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def record(self, key: Hashable) -> None:
+        """
+        Counts a call if it falls into the sample.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key of the call.
+        """
+        with self._lock:
+            self._calls += 1
+            if self._calls % self.every:
+                return
+            counts = self.counts
+            counts[key] += 1
+            if len(counts) > self.max_keys:
+                self.counts = Counter(dict(counts.most_common(self.max_keys // 2)))
+        if self.hook is not None:
+            self.hook(key)
+
+    def hot_keys(self, n: int = 10) -> List[Tuple[Hashable, int]]:
+        """
+        Returns the most often sampled keys.
+
+        Parameters
+        ----------
+        n : int
+            The number of keys.
+
+        Returns
+        -------
+        list of (Hashable, int)
+            The keys with their sample counts, most common first.
+        """
+        with self._lock:
+            return self.counts.most_common(n)
+
+    def clear(self) -> None:
+        """
+        Forgets all the counts.
+        """
+        with self._lock:
+            self.counts = Counter()
+            self._calls = 0
+
+
+def make_key(args: Tuple, kwargs: Dict[str, Any], typed: bool = False) -> Hashable:
+    """
+    Builds the cache key of a call from its arguments.
+
+    Calls without keyword arguments are keyed by the tuple of their
+    positional arguments, or by the argument itself if it is the only one and
+    an int or a str, so no new object is allocated. The keyword arguments are
+    added as a frozenset, so their order does not matter.
+
+    Parameters
+    ----------
+    args : tuple
+        The positional arguments.
+    kwargs : dict
+        The keyword arguments.
+    typed : bool
+        Whether the types of the arguments are part of the key, so that, for
+        example, `f(1)` and `f(1.0)` are cached separately.
+
+    Returns
+    -------
+    Hashable
+        The key.
+    """
+    key = args
+    if kwargs:
+        key += (_KWARGS_MARK, frozenset(kwargs.items()))
+    if typed:
+        key += tuple(map(type, args))
+        if kwargs:
+            key += (frozenset((name, type(value)) for name, value in kwargs.items()),)
+        return key
+    if len(key) == 1 and type(key[0]) in _FAST_TYPES:
+        return key[0]
+    return key
+
+
+def registered_caches() -> List[Callable]:
+    """
+    Returns all the live functions decorated with `cache_results`.
+
+    Returns
+    -------
+    list of Callable
+        The cached functions, sorted by their qualified names. Each has the
+        `cache_info()` and `cache_clear()` methods.
+    """
+    return sorted(_registry, key=lambda func: func.__qualname__)
+
+
+def _make_info(
+    stats: CacheStats, evictions: int, max_size: Optional[int], size: int
+) -> CacheInfo:
+    """
+    Builds the statistics of a cached function from its counters.
+
+    Parameters
+    ----------
+    stats : CacheStats
+        The counters of the function.
+    evictions : int
+        The number of evictions of the cache.
+    max_size : int, optional
+        The maximum size of the cache.
+    size : int
+        The current size of the cache.
+
+    Returns
+    -------
+    CacheInfo
+        The statistics.
+    """
+    average = stats.compute_time / stats.computed if stats.computed else 0.0
+    return CacheInfo(
+        stats.hits,
+        stats.misses,
+        evictions,
+        max_size,
+        size,
+        average,
+        average * stats.hits,
+    )
+
 
 # Version without the flag
-def cache_results(max_size: int = 0) -> Callable:
+def cache_results(
+    max_size: Optional[int] = 0,
+    policy: str = "lru",
+    ttl: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    thread_safe: bool = False,
+    shards: int = 8,
+    sample_every: int = 0,
+    on_sample: Optional[Callable[[Hashable], Any]] = None,
+    typed: bool = False,
+    key: Optional[Callable[..., Hashable]] = None,
+    disk: Optional[DiskCache] = None,
+) -> Callable:
     """Decorator for caching the results of a function (without a flag).
 
+    The decorated function gets the methods `cache_info()`, which returns a
+    `CacheInfo`, `cache_clear()`, which empties the cache and resets the
+    statistics, and `hot_keys(n)`, which returns the most used sampled keys.
+    All the decorated functions are listed by `registered_caches()`.
+
     Parameters
     ----------
-    max_size : int
+    max_size : int, optional
         Maximum number of cached results. Defaults to 0 (no caching).
+        None means that the number is unbounded, which leaves `ttl` or
+        `max_bytes` as the only bound of the "ttl" and "size" policies.
+    policy : str
+        The eviction policy: "lru" (least recently used, the default),
+        "lfu" (least frequently used), "ttl" (results expire `ttl` seconds
+        after they are computed) or "size" (least recently used, bounded by
+        `max_bytes`).
+    ttl : float, optional
+        The lifetime of the results in seconds, required by the "ttl" policy.
+    max_bytes : int, optional
+        The maximum estimated size of the results in bytes (as reported by
+        `sys.getsizeof`), required by the "size" policy.
+    thread_safe : bool
+        Whether the function is called from several threads. The cache is
+        then split into `shards` parts with a lock each, and concurrent
+        calls with the same missing arguments compute the result only once:
+        the other callers wait for it. The bounds are divided between the
+        shards, which evict independently. Defaults to False.
+    shards : int
+        The number of shards of a thread-safe cache. Defaults to 8. The
+        "size" policy always uses one shard, so that `max_bytes` bounds the
+        whole cache.
+    sample_every : int
+        Counts the key of every `sample_every`-th call for `hot_keys()`.
+        Defaults to 0 (no sampling).
+    on_sample : Callable[[Hashable], Any], optional
+        Called with the key of every sampled call.
+    typed : bool
+        Whether arguments of different types are cached separately, for
+        example `f(1)` and `f(1.0)`. Defaults to False.
+    key : Callable[..., Hashable], optional
+        Called with the arguments of every call to build its cache key
+        instead of `make_key`. Useful when only some of the arguments affect
+        the result, or when a cheaper key is known.
+    disk : DiskCache, optional
+        The persistent second tier: the results missing in memory are looked
+        up there before they are computed, and the computed results are
+        stored there. The keys include the qualified name of the function,
+        so several functions may share a `DiskCache` if their names differ.
+        `cache_clear()` does not clear it. The statistics count the disk
+        hits as misses, with the time to read the result as compute time.
+        A result that cannot be stored on disk is logged and still returned
+        and cached in memory.
+
+    Raises
+    ------
+    ValueError
+        If `max_size` or `sample_every` is negative, `shards` is less than
+        1, the policy is unknown, or its parameter is missing, or if another
+        policy, `ttl`, `max_bytes` or `disk` is given with `max_size` 0.
     """
+    if max_size is not None and max_size < 0:
+        raise ValueError("max_size must not be negative.")
+    if max_size == 0 and (policy != "lru" or ttl is not None or max_bytes is not None):
+        raise ValueError(
+            "max_size=0 disables caching, use max_size=None to bound the cache "
+            "only by the policy."
+        )
+    if shards < 1:
+        raise ValueError("shards must be at least 1.")
+    if sample_every < 0:
+        raise ValueError("sample_every must not be negative.")
+    if disk is not None and max_size == 0:
+        raise ValueError("disk requires a memory cache, max_size must not be 0.")
+    # Checks the arguments before any function is decorated
+    make_cache(policy, max_size, ttl, max_bytes)
 
     def decorator(func: Callable) -> Callable:
-        cache: OrderedDict[Tuple, Any] = OrderedDict()
+        sampler = HotKeySampler(sample_every, on_sample) if sample_every else None
+        stats = CacheStats()
+        cache: Optional[Cache] = None
+        shared: Optional[ShardedCache] = None
+
+        custom_keys = typed or key is not None
+
+        key_of: Callable[[Tuple, Dict[str, Any]], Hashable]
+        if key is not None:
+            key_of = lambda args, kwargs: key(*args, **kwargs)  # noqa: E731
+        else:
+            key_of = partial(make_key, typed=typed)
+
+        namespace = f"{func.__module__}.{func.__qualname__}"
+
+        def load(cache_key: Hashable, args: Tuple, kwargs: Dict[str, Any]) -> Any:
+            assert disk is not None
+            disk_key = (namespace, cache_key)
+            result = disk.get(disk_key)
+            if result is MISSING:
+                result = func(*args, **kwargs)
+                try:
+                    disk.put(disk_key, result)
+                except Exception:  # the result is still returned and kept in memory
+                    logger.exception(
+                        "Cannot store the result of %s on disk.", namespace
+                    )
+            return result
+
+        # The cached wrappers inline `make_key` for untyped keys to save a call.
+        if max_size == 0:
+
+            @wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if sampler is not None:
+                    sampler.record(key_of(args, kwargs))
+                stats.misses += 1
+                return func(*args, **kwargs)
+
+        elif thread_safe:
+            shared = make_sharded_cache(shards, policy, max_size, ttl, max_bytes)
+            get_or_compute = shared.get_or_compute
+
+            @wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if custom_keys:
+                    cache_key = key_of(args, kwargs)
+                elif kwargs:
+                    cache_key = args + (_KWARGS_MARK, frozenset(kwargs.items()))
+                elif len(args) == 1 and type(args[0]) in _FAST_TYPES:
+                    cache_key = args[0]
+                else:
+                    cache_key = args
+                if sampler is not None:
+                    sampler.record(cache_key)
+                if disk is None:
+                    return get_or_compute(cache_key, func, args, kwargs)
+                return get_or_compute(cache_key, load, (cache_key, args, kwargs), {})
+
+        else:
+            cache = make_cache(policy, max_size, ttl, max_bytes)
+            get, put = cache.get, cache.put
+
+            @wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if custom_keys:
+                    cache_key = key_of(args, kwargs)
+                elif kwargs:
+                    cache_key = args + (_KWARGS_MARK, frozenset(kwargs.items()))
+                elif len(args) == 1 and type(args[0]) in _FAST_TYPES:
+                    cache_key = args[0]
+                else:
+                    cache_key = args
+                if sampler is not None:
+                    sampler.record(cache_key)
+                result = get(cache_key)
+                if result is not MISSING:
+                    stats.hits += 1
+                    return result  # Return cached result
 
-        @wraps(func)
-        def wrapper(*args: Any, **kwargs: Any) -> Any:
-            key = (args, frozenset(kwargs.items()))
-            if key in cache:
-                return cache[key]  # Return cached result
+                stats.misses += 1
+                start = time.perf_counter()
+                if disk is None:
+                    result = func(*args, **kwargs)  # Compute the result
+                else:
+                    result = load(cache_key, args, kwargs)  # Read or compute it
+                stats.compute_time += time.perf_counter() - start
+                stats.computed += 1
+                put(cache_key, result)  # Store result, evicting by the policy
+                return result  # Return the computed result
 
-            result = func(*args, **kwargs)  # Compute the result
-            cache[key] = result  # Store result in cache
+        def cache_info() -> CacheInfo:
+            if shared is not None:
+                return _make_info(shared.stats, shared.evictions, max_size, len(shared))
+            if cache is not None:
+                return _make_info(stats, cache.evictions, max_size, len(cache))
+            return _make_info(stats, 0, max_size, 0)
 
-            # Remove old entries if the cache exceeds max_size
-            if max_size > 0 and len(cache) > max_size:
-                cache.popitem(last=False)  # Remove the oldest entry (FI-FO)
+        def cache_clear() -> None:
+            nonlocal stats
+            if shared is not None:
+                shared.clear()
+            if cache is not None:
+                cache.clear()
+                cache.evictions = 0
+            stats = CacheStats()
+            if sampler is not None:
+                sampler.clear()
 
-            return result  # Return the computed result
+        def hot_keys(n: int = 10) -> List[Tuple[Hashable, int]]:
+            return sampler.hot_keys(n) if sampler is not None else []
 
+        wrapped: Any = wrapper
+        wrapped.cache_info = cache_info
+        wrapped.cache_clear = cache_clear
+        wrapped.hot_keys = hot_keys
+        _registry.add(wrapper)
         return wrapper
 
     return decorator
@@ -0,0 +1,598 @@
+from collections import OrderedDict
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Returned by `Cache.get` for missing keys, since None is a valid cached result.
+MISSING: Any = object()
+
+POLICIES = ("lru", "lfu", "ttl", "size")
+
+
+class Cache:
+    """
+    The base class of the caches used by `cache_results`.
+
+    All the operations take O(1) time, amortized for the caches that drop
+    several entries at once.
+
+    Parameters
+    ----------
+    max_size : int, optional
+        The maximum number of entries, None if unbounded.
+
+    Attributes
+    ----------
+    max_size : int or None
+        The maximum number of entries.
+    evictions : int
+        The number of entries dropped to make room or because they expired.
+    """
+
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        self.max_size = max_size
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Returns the value cached for the key.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key.
+
+        Returns
+        -------
+        Any
+            The cached value, or `MISSING` if there is none.
+        """
+        raise NotImplementedError
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Caches the value for the key, evicting other entries if needed.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key.
+        value : Any
+            The value.
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """
+        Removes all the entries.
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class LRUCache(Cache):
+    """
+    A cache that evicts the least recently used entry.
+    """
+
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        super().__init__(max_size)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        if self.max_size is not None and len(data) > self.max_size:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class LFUCache(Cache):
+    """
+    A cache that evicts the least frequently used entry, and the least
+    recently used one among entries with equal counts.
+
+    The keys are kept in buckets by their use count, so finding the entry to
+    evict does not need a search.
+    """
+
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        super().__init__(max_size)
+        self._values: Dict[Hashable, Any] = {}
+        self._counts: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, "OrderedDict[Hashable, None]"] = {}
+        self._min_count = 0
+
+    def _touch(self, key: Hashable) -> None:
+        """
+        Moves the key to the bucket of the next use count.
+
+        Parameters
+        ----------
+        key : Hashable
+            The cached key.
+        """
+        count = self._counts[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def get(self, key: Hashable) -> Any:
+        value = self._values.get(key, MISSING)
+        if value is not MISSING:
+            self._touch(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if key in self._values:
+            self._values[key] = value
+            self._touch(key)
+            return
+        if self.max_size is not None and len(self._values) >= self.max_size:
+            bucket = self._buckets[self._min_count]
+            evicted, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self._buckets[self._min_count]
+            del self._values[evicted]
+            del self._counts[evicted]
+            self.evictions += 1
+        self._values[key] = value
+        self._counts[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_count = 1
+
+    def clear(self) -> None:
+        self._values.clear()
+        self._counts.clear()
+        self._buckets.clear()
+        self._min_count = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class TTLCache(Cache):
+    """
+    A cache whose entries expire `ttl` seconds after they are stored.
+
+    All the entries live equally long, so the insertion order is also the
+    order of expiration, and expired entries are dropped from the front. If
+    the cache is full, the entry closest to expiration is evicted.
+
+    Parameters
+    ----------
+    ttl : float
+        The lifetime of the entries in seconds.
+    max_size : int, optional
+        The maximum number of entries, None if unbounded.
+    timer : Callable[[], float], optional
+        The clock, `time.monotonic` by default.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_size: Optional[int] = None,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(max_size)
+        self.ttl = ttl
+        self._timer = timer
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def _expire(self, now: float) -> None:
+        """
+        Drops the expired entries.
+
+        Parameters
+        ----------
+        now : float
+            The current time.
+        """
+        data = self._data
+        while data:
+            key, (expires, _) = next(iter(data.items()))
+            if expires > now:
+                break
+            del data[key]
+            self.evictions += 1
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return MISSING
+        if entry[0] <= self._timer():
+            del self._data[key]
+            self.evictions += 1
+            return MISSING
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        now = self._timer()
+        data = self._data
+        data.pop(key, None)  # a new value lives for a new ttl
+        data[key] = (now + self.ttl, value)
+        self._expire(now)
+        if self.max_size is not None and len(data) > self.max_size:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SizeCache(Cache):
+    """
+    A cache bounded by the estimated size of its values in bytes. The least
+    recently used entries are evicted first.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The maximum total size of the values.
+    max_size : int, optional
+        The maximum number of entries, None if unbounded.
+    sizeof : Callable[[Any], int], optional
+        The size estimate of a value, `sys.getsizeof` by default. It does
+        not include the objects referenced by the value.
+
+    Attributes
+    ----------
+    total_bytes : int
+        The estimated size of the cached values.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        max_size: Optional[int] = None,
+        sizeof: Callable[[Any], int] = sys.getsizeof,
+    ) -> None:
+        super().__init__(max_size)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Tuple[int, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        try:
+            _, value = self._data[key]
+        except KeyError:
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value)
+        data = self._data
+        old = data.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[0]
+        if size > self.max_bytes:
+            return  # would evict everything else and still not fit
+        data[key] = (size, value)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes or (
+            self.max_size is not None and len(data) > self.max_size
+        ):
+            _, (evicted_size, _) = data.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def make_cache(
+    policy: str,
+    max_size: Optional[int],
+    ttl: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+) -> Cache:
+    """
+    Creates a cache with the given eviction policy.
+
+    Parameters
+    ----------
+    policy : str
+        One of "lru", "lfu", "ttl" and "size".
+    max_size : int, optional
+        The maximum number of entries, None if unbounded.
+    ttl : float, optional
+        The lifetime of the entries in seconds, required by "ttl".
+    max_bytes : int, optional
+        The maximum size of the values in bytes, required by "size".
+
+    Returns
+    -------
+    Cache
+        The new cache.
+
+    Raises
+    ------
+    ValueError
+        If the policy is unknown or its parameter is missing.
+    """
+    if policy == "lru":
+        return LRUCache(max_size)
+    if policy == "lfu":
+        return LFUCache(max_size)
+    if policy == "ttl":
+        if ttl is None:
+            raise ValueError("The ttl policy requires ttl.")
+        return TTLCache(ttl, max_size)
+    if policy == "size":
+        if max_bytes is None:
+            raise ValueError("The size policy requires max_bytes.")
+        return SizeCache(max_bytes, max_size)
+    raise ValueError(f"Unknown policy {policy!r}, expected one of {POLICIES}.")
+
+
+class CacheStats:
+    """
+    The counters of a cached function.
+
+    Attributes
+    ----------
+    hits : int
+        The number of calls answered from the cache, including the calls
+        that waited for a concurrent computation of the same result.
+    misses : int
+        The number of calls that computed the result.
+    computed : int
+        The number of results computed without an exception.
+    compute_time : float
+        The total time spent computing these results, in seconds.
+    """
+
+    __slots__ = ("hits", "misses", "computed", "compute_time")
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.computed = 0
+        self.compute_time = 0.0
+
+    def merge(self, other: "CacheStats") -> None:
+        """
+        Adds the counters of another object to this one.
+
+        Parameters
+        ----------
+        other : CacheStats
+            The counters to add.
+        """
+        self.hits += other.hits
+        self.misses += other.misses
+        self.computed += other.computed
+        self.compute_time += other.compute_time
+
+
+class _Flight:
+    """
+    A computation of a missing value that other threads can wait for.
+    """
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = MISSING
+        self.error: Optional[BaseException] = None
+
+
+class ShardedCache:
+    """
+    A thread-safe cache split into shards with a lock each.
+
+    Keys are spread over the shards by their hash, so threads working with
+    different keys rarely wait for the same lock. Every shard evicts by its
+    own policy, so the eviction order is only approximately global.
+
+    A missing value is computed once even if several threads ask for it at
+    the same time (single flight): the first thread computes it without
+    holding the lock, and the others wait for its result or its exception.
+
+    Parameters
+    ----------
+    shards : list of Cache
+        The caches of the shards.
+    """
+
+    def __init__(self, shards: List[Cache]) -> None:
+        self._shards = shards
+        self._locks = [threading.Lock() for _ in shards]
+        self._flights: List[Dict[Hashable, _Flight]] = [{} for _ in shards]
+        self._stats = [CacheStats() for _ in shards]  # guarded by the shard locks
+
+    def get_or_compute(
+        self, key: Hashable, func: Callable[..., Any], args: Tuple, kwargs: Dict
+    ) -> Any:
+        """
+        Returns the value cached for the key, computing it if it is missing.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key.
+        func : Callable
+            The function that computes the value.
+        args : tuple
+            The positional arguments of the function.
+        kwargs : dict
+            The keyword arguments of the function.
+
+        Returns
+        -------
+        Any
+            The cached or the computed value.
+
+        Raises
+        ------
+        Exception
+            Any exception raised by the function, in all the waiting threads.
+        """
+        index = hash(key) % len(self._shards)
+        shard = self._shards[index]
+        lock = self._locks[index]
+        flights = self._flights[index]
+        stats = self._stats[index]
+        with lock:
+            value = shard.get(key)
+            if value is not MISSING:
+                stats.hits += 1
+                return value
+            flight = flights.get(key)
+            if flight is None:
+                leader = flight = flights[key] = _Flight()
+                stats.misses += 1
+            else:
+                leader = None
+                stats.hits += 1
+        if leader is None:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        start = time.perf_counter()
+        try:
+            value = func(*args, **kwargs)
+        except BaseException as error:
+            leader.error = error
+            with lock:
+                del flights[key]
+            raise
+        else:
+            leader.result = value
+            elapsed = time.perf_counter() - start
+            with lock:
+                shard.put(key, value)
+                del flights[key]
+                stats.computed += 1
+                stats.compute_time += elapsed
+            return value
+        finally:
+            leader.done.set()
+
+    @property
+    def evictions(self) -> int:
+        """
+        Returns the number of evicted entries in all the shards.
+
+        Returns
+        -------
+        int
+            The number of evictions.
+        """
+        return sum(shard.evictions for shard in self._shards)
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        Returns the counters of all the shards.
+
+        Returns
+        -------
+        CacheStats
+            The sum of the counters.
+        """
+        total = CacheStats()
+        for stats, lock in zip(self._stats, self._locks):
+            with lock:
+                total.merge(stats)
+        return total
+
+    def clear(self) -> None:
+        """
+        Removes all the entries and resets the counters. Computations in
+        flight are not affected.
+        """
+        for index, (shard, lock) in enumerate(zip(self._shards, self._locks)):
+            with lock:
+                shard.clear()
+                shard.evictions = 0
+                self._stats[index] = CacheStats()
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+
+def make_sharded_cache(
+    shards: int,
+    policy: str,
+    max_size: Optional[int],
+    ttl: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+) -> ShardedCache:
+    """
+    Creates a thread-safe cache with the given eviction policy.
+
+    The bounds on the number of entries are divided between the shards, and
+    there are never more shards than entries. The "size" policy always uses
+    a single shard, so that `max_bytes` bounds the whole cache and any value
+    that fits into it can be cached.
+
+    Parameters
+    ----------
+    shards : int
+        The number of shards.
+    policy : str
+        One of "lru", "lfu", "ttl" and "size".
+    max_size : int, optional
+        The maximum number of entries, None if unbounded.
+    ttl : float, optional
+        The lifetime of the entries in seconds, required by "ttl".
+    max_bytes : int, optional
+        The maximum size of the values in bytes, required by "size".
+
+    Returns
+    -------
+    ShardedCache
+        The new cache.
+
+    Raises
+    ------
+    ValueError
+        If `shards` is less than 1, the policy is unknown or its parameter
+        is missing.
+    """
+    if shards < 1:
+        raise ValueError("shards must be at least 1.")
+    if policy == "size":
+        shards = 1
+    if max_size is not None:
+        shards = max(min(shards, max_size), 1)
+    shard_size = None if max_size is None else -(-max_size // shards)
+    return ShardedCache(
+        [make_cache(policy, shard_size, ttl, max_bytes) for _ in range(shards)]
+    )
@@ -0,0 +1,300 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Any, Hashable, List, Optional, Tuple, Union
+
+from .cache_policies import MISSING
+
+logger = logging.getLogger(__name__)
+
+# Keys are always pickled with this protocol, so files stay readable.
+KEY_PROTOCOL = 4
+
+# The number of the least recently used rows read at once to evict.
+EVICTION_BATCH = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key BLOB PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+"""
+
+
+def _canonical(value: Any) -> Any:
+    """
+    Replaces the frozensets in a key by lists sorted by their pickles, so
+    equal keys pickle the same in every process. Keys never contain lists,
+    so the result is unambiguous.
+
+    Parameters
+    ----------
+    value : Any
+        The key or its part.
+
+    Returns
+    -------
+    Any
+        The canonical form.
+    """
+    if type(value) is tuple:
+        return tuple(_canonical(item) for item in value)
+    if type(value) is frozenset:
+        items = [_canonical(item) for item in value]
+        items.sort(key=lambda item: pickle.dumps(item, KEY_PROTOCOL))
+        return items
+    return value
+
+
+def encode_key(key: Hashable) -> bytes:
+    """
+    Converts a cache key to the bytes stored on disk.
+
+    Parameters
+    ----------
+    key : Hashable
+        The key.
+
+    Returns
+    -------
+    bytes
+        The same bytes for equal keys of the same types, in every process.
+    """
+    return pickle.dumps(_canonical(key), KEY_PROTOCOL)
+
+
+class DiskCache:
+    """
+    A persistent cache in a sqlite3 file, the second tier of `cache_results`.
+
+    The file is opened on the first access, so creating the cache at import
+    time costs nothing. The connection is shared by all threads and guarded
+    by a lock. When a bound is exceeded, the least recently read or written
+    entries are deleted; the recency is tracked by a counter stored with the
+    entries. Every write and its evictions run in one transaction that reads
+    the totals from the file, so the bounds also hold when several processes
+    share the file.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        The path of the file, created if it does not exist.
+    max_size : int, optional
+        The maximum number of entries, None if unbounded.
+    max_bytes : int, optional
+        The maximum total length of the serialized values, None if unbounded.
+    serializer : Any
+        An object with the `dumps(value)` and `loads(data)` functions, like
+        `pickle` (the default) or `json`. Keys are always pickled.
+
+    Attributes
+    ----------
+    path : str
+        The path of the file.
+    hits : int
+        The number of values found on disk.
+    misses : int
+        The number of keys not found on disk.
+    evictions : int
+        The number of entries deleted to stay within the bounds.
+
+    Raises
+    ------
+    ValueError
+        If a bound is not positive.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, "os.PathLike[str]"],
+        max_size: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        serializer: Any = pickle,
+    ) -> None:
+        if max_size is not None and max_size < 1:
+            raise ValueError("max_size must be positive.")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes must be positive.")
+        self.path = os.fspath(path)
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.serializer = serializer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Returns the connection, opening the file on the first call. Must be
+        called with the lock held.
+        """
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Returns the value stored for the key.
+
+        A file that cannot be read counts as a miss, and so does a value that
+        cannot be deserialized, for example after the serializer or a class
+        has changed. Such a value is deleted, so it is computed again.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key.
+
+        Returns
+        -------
+        Any
+            The stored value, or `MISSING` if there is none.
+        """
+        encoded = encode_key(key)
+        with self._lock:
+            try:
+                connection = self._connect()
+                row = connection.execute(
+                    "SELECT value FROM entries WHERE key = ?", (encoded,)
+                ).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE entries SET used = (SELECT MAX(used) + 1 FROM entries)"
+                        " WHERE key = ?",
+                        (encoded,),
+                    )
+            except sqlite3.Error:
+                logger.exception("Cannot read the disk cache %s.", self.path)
+                row = None
+            if row is None:
+                self.misses += 1
+                return MISSING
+        try:
+            value = self.serializer.loads(row[0])
+        except Exception:
+            logger.exception("Cannot deserialize a value of %s.", self.path)
+            with self._lock:
+                self.misses += 1
+                try:  # unless another thread has replaced it meanwhile
+                    self._connect().execute(
+                        "DELETE FROM entries WHERE key = ? AND value = ?",
+                        (encoded, row[0]),
+                    )
+                except sqlite3.Error:
+                    logger.exception("Cannot delete from the disk cache %s.", self.path)
+            return MISSING
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Stores the value for the key, evicting other entries if needed. A
+        value larger than `max_bytes` is not stored.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key.
+        value : Any
+            The value.
+
+        Raises
+        ------
+        Exception
+            Any exception raised by the serializer for the value.
+        """
+        encoded = encode_key(key)
+        data = self.serializer.dumps(value)
+        size = len(data)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            connection = self._connect()
+            # Takes the write lock of the file, so the totals read below stay
+            # exact until the commit, even with other processes writing
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries VALUES"
+                    " (?, ?, ?, (SELECT COALESCE(MAX(used), 0) + 1 FROM entries))",
+                    (encoded, data, size),
+                )
+                self._evict(connection)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """
+        Deletes the least recently used entries until the bounds hold. Must
+        be called with the lock held, inside a write transaction.
+        """
+        if self.max_size is None and self.max_bytes is None:
+            return
+        count, total = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+
+        def over_bounds() -> bool:
+            return (self.max_size is not None and count > self.max_size) or (
+                self.max_bytes is not None and total > self.max_bytes
+            )
+
+        while over_bounds():
+            rows = connection.execute(
+                "SELECT key, size FROM entries ORDER BY used LIMIT ?",
+                (EVICTION_BATCH,),
+            ).fetchall()
+            victims: List[Tuple[bytes]] = []
+            for key, size in rows:
+                if not over_bounds():
+                    break
+                victims.append((key,))
+                count -= 1
+                total -= size
+            connection.executemany("DELETE FROM entries WHERE key = ?", victims)
+            self.evictions += len(victims)
+
+    def clear(self) -> None:
+        """
+        Deletes all the entries from the file.
+        """
+        with self._lock:
+            self._connect().execute("DELETE FROM entries")
+
+    def close(self) -> None:
+        """
+        Closes the file. It is opened again on the next access.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @property
+    def total_bytes(self) -> int:
+        """
+        Returns the total size of the stored values in bytes.
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM entries")
+            return row.fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
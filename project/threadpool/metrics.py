@@ -0,0 +1,166 @@
+from bisect import bisect_left
+import time
+from typing import Any, Dict, List, Optional
+
+# The upper bounds of the histogram buckets in seconds, the last bucket is unbounded.
+BUCKET_BOUNDS = (1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+
+
+class Histogram:
+    """
+    A histogram of durations with logarithmic buckets.
+
+    Attributes
+    ----------
+    count : int
+        The number of recorded durations.
+    total : float
+        The sum of the recorded durations in seconds.
+    maximum : float
+        The longest recorded duration in seconds.
+    buckets : list of int
+        The number of durations in every bucket of `BUCKET_BOUNDS`, plus the
+        number of durations above the last bound.
+    """
+
+    __slots__ = ("count", "total", "maximum", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, duration: float) -> None:
+        """
+        Records a duration.
+
+        Parameters
+        ----------
+        duration : float
+            The duration in seconds.
+        """
+        self.count += 1
+        self.total += duration
+        if duration > self.maximum:
+            self.maximum = duration
+        self.buckets[bisect_left(BUCKET_BOUNDS, duration)] += 1
+
+    def merge(self, other: "Histogram") -> None:
+        """
+        Adds the durations recorded by another histogram to this one.
+
+        Parameters
+        ----------
+        other : Histogram
+            The histogram to merge.
+        """
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+        for i, number in enumerate(other.buckets):
+            self.buckets[i] += number
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Returns the histogram as a dictionary.
+
+        Returns
+        -------
+        dict
+            The count, the total, the mean and the maximum duration, and the
+            buckets as a mapping from the upper bound to the count.
+        """
+        bounds: List[float] = list(BUCKET_BOUNDS) + [float("inf")]
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.maximum,
+            "buckets": dict(zip(bounds, self.buckets)),
+        }
+
+
+class WorkerStats:
+    """
+    The statistics of a single worker thread.
+
+    Every worker updates only its own statistics, so no lock is needed.
+
+    Attributes
+    ----------
+    name : str
+        The name of the thread.
+    started : float
+        The `time.monotonic()` time the thread started.
+    stopped : float or None
+        The time the thread exited, None while it runs.
+    enqueued : int
+        The number of tasks the thread put into its local deque.
+    completed : int
+        The number of tasks that returned normally.
+    failed : int
+        The number of tasks that raised an exception.
+    busy : float
+        The number of seconds spent running tasks.
+    wait_time : Histogram
+        The time the tasks spent in the queue.
+    run_time : Histogram
+        The time the tasks took to run.
+    """
+
+    __slots__ = (
+        "name",
+        "started",
+        "stopped",
+        "enqueued",
+        "completed",
+        "failed",
+        "busy",
+        "wait_time",
+        "run_time",
+    )
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started = time.monotonic()
+        self.stopped: Optional[float] = None
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.wait_time = Histogram()
+        self.run_time = Histogram()
+
+    def busy_ratio(self, now: float) -> float:
+        """
+        Returns the share of its lifetime the thread spent running tasks.
+
+        Parameters
+        ----------
+        now : float
+            The current `time.monotonic()` time.
+
+        Returns
+        -------
+        float
+            The busy ratio between 0 and 1.
+        """
+        lifetime = (self.stopped or now) - self.started
+        return min(self.busy / lifetime, 1.0) if lifetime > 0 else 0.0
+
+    def merge(self, other: "WorkerStats") -> None:
+        """
+        Adds the counters and the histograms of another worker to this one.
+
+        Parameters
+        ----------
+        other : WorkerStats
+            The statistics to merge.
+        """
+        self.enqueued += other.enqueued
+        self.completed += other.completed
+        self.failed += other.failed
+        self.busy += other.busy
+        self.wait_time.merge(other.wait_time)
+        self.run_time.merge(other.run_time)
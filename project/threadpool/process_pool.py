@@ -0,0 +1,408 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count, islice
+import multiprocessing
+from multiprocessing.connection import Connection, wait
+import pickle
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# A call sent to a worker process: the function and its arguments.
+Call = Tuple[Callable[..., Any], Tuple[Any, ...], Dict[str, Any]]
+
+
+def _work(tasks: Connection, results: Connection, inherited: List[Connection]) -> None:
+    """
+    The loop that runs in each worker process. It receives batches of calls
+    from `tasks`, runs them and sends their outcomes to `results` until it
+    gets `None` or the parent process exits.
+
+    Parameters
+    ----------
+    tasks : multiprocessing.connection.Connection
+        The pipe of `(batch_id, calls)` pairs.
+    results : multiprocessing.connection.Connection
+        The pipe of `(batch_id, payload)` pairs, where the payload is the
+        pickled list of `(succeeded, result or exception)` outcomes, so the
+        parent can fail the batch if it cannot unpickle them.
+    inherited : list of multiprocessing.connection.Connection
+        The parent ends of the pipes of this and the other workers, closed
+        first, so `tasks` reports EOF once the parent process is gone.
+    """
+    for connection in inherited:
+        connection.close()
+    while True:
+        try:
+            batch = tasks.recv()
+        except EOFError:  # the parent process exited
+            break
+        if batch is None:
+            break
+        batch_id, calls = batch
+        outcomes: List[Tuple[bool, Any]] = []
+        for fn, args, kwargs in calls:
+            try:
+                outcomes.append((True, fn(*args, **kwargs)))
+            except BaseException as error:
+                outcomes.append((False, error))
+        try:
+            payload = pickle.dumps(outcomes)
+        except Exception as error:  # a result or an exception is not picklable
+            failure = RuntimeError(f"The result could not be sent back: {error!r}")
+            payload = pickle.dumps([(False, failure)] * len(calls))
+        results.send((batch_id, payload))
+
+
+class _Worker:
+    """
+    A worker process with its own pipes, so the parent knows which batches
+    it holds and a dying worker cannot block the others.
+
+    Attributes
+    ----------
+    process : multiprocessing.Process
+        The worker process.
+    tasks : multiprocessing.connection.Connection
+        The parent end of the pipe of batches.
+    results : multiprocessing.connection.Connection
+        The parent end of the pipe of outcomes.
+    send_lock : threading.Lock
+        Serializes the writes to `tasks`.
+    batches : set of int
+        The ids of the batches sent to the worker and not finished yet.
+
+    Parameters
+    ----------
+    siblings : list of _Worker
+        The other live workers, whose pipes the new process must not keep open.
+    """
+
+    def __init__(self, siblings: List["_Worker"]) -> None:
+        task_reader, self.tasks = multiprocessing.Pipe(duplex=False)
+        self.results, result_writer = multiprocessing.Pipe(duplex=False)
+        inherited = [
+            connection
+            for worker in siblings + [self]
+            for connection in (worker.tasks, worker.results)
+        ]
+        self.process = multiprocessing.Process(
+            target=_work, args=(task_reader, result_writer, inherited), daemon=True
+        )
+        self.process.start()
+        task_reader.close()  # so writes fail once the worker is gone
+        result_writer.close()  # so reads see EOF once the worker is gone
+        self.send_lock = threading.Lock()
+        self.batches: Set[int] = set()
+
+    def close(self) -> None:
+        """
+        Closes the parent ends of the pipes.
+        """
+        self.tasks.close()
+        self.results.close()
+
+
+class ProcessPool:
+    """
+    A class that implements a pool of worker processes for CPU-bound tasks.
+
+    The pool has the interface of `ThreadPool`, but the tasks run in separate
+    processes and are not serialized by the GIL. The processes are started
+    once and kept warm until `dispose()`. Tasks and their results are sent
+    between processes with pickle, so the functions must be defined at the
+    top level of a module, and their arguments and results must be picklable.
+
+    Every batch of tasks is sent to the worker with the fewest unfinished
+    batches. If a worker process dies (crashes, is killed or exits), the
+    futures of its unfinished tasks fail with `BrokenProcessPool` and a new
+    process takes its place. A task is running as soon as it is sent, so its
+    future can no longer be cancelled.
+
+    Parameters
+    ----------
+    num_processes : int
+        The number of worker processes to create in the pool.
+
+    Attributes
+    ----------
+    num_processes : int
+        The number of worker processes in the pool.
+    processes : list of multiprocessing.Process
+        The current worker processes of the pool.
+
+    Methods
+    -------
+    enqueue(task)
+        Adds a zero-argument callable to the task queue.
+    submit(fn, *args, **kwargs)
+        Schedules a call and returns a future for its result.
+    map(fn, iterable, chunksize, timeout)
+        Applies a function to every item and returns the results in order.
+    dispose()
+        Stops the processes of the pool.
+    """
+
+    def __init__(self, num_processes: int):
+        """
+        Initializes the ProcessPool with the specified number of processes.
+
+        Parameters
+        ----------
+        num_processes : int
+            The number of worker processes to create in the pool.
+        """
+        self.num_processes = num_processes
+        self._pending: Dict[int, List[Future]] = {}  # futures by batch id
+        self._batch_ids = count()
+        self._lock = threading.Lock()  # guards `_pending` and `_workers`
+        self._disposed = False
+        self._workers: List[_Worker] = []
+        for _ in range(num_processes):
+            self._workers.append(_Worker(self._workers))
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    @property
+    def processes(self) -> List[multiprocessing.Process]:
+        with self._lock:
+            return [worker.process for worker in self._workers]
+
+    def _collect(self) -> None:
+        """
+        The method that runs in a background thread of the parent process. It
+        receives the outcomes of the batches and resolves their futures, and
+        replaces the workers that die. It exits when the last worker stops
+        after `dispose()`.
+        """
+        while True:
+            with self._lock:
+                workers = list(self._workers)
+            if not workers:
+                break
+            ready = set(
+                wait(
+                    [worker.results for worker in workers]
+                    + [worker.process.sentinel for worker in workers]
+                )
+            )
+            for worker in workers:
+                if worker.results in ready:
+                    self._receive(worker)
+            for worker in workers:
+                if worker.process.sentinel in ready:
+                    self._replace(worker)
+
+    def _receive(self, worker: _Worker) -> bool:
+        """
+        Resolves the futures of a batch finished by a worker.
+
+        Parameters
+        ----------
+        worker : _Worker
+            The worker whose results pipe is ready.
+
+        Returns
+        -------
+        bool
+            False if the pipe is closed.
+        """
+        try:
+            batch_id, payload = worker.results.recv()
+        except (EOFError, OSError):
+            return False
+        with self._lock:
+            worker.batches.discard(batch_id)
+            futures = self._pending.pop(batch_id)
+        try:
+            outcomes = pickle.loads(payload)
+        except Exception as error:  # e.g. an exception that cannot be rebuilt
+            failure = RuntimeError("The result could not be unpickled.")
+            failure.__cause__ = error
+            outcomes = [(False, failure)] * len(futures)
+        for future, (succeeded, value) in zip(futures, outcomes):
+            if succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        return True
+
+    def _replace(self, worker: _Worker) -> None:
+        """
+        Fails the unfinished tasks of a stopped worker and starts a new
+        worker in its place, unless the pool is disposed.
+
+        Parameters
+        ----------
+        worker : _Worker
+            The worker whose process has exited.
+        """
+        while worker.results.poll() and self._receive(worker):
+            pass  # the outcomes sent before the process exited
+        worker.process.join()
+        with self._lock:
+            lost = [self._pending.pop(batch_id) for batch_id in worker.batches]
+            worker.batches.clear()
+            # Closed under the lock, so a new process never inherits a reused
+            # file descriptor among the connections it closes
+            with worker.send_lock:
+                worker.close()
+            index = self._workers.index(worker)
+            del self._workers[index]
+            if not self._disposed:
+                self._workers.insert(index, _Worker(self._workers))
+        error = BrokenProcessPool(
+            f"A worker process exited with code {worker.process.exitcode} "
+            "while running the task."
+        )
+        for futures in lost:
+            for future in futures:
+                future.set_exception(error)
+
+    def _send(self, calls: List[Call]) -> List[Future]:
+        """
+        Sends a batch of calls as a single message to the worker with the
+        fewest unfinished batches.
+
+        Parameters
+        ----------
+        calls : list of (Callable, tuple, dict)
+            The functions with their positional and keyword arguments.
+
+        Returns
+        -------
+        list of concurrent.futures.Future
+            The futures for the results of the calls, already running.
+
+        Raises
+        ------
+        RuntimeError
+            If the pool has been disposed.
+        """
+        futures: List[Future] = [Future() for _ in calls]
+        for future in futures:
+            future.set_running_or_notify_cancel()
+        with self._lock:
+            if self._disposed:
+                raise RuntimeError("Cannot schedule tasks after dispose().")
+            batch_id = next(self._batch_ids)
+            worker = min(self._workers, key=lambda worker: len(worker.batches))
+            self._pending[batch_id] = futures
+            worker.batches.add(batch_id)
+        # Sent without the pool lock, so a full pipe does not block the collector
+        try:
+            with worker.send_lock:
+                worker.tasks.send((batch_id, calls))
+        except (BrokenPipeError, OSError):
+            pass  # the worker died, its batches are failed by the collector
+        except BaseException:  # the batch is not picklable
+            with self._lock:
+                worker.batches.discard(batch_id)
+                del self._pending[batch_id]
+            raise
+        return futures
+
+    def enqueue(self, task: Callable[[], Any]) -> None:
+        """
+        Adds a task to the queue for execution by a worker process.
+
+        Parameters
+        ----------
+        task : Callable[[], Any]
+            A picklable callable representing the task to be executed.
+        """
+        self._send([(task, (), {})])
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Schedules `fn(*args, **kwargs)` and returns a future for its result.
+
+        Parameters
+        ----------
+        fn : Callable
+            The picklable function to call.
+        *args, **kwargs
+            The picklable arguments to pass to the function.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            A future for the result of the call.
+        """
+        return self._send([(fn, args, kwargs)])[0]
+
+    def map(
+        self,
+        fn: Callable[[Any], Any],
+        iterable: Iterable[Any],
+        chunksize: int = 1,
+        timeout: Optional[float] = None,
+    ) -> Iterator[Any]:
+        """
+        Applies `fn` to every item of `iterable` in the pool.
+
+        All the items are scheduled immediately. Every `chunksize` items are
+        sent to a worker process as one message, which cuts the pickling and
+        the interprocess overhead for cheap functions.
+
+        Parameters
+        ----------
+        fn : Callable[[Any], Any]
+            The picklable function to apply.
+        iterable : Iterable
+            The picklable items to apply the function to.
+        chunksize : int
+            The number of items sent to a worker process at once.
+        timeout : float, optional
+            The maximum number of seconds to wait for all the results.
+
+        Returns
+        -------
+        Iterator
+            The results in the order of the items.
+
+        Raises
+        ------
+        ValueError
+            If `chunksize` is less than 1.
+        concurrent.futures.TimeoutError
+            If the results are not ready within `timeout` (raised on iteration).
+        """
+        if chunksize < 1:
+            raise ValueError("chunksize must be at least 1.")
+        end_time = None if timeout is None else time.monotonic() + timeout
+
+        items = iter(iterable)
+        futures: List[Future] = []
+        while True:
+            chunk = list(islice(items, chunksize))
+            if not chunk:
+                break
+            futures.extend(self._send([(fn, (item,), {}) for item in chunk]))
+
+        def results() -> Iterator[Any]:
+            for future in futures:
+                if end_time is None:
+                    yield future.result()
+                else:
+                    yield future.result(end_time - time.monotonic())
+
+        return results()
+
+    def dispose(self) -> None:
+        """
+        Finishes the queued tasks, then stops the worker processes and waits
+        for them to exit.
+        """
+        with self._lock:
+            if self._disposed:
+                return
+            self._disposed = True
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                with worker.send_lock:
+                    worker.tasks.send(None)
+            except OSError:
+                pass  # the worker died, the collector removes it
+        self._collector.join()  # returns once all the workers have exited
@@ -1,5 +1,54 @@
+import asyncio
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+import heapq
+from itertools import count, islice
+import logging
+import queue
+import random
 import threading
-from typing import Callable, Any, List
+import time
+from typing import (
+    Callable,
+    Any,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .metrics import WorkerStats
+
+logger = logging.getLogger(__name__)
+
+# A queued task, the `time.monotonic()` time it was enqueued and the future of
+# its result if it was scheduled with `submit_task`.
+QueuedTask = Tuple[Callable[[], Any], float, Optional[Future]]
+# A task in the heap of the priority mode: the sort key, the sequence number
+# that keeps equal keys in FIFO order, the queued task and its deadline.
+HeapEntry = Tuple[float, int, QueuedTask, Optional[float]]
+# A callback run after every task with its wait time, its run time and the
+# exception it raised, if any.
+TaskHook = Callable[[float, float, Optional[BaseException]], Any]
+
+
+def _expire(future: Future) -> None:
+    """
+    Fails the future of a task that missed its deadline.
+
+    Parameters
+    ----------
+    future : concurrent.futures.Future
+        The future of the task.
+    """
+    if future.set_running_or_notify_cancel():
+        future.set_exception(TimeoutError("The task missed its deadline."))
 
 
 class ThreadPool:
@@ -10,80 +59,1169 @@ class ThreadPool:
     ----------
     num_threads : int
         The number of threads to create in the pool.
+    max_queue_size : int, optional
+        The maximum number of queued tasks. Defaults to 0 (unbounded).
+    work_stealing : bool, optional
+        Whether every thread keeps a local deque of the tasks enqueued by the
+        tasks it runs. Defaults to False.
+    max_threads : int, optional
+        The maximum number of threads. Defaults to `num_threads` (fixed size).
+    idle_timeout : float, optional
+        The number of seconds after which an idle extra thread exits.
+    grow_threshold : int, optional
+        The number of queued tasks not covered by idle threads that starts an
+        extra thread. Defaults to 1.
+    max_wait : float, optional
+        The number of seconds the head of the queue may wait before an extra
+        thread is started. Not checked by default.
+    scheduling : str, optional
+        "fifo" (the default) or "priority" to run tasks by priority.
+    aging : float, optional
+        In priority mode, the priority gained by a task per second of waiting.
+        Defaults to 0 (no aging).
+    metrics : bool, optional
+        Whether to time the tasks for the latency statistics, the busy ratios
+        and the hooks. Defaults to False.
+    batch_size : int, optional
+        The maximum number of tasks a thread takes from the queue at once.
+        Defaults to 1.
 
     Attributes
     ----------
     num_threads : int
-        The number of threads in the pool.
-    tasks : list of Callable
-        The list of tasks to be executed by the threads.
+        The minimum number of threads in the pool.
+    max_threads : int
+        The maximum number of threads in the pool.
+    size : int
+        The current number of threads in the pool.
+    max_queue_size : int
+        The maximum number of queued tasks, 0 if unbounded.
+    tasks : collections.deque of (Callable, float)
+        The queue of tasks to be executed by the threads in FIFO mode, with
+        the times they were enqueued.
+    scheduling : str
+        The order in which queued tasks are run, "fifo" or "priority".
     lock : threading.Lock
-        A lock to synchronize access to the tasks list.
+        The lock that guards the task queue, shared by both conditions.
     cond : threading.Condition
         A condition variable to notify threads about task availability.
+    not_full : threading.Condition
+        A condition variable to notify producers about free queue capacity.
+    work_stealing : bool
+        Whether the pool schedules tasks with work stealing.
     shutdown_event : threading.Event
         An event to signal threads to terminate.
     threads : list of threading.Thread
         The list of threads in the pool.
+    scaling_events : collections.deque of (float, str, int)
+        The latest changes of the pool size as `(time.monotonic(), event,
+        size)` triples, where the event is "grow" or "shrink".
+    metrics : bool
+        Whether the tasks are timed.
+    hooks : list of Callable
+        Callbacks run by the worker thread after every task with the wait
+        time, the run time and the exception raised by the task or None.
+        Only run if `metrics` is True.
+
+    Methods
+    -------
+    enqueue(task, block, timeout, priority, deadline)
+        Adds a zero-argument callable to the task queue.
+    enqueue_many(tasks, block, timeout, priority)
+        Adds a batch of zero-argument callables to the task queue.
+    submit(fn, *args, **kwargs)
+        Schedules a call and returns a future for its result.
+    submit_task(task, priority, deadline)
+        Schedules a zero-argument callable and returns a future for its result.
+    map(fn, iterable, chunksize, timeout)
+        Applies a function to every item and returns the results in order.
+    run(fn, *args, **kwargs)
+        Runs a call in the pool and awaits its result in an asyncio loop.
+    amap(fn, iterable, max_in_flight)
+        Applies a function to every item and yields the results asynchronously.
+    snapshot()
+        Returns the counters and the latency statistics of the pool.
+    join(timeout)
+        Waits until all the enqueued tasks are finished.
+    shutdown(wait, drain, cancel_pending, timeout)
+        Stops accepting tasks and stops the threads of the pool.
+    dispose()
+        Stops the threads of the pool, dropping the queued tasks.
     """
 
-    def __init__(self, num_threads: int):
+    # how many scaling events are kept in `scaling_events`
+    MAX_SCALING_EVENTS = 100
+
+    def __init__(
+        self,
+        num_threads: int,
+        max_queue_size: int = 0,
+        work_stealing: bool = False,
+        max_threads: Optional[int] = None,
+        idle_timeout: float = 1.0,
+        grow_threshold: int = 1,
+        max_wait: Optional[float] = None,
+        scheduling: str = "fifo",
+        aging: float = 0.0,
+        metrics: bool = False,
+        batch_size: int = 1,
+    ):
         """
         Initializes the ThreadPool with the specified number of threads.
 
+        In work-stealing mode a task enqueued from inside a running task goes
+        to the local deque of the current thread without taking the pool
+        lock. Every thread runs its own tasks newest first and, when it has
+        none, takes the oldest task from the tail of another thread's deque
+        before falling back to the shared queue.
+
+        With `max_threads` above `num_threads` the pool is elastic. When a
+        task is enqueued while `grow_threshold` or more queued tasks have no
+        idle thread to take them, or while the head of the queue has waited
+        for `max_wait` seconds, a thread is added. Threads above
+        `num_threads` that stay idle for `idle_timeout` seconds exit.
+
+        In priority mode the queue is a heap ordered by the priority of the
+        tasks (lower numbers run first) and then by the order of enqueueing.
+        With `aging`, a task enqueued `t` seconds later is ordered as if its
+        priority were `aging * t` higher, so old low-priority tasks are not
+        starved by a stream of new urgent ones.
+
         Parameters
         ----------
         num_threads : int
             The number of threads to create in the pool.
+        max_queue_size : int, optional
+            The maximum number of queued tasks. Defaults to 0 (unbounded).
+            Local deques of the work-stealing mode are not bounded.
+        work_stealing : bool, optional
+            Whether to schedule tasks with work stealing. Defaults to False.
+        max_threads : int, optional
+            The maximum number of threads. Defaults to `num_threads`.
+        idle_timeout : float, optional
+            The number of seconds after which an idle extra thread exits.
+            Defaults to 1.0.
+        grow_threshold : int, optional
+            The number of queued tasks not covered by idle threads that
+            starts an extra thread. Defaults to 1.
+        max_wait : float, optional
+            The number of seconds the head of the queue may wait before an
+            extra thread is started. Not checked by default.
+        scheduling : str, optional
+            "fifo" (the default) or "priority".
+        aging : float, optional
+            The priority gained by a task per second of waiting in priority
+            mode. Defaults to 0.0.
+        metrics : bool, optional
+            Whether to time the tasks. Timing costs a few microseconds per
+            task, which roughly halves the throughput of trivial tasks, so it
+            is off by default. The task counters are kept either way.
+            Defaults to False.
+        batch_size : int, optional
+            The maximum number of tasks a thread takes from the queue under
+            a single acquisition of the lock. A thread never takes more than
+            its fair share of the queue, so larger batches cut the locking
+            overhead of short tasks without starving the other threads.
+            Defaults to 1.
+
+        Raises
+        ------
+        ValueError
+            If `max_threads` is less than `num_threads`, if `scheduling` is
+            unknown, if priority scheduling is combined with work stealing,
+            or if `batch_size` is less than 1.
         """
+        if max_threads is None:
+            max_threads = num_threads
+        if max_threads < num_threads:
+            raise ValueError("max_threads must not be less than num_threads.")
+        if scheduling not in ("fifo", "priority"):
+            raise ValueError(f"Unknown scheduling {scheduling!r}.")
+        if scheduling == "priority" and work_stealing:
+            raise ValueError("Priority scheduling does not support work stealing.")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
         self.num_threads = num_threads
-        self.tasks: List[Callable[[], Any]] = []
+        self.max_threads = max_threads
+        self.idle_timeout = idle_timeout
+        self.grow_threshold = grow_threshold
+        self.max_wait = max_wait
+        self.max_queue_size = max_queue_size
+        self.work_stealing = work_stealing
+        self.scheduling = scheduling
+        self.aging = aging
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.tasks: Deque[QueuedTask] = deque()
+        self._heap: List[HeapEntry] = []  # the queue in priority mode
+        self._sequence = count()
         self.lock = threading.Lock()
-        self.cond = threading.Condition()
+        self.cond = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
         self.shutdown_event = threading.Event()
-        self.threads = []
+        self.threads: List[threading.Thread] = []
+        self.scaling_events: Deque[Tuple[float, str, int]] = deque(
+            maxlen=self.MAX_SCALING_EVENTS
+        )
+        self._local = threading.local()  # the local deque of a worker thread
+        # replaced as a whole on changes, so thieves can iterate over a snapshot
+        self._local_queues: List[Deque[QueuedTask]] = []
+        self._idle = 0  # number of threads waiting for tasks
+        self._head_since = time.monotonic()  # when the queue head became the head
+        self.hooks: List[TaskHook] = []
+        # the counters below are guarded by the lock
+        self._enqueued = 0
+        self._rejected = 0
+        self._expired = 0
+        self._worker_stats: List[WorkerStats] = []
+        self._finished_stats = WorkerStats("finished")  # of the exited threads
+        self._done = 0  # finished or dropped tasks, applied by workers in batches
+        self._joining = 0  # number of threads waiting in join()
+        self._all_done = threading.Condition(self.lock)
+        self._closed = False  # set by shutdown()
 
         for _ in range(num_threads):
-            thread = threading.Thread(target=self.worker)
-            thread.start()
-            self.threads.append(thread)
+            self._start_thread()
+
+    @property
+    def size(self) -> int:
+        """
+        Returns the current number of threads in the pool.
 
-    def worker(self):
+        Returns
+        -------
+        int
+            The number of threads.
+        """
+        return len(self.threads)
+
+    def _start_thread(self) -> None:
+        """
+        Starts a new worker thread. Called with the lock held, except in `__init__`.
+        """
+        thread = threading.Thread(target=self.worker)
+        self.threads.append(thread)
+        thread.start()
+
+    def _should_grow(self) -> bool:
+        """
+        Checks whether an extra thread should be started. Called with the lock held.
+
+        Returns
+        -------
+        bool
+            True if the pool may grow and the queue falls behind.
+        """
+        if len(self.threads) >= self.max_threads or self.shutdown_event.is_set():
+            return False
+        if self._queued() - self._idle >= self.grow_threshold:
+            return True
+        return (
+            self.max_wait is not None
+            and time.monotonic() - self._head_since >= self.max_wait
+        )
+
+    def _retire(self, local: Optional[Deque[QueuedTask]]) -> None:
+        """
+        Removes the current thread from the pool. Called with the lock held.
+
+        Parameters
+        ----------
+        local : collections.deque of (Callable, float), optional
+            The local deque of the thread in work-stealing mode. Tasks left in
+            it are moved to the shared queue.
+        """
+        self.threads.remove(threading.current_thread())
+        if local is not None:
+            self._local_queues = [q for q in self._local_queues if q is not local]
+            self.tasks.extend(local)
+            local.clear()
+        self.scaling_events.append((time.monotonic(), "shrink", len(self.threads)))
+
+    def worker(self) -> None:
         """
         The worker method that runs in each thread. It waits for tasks to
         become available and executes them until the shutdown event is set.
+
+        Exceptions raised by tasks are logged and counted, and the thread
+        goes on with the next task.
         """
+        stats = WorkerStats(threading.current_thread().name)
+        self._local.stats = stats
+        local: Optional[Deque[QueuedTask]] = None
+        if self.work_stealing:
+            local = deque()
+            self._local.queue = local
+        with self.lock:
+            self._worker_stats.append(stats)
+            if local is not None:
+                self._local_queues = self._local_queues + [local]
+        try:
+            self._run_tasks(local, stats)
+        finally:
+            with self.lock:
+                stats.stopped = time.monotonic()
+                self._worker_stats.remove(stats)
+                self._finished_stats.merge(stats)
+
+    def _run_tasks(
+        self, local: Optional[Deque[QueuedTask]], stats: WorkerStats
+    ) -> None:
+        """
+        Runs tasks until the shutdown event is set, the pool is drained after
+        `shutdown()`, or the thread retires.
+
+        The finished tasks are counted in `_done` in batches, every time the
+        thread takes the lock anyway.
+
+        Parameters
+        ----------
+        local : collections.deque of (Callable, float), optional
+            The local deque of the thread in work-stealing mode.
+        stats : WorkerStats
+            The statistics of the thread.
+        """
+        done = 0  # finished tasks not counted in `_done` yet
+        batch: Deque[QueuedTask] = deque()  # tasks taken from the queue at once
         while not self.shutdown_event.is_set():
-            with self.cond:
-                while not self.tasks and not self.shutdown_event.is_set():
-                    self.cond.wait()  # Wait for a task to become available
-                if self.shutdown_event.is_set():
-                    break
-                task = self.tasks.pop(0)  # Get the next task from the queue
-            task()  # Execute the task
+            if batch:
+                item: Optional[QueuedTask] = batch.popleft()
+            elif local is not None:
+                item = self._pop_local_or_steal(local)
+            else:
+                item = None
+            if item is None:
+                with self.cond:
+                    if done:
+                        self._task_done(done)
+                        done = 0
+                    idle_since = time.monotonic()
+                    while not self._queued() and not self.shutdown_event.is_set():
+                        if self._closed:
+                            return  # the pool is drained
+                        extra = len(self.threads) > self.num_threads
+                        idle_for = time.monotonic() - idle_since
+                        if extra and idle_for >= self.idle_timeout:
+                            self._retire(local)
+                            return
+                        timeout = self.idle_timeout - idle_for if extra else None
+                        self._idle += 1
+                        # Local deques are filled without the lock. A producer
+                        # that reads `_idle` before the increment above has
+                        # pushed its task before this check, and one that reads
+                        # it after notifies us, so no wakeup is lost.
+                        if local is not None and any(self._local_queues):
+                            self._idle -= 1
+                            break
+                        self.cond.wait(timeout)  # Wait for a task to become available
+                        self._idle -= 1
+                    if self.shutdown_event.is_set():
+                        break
+                    if not self._queued():
+                        continue  # there is something to steal
+                    # Get the next tasks from the queue
+                    items, expired = self._take(self._batch_limit())
+                    self._head_since = time.monotonic()
+                    if self.max_queue_size:
+                        # Wake up blocked producers
+                        self.not_full.notify(len(expired) + len(items))
+                for future in expired:
+                    _expire(future)
+                if not items:
+                    continue
+                item = items[0]
+                batch.extend(items[1:])
+            task, enqueued_at, _ = item
+            done += 1
+            if not self.metrics:
+                try:
+                    task()  # Execute the task
+                except Exception:
+                    stats.failed += 1
+                    logger.exception("Task %r raised an exception.", task)
+                else:
+                    stats.completed += 1
+                continue
+            started = time.monotonic()
+            error: Optional[BaseException] = None
+            try:
+                task()  # Execute the task
+            except Exception as exception:
+                error = exception
+                logger.exception("Task %r raised an exception.", task)
+            finished = time.monotonic()
+            stats.wait_time.add(started - enqueued_at)
+            stats.run_time.add(finished - started)
+            stats.busy += finished - started
+            if error is None:
+                stats.completed += 1
+            else:
+                stats.failed += 1
+            for hook in self.hooks:
+                try:
+                    hook(started - enqueued_at, finished - started, error)
+                except Exception:
+                    logger.exception("Task hook %r raised an exception.", hook)
+        for _, _, dropped in batch:  # dropped by shutdown(drain=False)
+            if dropped is not None:
+                dropped.cancel()
+        done += len(batch)
+        if done:
+            with self.lock:
+                self._task_done(done)
+
+    def _batch_limit(self) -> int:
+        """
+        Returns how many tasks a thread takes from the queue at once. Called
+        with the lock held.
+
+        A thread takes no more than its fair share of the queued tasks, so
+        that the other threads are not left idle.
+
+        Returns
+        -------
+        int
+            The number of tasks, at least 1.
+        """
+        if self.batch_size == 1:
+            return 1
+        share = self._queued() // len(self.threads)
+        return max(1, min(self.batch_size, share))
 
-    def enqueue(self, task: Callable[[], Any]):
+    def _task_done(self, count: int) -> None:
+        """
+        Counts finished or dropped tasks. Called with the lock held.
+
+        Parameters
+        ----------
+        count : int
+            The number of tasks.
+        """
+        self._done += count
+        if self._joining:
+            self._all_done.notify_all()
+
+    def _unfinished(self) -> int:
+        """
+        Returns the number of enqueued tasks that are not finished yet. Called
+        with the lock held.
+
+        Tasks enqueued to local deques are counted by the workers without the
+        lock, before the tasks become visible to thieves, while finished tasks
+        are counted later, so the result never drops to zero too early.
+
+        Returns
+        -------
+        int
+            The number of queued and running tasks.
+        """
+        spawned = self._finished_stats.enqueued
+        spawned += sum(stats.enqueued for stats in self._worker_stats)
+        return self._enqueued + spawned - self._done
+
+    def _queued(self) -> int:
+        """
+        Returns the number of tasks in the shared queue.
+
+        Returns
+        -------
+        int
+            The number of queued tasks.
+        """
+        return len(self.tasks) + len(self._heap)
+
+    def _take(self, count: int) -> Tuple[List[QueuedTask], Sequence[Future]]:
+        """
+        Removes the next tasks from the non-empty shared queue. Called with the lock held.
+
+        In priority mode the tasks whose deadline has passed are removed
+        from the heap on the way as well.
+
+        Parameters
+        ----------
+        count : int
+            The maximum number of tasks to take.
+
+        Returns
+        -------
+        tuple of (list of (Callable, float, Future or None), sequence of Future)
+            The tasks to run, empty if all the removed tasks have expired, and
+            the futures of the expired tasks, to be failed without the lock.
+        """
+        if not self._heap:
+            tasks = self.tasks
+            if count == 1:
+                return [tasks.popleft()], ()
+            return [tasks.popleft() for _ in range(min(count, len(tasks)))], ()
+        now = time.monotonic()
+        items: List[QueuedTask] = []
+        expired: List[Future] = []
+        while self._heap and len(items) < count:
+            _, _, item, deadline = heapq.heappop(self._heap)
+            if deadline is None or deadline > now:
+                items.append(item)
+                continue
+            self._expired += 1
+            self._task_done(1)
+            if item[2] is not None:
+                expired.append(item[2])
+        return items, expired
+
+    def _pop_local_or_steal(self, local: Deque[QueuedTask]) -> Optional[QueuedTask]:
+        """
+        Takes the newest task of the local deque or steals the oldest task of another one.
+
+        Deque operations are atomic, so no lock is needed here.
+
+        Parameters
+        ----------
+        local : collections.deque of (Callable, float)
+            The local deque of the current thread.
+
+        Returns
+        -------
+        (Callable, float) or None
+            The task to run with its enqueue time, or None if all the local
+            deques are empty.
+        """
+        try:
+            return local.pop()
+        except IndexError:
+            pass
+        queues = self._local_queues
+        start = random.randrange(len(queues))  # spread the thieves over victims
+        for i in range(len(queues)):
+            victim = queues[(start + i) % len(queues)]
+            if victim is not local:
+                try:
+                    return victim.popleft()
+                except IndexError:
+                    continue
+        return None
+
+    def enqueue(
+        self,
+        task: Callable[[], Any],
+        block: bool = True,
+        timeout: Optional[float] = None,
+        priority: float = 0,
+        deadline: Optional[float] = None,
+    ):
         """
         Adds a new task to the task queue.
 
+        If the queue is bounded and full, the call waits for a free slot
+        (backpressure) or, with `block=False`, rejects the task at once.
+
         Parameters
         ----------
         task : Callable[[], Any]
             A callable representing the task to be executed.
+        block : bool, optional
+            Whether to wait for a free slot in a full queue. Defaults to True.
+        timeout : float, optional
+            The maximum number of seconds to wait for a free slot.
+        priority : float, optional
+            The priority of the task in priority mode, lower numbers run
+            first. Defaults to 0.
+        deadline : float, optional
+            The `time.monotonic()` time after which the task is dropped
+            instead of being started. Only supported in priority mode.
+
+        Raises
+        ------
+        queue.Full
+            If the queue is full and no slot became free in time.
+        ValueError
+            If a priority or a deadline is given in FIFO mode.
+        RuntimeError
+            If the pool has been shut down.
+        """
+        self._put(task, block, timeout, priority, deadline, None)
+
+    def enqueue_many(
+        self,
+        tasks: Iterable[Callable[[], Any]],
+        block: bool = True,
+        timeout: Optional[float] = None,
+        priority: float = 0,
+    ) -> None:
         """
+        Adds a batch of tasks to the task queue.
+
+        The whole batch is added under a single acquisition of the lock, and
+        as many threads as there are new tasks are woken up at once, which
+        is much cheaper than calling `enqueue` for every task. If the queue
+        is bounded, the batch is added in parts as slots become free.
+
+        Parameters
+        ----------
+        tasks : Iterable[Callable[[], Any]]
+            The callables representing the tasks to be executed.
+        block : bool, optional
+            Whether to wait for free slots in a bounded queue. Defaults to
+            True. With `block=False` no task is added unless the whole batch
+            fits.
+        timeout : float, optional
+            The maximum number of seconds to wait for free slots.
+        priority : float, optional
+            The priority of all the tasks in priority mode. Defaults to 0.
+
+        Raises
+        ------
+        queue.Full
+            If the batch does not fit into the queue in time. The tasks
+            added before remain in the queue.
+        ValueError
+            If a priority is given in FIFO mode.
+        RuntimeError
+            If the pool has been shut down.
+        """
+        if self.scheduling == "fifo" and priority:
+            raise ValueError("Priorities and deadlines require priority scheduling.")
+        self._check_open()
+        batch = list(tasks)
+        local = getattr(self._local, "queue", None)
+        if local is not None:  # called from a task in work-stealing mode
+            now = time.monotonic()
+            self._local.stats.enqueued += len(batch)  # before thieves can see them
+            local.extend((task, now, None) for task in batch)
+            if self._idle:  # read after the push, see `_run_tasks`
+                with self.cond:
+                    self.cond.notify(len(batch))
+            return
+        end_time = None if timeout is None else time.monotonic() + timeout
         with self.lock:
-            self.tasks.append(task)
-            with self.cond:
-                self.cond.notify()  # Notify one waiting thread
+            start = 0
+            while start < len(batch):
+                if self.max_queue_size:
+                    room = self.max_queue_size - self._queued()
+                    if room < len(batch) - start and not block:
+                        self._rejected += len(batch) - start
+                        raise queue.Full("The task queue is full.")
+                    if room <= 0:
+                        wait = None if end_time is None else end_time - time.monotonic()
+                        if not self.not_full.wait_for(
+                            lambda: self._queued() < self.max_queue_size
+                            or self._closed,
+                            wait,
+                        ):
+                            self._rejected += len(batch) - start
+                            raise queue.Full("The task queue is full.")
+                        self._check_open()
+                        room = max(self.max_queue_size - self._queued(), 1)
+                    stop = min(len(batch), start + room)
+                else:
+                    stop = len(batch)
+                now = time.monotonic()
+                if not self._queued():
+                    self._head_since = now
+                if self.scheduling == "priority":
+                    key = priority + self.aging * now
+                    for task in batch[start:stop]:
+                        entry = (key, next(self._sequence), (task, now, None), None)
+                        heapq.heappush(self._heap, entry)
+                else:
+                    self.tasks.extend((task, now, None) for task in batch[start:stop])
+                self._enqueued += stop - start
+                while self._should_grow():
+                    self._start_thread()
+                    self.scaling_events.append(
+                        (time.monotonic(), "grow", len(self.threads))
+                    )
+                self.cond.notify(stop - start)  # Wake up a thread per new task
+                start = stop
 
-    def dispose(self):
+    def _check_open(self) -> None:
         """
-        Signals the threads to terminate and waits for them to finish.
+        Rejects new tasks after `shutdown()`. While the pool is drained, the
+        running tasks may still enqueue follow-up tasks.
+
+        Raises
+        ------
+        RuntimeError
+            If the pool does not accept tasks from the current thread.
+        """
+        if self._closed and (
+            self.shutdown_event.is_set() or getattr(self._local, "stats", None) is None
+        ):
+            raise RuntimeError("Cannot enqueue tasks after shutdown.")
+
+    def _put(
+        self,
+        task: Callable[[], Any],
+        block: bool,
+        timeout: Optional[float],
+        priority: float,
+        deadline: Optional[float],
+        future: Optional[Future],
+    ) -> None:
+        """
+        Adds a task to the local deque or to the shared queue.
 
-        Already running tasks will not be interrupted.
+        Parameters
+        ----------
+        task : Callable[[], Any]
+            The task to be executed.
+        block : bool
+            Whether to wait for a free slot in a full queue.
+        timeout : float, optional
+            The maximum number of seconds to wait for a free slot.
+        priority : float
+            The priority of the task.
+        deadline : float, optional
+            The time after which the task is dropped.
+        future : concurrent.futures.Future, optional
+            The future of the result of the task.
+
+        Raises
+        ------
+        RuntimeError
+            If the pool has been shut down.
+        """
+        if self.scheduling == "fifo" and (priority or deadline is not None):
+            raise ValueError("Priorities and deadlines require priority scheduling.")
+        self._check_open()
+        if deadline is not None and deadline <= time.monotonic():
+            with self.lock:
+                self._expired += 1
+            if future is not None:
+                _expire(future)  # fail fast, the task could never start in time
+            return
+        local = getattr(self._local, "queue", None)
+        if local is not None:  # called from a task in work-stealing mode
+            self._local.stats.enqueued += 1  # counted before thieves can see it
+            local.append((task, time.monotonic(), future))
+            if self._idle:  # read after the push, see `_run_tasks`
+                with self.cond:
+                    self.cond.notify()
+            return
+        with self.lock:
+            if self.max_queue_size and self._queued() >= self.max_queue_size:
+                if not block or not self.not_full.wait_for(
+                    lambda: self._queued() < self.max_queue_size or self._closed,
+                    timeout,
+                ):
+                    self._rejected += 1
+                    raise queue.Full("The task queue is full.")
+                self._check_open()
+            now = time.monotonic()
+            if not self._queued():
+                self._head_since = now
+            if self.scheduling == "priority":
+                key = priority + self.aging * now
+                entry = (key, next(self._sequence), (task, now, future), deadline)
+                heapq.heappush(self._heap, entry)
+            else:
+                self.tasks.append((task, now, future))
+            self._enqueued += 1
+            if self._should_grow():
+                self._start_thread()
+                self.scaling_events.append(
+                    (time.monotonic(), "grow", len(self.threads))
+                )
+            self.cond.notify()  # Notify one waiting thread
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Schedules `fn(*args, **kwargs)` and returns a future for its result.
+
+        Parameters
+        ----------
+        fn : Callable
+            The function to call.
+        *args, **kwargs
+            The arguments to pass to the function.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            A future that supports `result(timeout)`, `exception(timeout)`,
+            `cancel()` and `add_done_callback(callback)`.
+        """
+        return self.submit_task(partial(fn, *args, **kwargs))
+
+    def submit_task(
+        self,
+        task: Callable[[], Any],
+        priority: float = 0,
+        deadline: Optional[float] = None,
+    ) -> Future:
+        """
+        Schedules a zero-argument callable and returns a future for its result.
+
+        Parameters
+        ----------
+        task : Callable[[], Any]
+            The callable to run.
+        priority : float, optional
+            The priority of the task in priority mode, lower numbers run
+            first. Defaults to 0.
+        deadline : float, optional
+            The `time.monotonic()` time after which the task is not started
+            and its future fails with `TimeoutError`. Only supported in
+            priority mode.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            A future for the result of the task.
+
+        Raises
+        ------
+        ValueError
+            If a priority or a deadline is given in FIFO mode.
+        RuntimeError
+            If the pool has been shut down.
+        """
+        future: Future = Future()
+
+        def run() -> None:
+            if not future.set_running_or_notify_cancel():
+                return  # the future was cancelled while in the queue
+            try:
+                result = task()
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        self._put(run, True, None, priority, deadline, future)
+        return future
+
+    def map(
+        self,
+        fn: Callable[[Any], Any],
+        iterable: Iterable[Any],
+        chunksize: int = 1,
+        timeout: Optional[float] = None,
+    ) -> Iterator[Any]:
+        """
+        Applies `fn` to every item of `iterable` in the pool.
+
+        All the items are scheduled immediately, grouped into tasks of
+        `chunksize` items, and the results are returned in the order of the
+        items as soon as they are available.
+
+        Parameters
+        ----------
+        fn : Callable[[Any], Any]
+            The function to apply.
+        iterable : Iterable
+            The items to apply the function to.
+        chunksize : int
+            The number of items processed by a single task. Larger chunks cut
+            the scheduling overhead for cheap functions.
+        timeout : float, optional
+            The maximum number of seconds to wait for all the results.
+
+        Returns
+        -------
+        Iterator
+            The results in the order of the items.
+
+        Raises
+        ------
+        ValueError
+            If `chunksize` is less than 1.
+        concurrent.futures.TimeoutError
+            If the results are not ready within `timeout` (raised on iteration).
+        """
+        if chunksize < 1:
+            raise ValueError("chunksize must be at least 1.")
+        end_time = None if timeout is None else time.monotonic() + timeout
+
+        def run_chunk(chunk: List[Any]) -> List[Any]:
+            return [fn(item) for item in chunk]
+
+        items = iter(iterable)
+        futures = []
+        while True:
+            chunk = list(islice(items, chunksize))
+            if not chunk:
+                break
+            futures.append(self.submit(run_chunk, chunk))
+
+        def results() -> Iterator[Any]:
+            try:
+                for future in futures:
+                    if end_time is None:
+                        yield from future.result()
+                    else:
+                        yield from future.result(end_time - time.monotonic())
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        return results()
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs `fn(*args, **kwargs)` in the pool and awaits its result.
+
+        The event loop of the caller is not blocked while the call runs,
+        except for waiting for a free slot in a full bounded queue.
+        Cancelling the awaiting coroutine cancels the call if it has not
+        started yet.
+
+        Parameters
+        ----------
+        fn : Callable
+            The function to call.
+        *args, **kwargs
+            The arguments to pass to the function.
+
+        Returns
+        -------
+        Any
+            The result of the call.
+
+        Raises
+        ------
+        Exception
+            Any exception raised by the call.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    async def amap(
+        self,
+        fn: Callable[[Any], Any],
+        iterable: Iterable[Any],
+        max_in_flight: Optional[int] = None,
+    ) -> AsyncIterator[Any]:
         """
-        self.shutdown_event.set()
-        with self.cond:
+        Applies `fn` to every item of `iterable` in the pool and yields the
+        results in the order they are completed.
+
+        At most `max_in_flight` items are scheduled at once, so a long or
+        endless iterable does not flood the queue. If a call raises, or the
+        consumer stops early, the scheduled calls that have not started yet
+        are cancelled.
+
+        Parameters
+        ----------
+        fn : Callable[[Any], Any]
+            The function to apply.
+        iterable : Iterable
+            The items to apply the function to.
+        max_in_flight : int, optional
+            The maximum number of scheduled calls. Defaults to twice the
+            maximum number of threads.
+
+        Yields
+        ------
+        Any
+            The results in the order of completion.
+
+        Raises
+        ------
+        ValueError
+            If `max_in_flight` is less than 1.
+        Exception
+            Any exception raised by a call.
+        """
+        limit = 2 * self.max_threads if max_in_flight is None else max_in_flight
+        if limit < 1:
+            raise ValueError("max_in_flight must be at least 1.")
+        pending: set = set()
+        try:
+            for item in iterable:
+                pending.add(asyncio.wrap_future(self.submit(fn, item)))
+                if len(pending) < limit:
+                    continue
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield future.result()
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns the counters and the latency statistics of the pool.
+
+        The statistics of running threads are read without stopping them, so
+        the numbers of a busy pool may be off by the tasks in flight.
+
+        Returns
+        -------
+        dict
+            A dictionary with the keys:
+
+            - "threads", "idle": the numbers of all and of waiting threads;
+            - "queued": the number of queued tasks, local deques included;
+            - "enqueued", "completed", "failed": the numbers of tasks queued
+              and finished normally or with an exception;
+            - "rejected", "expired": the numbers of tasks rejected by a full
+              queue and dropped after their deadline;
+            - "wait_time", "run_time": histograms of the time tasks spent in
+              the queue and running, see `Histogram.as_dict`, empty unless
+              the pool was created with `metrics=True`;
+            - "busy_ratio": the share of its lifetime every running thread
+              spent running tasks, by thread name, 0 without metrics.
+        """
+        now = time.monotonic()
+        totals = WorkerStats("total")
+        with self.lock:
+            workers = list(self._worker_stats)
+            totals.merge(self._finished_stats)
+            result: Dict[str, Any] = {
+                "threads": len(self.threads),
+                "idle": self._idle,
+                "queued": self._queued() + sum(map(len, self._local_queues)),
+                "enqueued": self._enqueued,
+                "rejected": self._rejected,
+                "expired": self._expired,
+            }
+        for stats in workers:
+            totals.merge(stats)
+        result["enqueued"] += totals.enqueued
+        result["completed"] = totals.completed
+        result["failed"] = totals.failed
+        result["wait_time"] = totals.wait_time.as_dict()
+        result["run_time"] = totals.run_time.as_dict()
+        result["busy_ratio"] = {stats.name: stats.busy_ratio(now) for stats in workers}
+        return result
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until all the enqueued tasks are finished or dropped.
+
+        Tasks enqueued by running tasks are waited for as well.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum number of seconds to wait.
+
+        Returns
+        -------
+        bool
+            True if all the tasks are finished, False on timeout.
+        """
+        with self.lock:
+            self._joining += 1
+            try:
+                return self._all_done.wait_for(lambda: self._unfinished() == 0, timeout)
+            finally:
+                self._joining -= 1
+
+    def _drop_queued(self, futures_only: bool) -> List[Future]:
+        """
+        Removes queued tasks from the pool. Called with the lock held.
+
+        Parameters
+        ----------
+        futures_only : bool
+            Whether to remove only the tasks scheduled with `submit_task`.
+            Otherwise the local deques of the work-stealing mode are emptied
+            as well.
+
+        Returns
+        -------
+        list of concurrent.futures.Future
+            The futures of the removed tasks, to be cancelled without the lock.
+        """
+        items = list(self.tasks) + [entry[2] for entry in self._heap]
+        if futures_only:
+            self.tasks = deque(item for item in self.tasks if item[2] is None)
+            self._heap = [entry for entry in self._heap if entry[2][2] is None]
+            heapq.heapify(self._heap)
+        else:
+            self.tasks.clear()
+            self._heap.clear()
+            for local in self._local_queues:
+                while True:  # owners may pop concurrently, so pop one by one
+                    try:
+                        items.append(local.popleft())
+                    except IndexError:
+                        break
+        dropped = [item for item in items if not futures_only or item[2] is not None]
+        self._task_done(len(dropped))
+        return [item[2] for item in dropped if item[2] is not None]
+
+    def shutdown(
+        self,
+        wait: bool = True,
+        drain: bool = True,
+        cancel_pending: bool = False,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """
+        Stops accepting tasks and stops the threads of the pool.
+
+        After the call `enqueue` and `submit` raise RuntimeError, except for
+        calls from tasks running while the pool is drained. The method can be
+        called several times, for example to wait for a drain started with
+        `wait=False`.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Whether to wait for the threads to exit. Defaults to True.
+        drain : bool, optional
+            Whether the threads run all the queued tasks before exiting.
+            Otherwise they exit after their current task, the queued tasks
+            are dropped and their futures are cancelled. Defaults to True.
+        cancel_pending : bool, optional
+            Whether to cancel the queued tasks scheduled with `submit_task`
+            (and `submit`, `map`) even when draining. Tasks in the local
+            deques of the work-stealing mode are children of running tasks
+            and are still run. Defaults to False.
+        timeout : float, optional
+            The maximum number of seconds to wait for the threads. The
+            threads go on draining in the background after a timeout.
+
+        Returns
+        -------
+        bool
+            True if all the threads have exited.
+        """
+        end_time = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            self._closed = True
+            if not drain:
+                self.shutdown_event.set()
+            cancelled = (
+                self._drop_queued(futures_only=drain)
+                if cancel_pending or not drain
+                else []
+            )
             self.cond.notify_all()  # Notify all threads to exit
-        for thread in self.threads:
-            thread.join()  # Wait for all threads to finish
+            self.not_full.notify_all()  # Release blocked producers
+        for future in cancelled:
+            future.cancel()
+        if wait:
+            current = threading.current_thread()
+            for thread in list(self.threads):
+                if thread is current:
+                    continue  # called from a task
+                if end_time is None:
+                    thread.join()  # Wait for all threads to finish
+                else:
+                    thread.join(max(end_time - time.monotonic(), 0))
+        return not any(thread.is_alive() for thread in list(self.threads))
+
+    def __enter__(self) -> "ThreadPool":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+    def dispose(self) -> None:
+        """
+        Signals the threads to terminate and waits for them to finish.
+
+        Already running tasks will not be interrupted. The queued tasks are
+        dropped and their futures are cancelled; use `shutdown()` to run them
+        first.
+        """
+        self.shutdown(wait=True, drain=False)
@@ -0,0 +1,401 @@
+from array import array
+from collections.abc import MutableMapping
+import random
+from typing import Any, Generator, List, Tuple
+
+NIL = -1  # index used as a null child pointer
+
+
+class ArrayTreap(MutableMapping):
+    """
+    A Treap that stores its nodes in parallel columns instead of node objects.
+
+    Every node is an index into a set of `array.array` columns (keys,
+    priorities, left and right child indices) plus a list of value slots.
+    Deleted slots are chained into a free list through the `left` column and
+    reused by later insertions, so the columns never contain holes for long.
+    Compared to `Treap`, which allocates one `TreapNode` with its own
+    `__dict__` per key, this keeps 32 bytes of bookkeeping per entry and
+    gives the garbage collector nothing to traverse but the value list.
+
+    Keys must be integers that fit into a signed 64-bit column.
+
+    This class implements a mutable mapping, as defined by the `collections.abc.MutableMapping` class.
+
+    Methods
+    -------
+    __setitem__(key, value)
+        Inserts the key-value pair into the Treap.
+    __getitem__(key)
+        Retrieves the value for the given key.
+    __delitem__(key)
+        Deletes the key-value pair.
+    __iter__()
+        Returns an iterator for the keys in sorted order.
+    __reversed__()
+        Returns an iterator for the keys in reverse sorted order.
+    __len__()
+        Returns the number of keys in the Treap.
+    clear()
+        Removes all the keys and releases the columns.
+    """
+
+    def __init__(self) -> None:
+        self._keys = array("q")
+        self._priorities = array("q")
+        self._left = array("i")
+        self._right = array("i")
+        self._values: List[Any] = []
+        self._root = NIL
+        self._free = NIL  # head of the free list, chained through `_left`
+        self._count = 0
+
+    def _allocate(self, key: int, value: Any) -> int:
+        """
+        Takes a slot from the free list (or appends a new one) and fills it.
+
+        Parameters
+        ----------
+        key : int
+            The key for the node.
+        value : Any
+            The value associated with the key.
+
+        Returns
+        -------
+        int
+            The index of the new node.
+        """
+        priority = random.getrandbits(63)
+        node = self._free
+        if node != NIL:
+            self._free = self._left[node]
+            self._keys[node] = key
+            self._priorities[node] = priority
+            self._left[node] = NIL
+            self._right[node] = NIL
+            self._values[node] = value
+        else:
+            node = len(self._keys)
+            self._keys.append(key)
+            self._priorities.append(priority)
+            self._left.append(NIL)
+            self._right.append(NIL)
+            self._values.append(value)
+        return node
+
+    def _release(self, node: int) -> None:
+        """
+        Puts the slot of a removed node on the free list.
+
+        Parameters
+        ----------
+        node : int
+            The index of the node to release.
+        """
+        self._values[node] = None  # drop the reference to the value
+        self._right[node] = NIL
+        self._left[node] = self._free
+        self._free = node
+
+    def _find(self, key: int) -> int:
+        """
+        Finds the node holding the given key.
+
+        Parameters
+        ----------
+        key : int
+            The key to look for.
+
+        Returns
+        -------
+        int
+            The index of the node, or `NIL` if the key is absent.
+        """
+        keys, left, right = self._keys, self._left, self._right
+        node = self._root
+        while node != NIL:
+            node_key = keys[node]
+            if key == node_key:
+                return node
+            node = left[node] if key < node_key else right[node]
+        return NIL
+
+    def _split(self, node: int, key: int) -> Tuple[int, int]:
+        """
+        Splits the subtree rooted at the given node by the provided key.
+
+        Parameters
+        ----------
+        node : int
+            The root of the subtree to split.
+        key : int
+            The key at which to split the subtree.
+
+        Returns
+        -------
+        tuple of (int, int)
+            The roots of the subtrees with keys less than `key` and with keys
+            greater than or equal to `key`.
+        """
+        keys, left, right = self._keys, self._left, self._right
+        left_root = right_root = NIL
+        left_tail = right_tail = NIL  # last nodes attached to each side
+        while node != NIL:
+            if keys[node] < key:
+                if left_tail == NIL:
+                    left_root = node
+                else:
+                    right[left_tail] = node
+                left_tail = node
+                node = right[node]
+            else:
+                if right_tail == NIL:
+                    right_root = node
+                else:
+                    left[right_tail] = node
+                right_tail = node
+                node = left[node]
+        if left_tail != NIL:
+            right[left_tail] = NIL
+        if right_tail != NIL:
+            left[right_tail] = NIL
+        return left_root, right_root
+
+    def _merge(self, t1: int, t2: int) -> int:
+        """
+        Merges two subtrees into one, maintaining the heap property.
+
+        All keys in `t1` must be less than all keys in `t2`.
+
+        Parameters
+        ----------
+        t1 : int
+            The root of the first subtree.
+        t2 : int
+            The root of the second subtree.
+
+        Returns
+        -------
+        int
+            The root of the merged subtree.
+        """
+        priorities, left, right = self._priorities, self._left, self._right
+        root = parent = NIL
+        attach_left = False
+        while t1 != NIL and t2 != NIL:
+            if priorities[t1] > priorities[t2]:
+                child, t1, next_left = t1, right[t1], False
+            else:
+                child, t2, next_left = t2, left[t2], True
+            if parent == NIL:
+                root = child
+            elif attach_left:
+                left[parent] = child
+            else:
+                right[parent] = child
+            parent, attach_left = child, next_left
+        rest = t1 if t1 != NIL else t2
+        if parent == NIL:
+            return rest
+        if attach_left:
+            left[parent] = rest
+        else:
+            right[parent] = rest
+        return root
+
+    def __setitem__(self, key: int, value: Any) -> None:
+        """
+        Sets the value for the given key in the Treap.
+
+        Parameters
+        ----------
+        key : int
+            The key to insert or update.
+        value : Any
+            The value associated with the key.
+        """
+        node = self._find(key)
+        if node != NIL:
+            self._values[node] = value
+            return
+
+        new = self._allocate(key, value)
+        keys, priorities = self._keys, self._priorities
+        left, right = self._left, self._right
+        priority = priorities[new]
+        parent = NIL
+        go_left = False
+        node = self._root
+        # descend until the new node has to become the root of the subtree
+        while node != NIL and priorities[node] >= priority:
+            parent = node
+            go_left = key < keys[node]
+            node = left[node] if go_left else right[node]
+        left[new], right[new] = self._split(node, key)
+        if parent == NIL:
+            self._root = new
+        elif go_left:
+            left[parent] = new
+        else:
+            right[parent] = new
+        self._count += 1
+
+    def __getitem__(self, key: int) -> Any:
+        """
+        Retrieves the value associated with the given key.
+
+        Parameters
+        ----------
+        key : int
+            The key for which the value is to be retrieved.
+
+        Returns
+        -------
+        Any
+            The value associated with the key.
+
+        Raises
+        ------
+        KeyError
+            If the key is not found in the Treap.
+        """
+        node = self._find(key)
+        if node == NIL:
+            raise KeyError(f"Key {key} not found.")
+        return self._values[node]
+
+    def __delitem__(self, key: int) -> None:
+        """
+        Deletes the key-value pair associated with the given key.
+
+        Parameters
+        ----------
+        key : int
+            The key to delete.
+
+        Raises
+        ------
+        KeyError
+            If the key is not found in the Treap.
+        """
+        keys, left, right = self._keys, self._left, self._right
+        parent = NIL
+        go_left = False
+        node = self._root
+        while node != NIL and keys[node] != key:
+            parent = node
+            go_left = key < keys[node]
+            node = left[node] if go_left else right[node]
+        if node == NIL:
+            raise KeyError(f"Key {key} not found.")
+
+        merged = self._merge(left[node], right[node])
+        if parent == NIL:
+            self._root = merged
+        elif go_left:
+            left[parent] = merged
+        else:
+            right[parent] = merged
+        self._release(node)
+        self._count -= 1
+
+    def __contains__(self, key: Any) -> bool:
+        """
+        Checks if the given key is present in the Treap.
+
+        Parameters
+        ----------
+        key : Any
+            The key to check for presence.
+
+        Returns
+        -------
+        bool
+            `True` if the key is present, `False` otherwise.
+        """
+        return self._find(key) != NIL
+
+    def __iter__(self) -> Generator[int, None, None]:
+        """
+        Performs an in-order traversal of the Treap, yielding keys in sorted order.
+
+        Yields
+        ------
+        int
+            The keys in sorted order.
+        """
+        yield from self._traverse(self._left, self._right)
+
+    def __reversed__(self) -> Generator[int, None, None]:
+        """
+        Performs a reverse in-order traversal of the Treap, yielding keys in reverse sorted order.
+
+        Yields
+        ------
+        int
+            The keys in reverse sorted order.
+        """
+        yield from self._traverse(self._right, self._left)
+
+    def _traverse(self, first: array, second: array) -> Generator[int, None, None]:
+        """
+        Helper method for in-order traversal with an explicit stack.
+
+        Parameters
+        ----------
+        first : array
+            The child column visited before the node (`_left` for sorted order).
+        second : array
+            The child column visited after the node.
+
+        Yields
+        ------
+        int
+            The keys of the nodes in traversal order.
+        """
+        keys = self._keys
+        stack: List[int] = []
+        node = self._root
+        while stack or node != NIL:
+            while node != NIL:
+                stack.append(node)
+                node = first[node]
+            node = stack.pop()
+            yield keys[node]
+            node = second[node]
+
+    def __len__(self) -> int:
+        """
+        Returns the number of nodes in the Treap.
+
+        Returns
+        -------
+        int
+            The number of nodes in the Treap.
+        """
+        return self._count
+
+    def clear(self) -> None:
+        """
+        Removes all the keys from the Treap and releases the columns.
+        """
+        self._keys = array("q")
+        self._priorities = array("q")
+        self._left = array("i")
+        self._right = array("i")
+        self._values = []
+        self._root = NIL
+        self._free = NIL
+        self._count = 0
+
+    def __repr__(self) -> str:
+        """
+        Returns the string representation of the Treap.
+
+        Returns
+        -------
+        str
+            The string representation of the Treap.
+        """
+        return f"ArrayTreap({list(self)})"
@@ -0,0 +1,298 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from itertools import accumulate
+import mmap
+import struct
+from typing import Any, Generator, List, Optional, Tuple
+
+# File layout: the header, then the keys, the priorities and the value offsets
+# as int64 columns in native byte order, then the UTF-8 encoded values.
+MAGIC = b"TREAP\x00\x00\x01"
+HEADER = struct.Struct("=8sqqq")  # magic, byte order mark, count, values size
+BYTE_ORDER_MARK = 1
+ITEM_SIZE = 8
+
+
+def _layout(buffer: Any) -> Tuple[int, int, int, int, int]:
+    """
+    Reads the header of a Treap file and computes the offsets of its sections.
+
+    Parameters
+    ----------
+    buffer : bytes-like
+        The content of the file.
+
+    Returns
+    -------
+    tuple of int
+        The number of keys and the offsets of the keys, the priorities, the
+        value offsets and the values.
+
+    Raises
+    ------
+    ValueError
+        If the buffer does not hold a Treap file in the native byte order.
+    """
+    if len(buffer) < HEADER.size:
+        raise ValueError("Not a Treap file.")
+    magic, mark, count, values_size = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Not a Treap file.")
+    if mark != BYTE_ORDER_MARK:
+        raise ValueError("Treap file was written with a different byte order.")
+    keys = HEADER.size
+    priorities = keys + count * ITEM_SIZE
+    offsets = priorities + count * ITEM_SIZE
+    values = offsets + (count + 1) * ITEM_SIZE
+    if len(buffer) != values + values_size:
+        raise ValueError("Treap file is truncated.")
+    return count, keys, priorities, offsets, values
+
+
+def write_columns(path: str, keys: array, priorities: array, values: List[str]) -> None:
+    """
+    Writes the columns of a Treap to a file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+    keys : array
+        The keys in sorted order, an int64 array.
+    priorities : array
+        The priorities of the keys, an int64 array.
+    values : list of str
+        The values of the keys.
+
+    Raises
+    ------
+    TypeError
+        If some value is not a string.
+    """
+    if not all(isinstance(value, str) for value in values):
+        raise TypeError("Only str values can be saved.")
+    encoded = [value.encode() for value in values]
+    offsets = array("q", [0])
+    offsets.extend(accumulate(len(value) for value in encoded))
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, BYTE_ORDER_MARK, len(keys), offsets[-1]))
+        keys.tofile(file)
+        priorities.tofile(file)
+        offsets.tofile(file)
+        file.write(b"".join(encoded))
+
+
+def read_columns(path: str) -> Tuple[array, array, List[str]]:
+    """
+    Reads all the columns of a Treap file into memory.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+
+    Returns
+    -------
+    tuple of (array, array, list of str)
+        The keys, the priorities and the values.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid Treap file.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    count, keys_at, priorities_at, offsets_at, values_at = _layout(data)
+    keys = array("q", data[keys_at:priorities_at])
+    priorities = array("q", data[priorities_at:offsets_at])
+    offsets = array("q", data[offsets_at:values_at])
+    text = data[values_at:]
+    values = [text[offsets[i] : offsets[i + 1]].decode() for i in range(count)]
+    return keys, priorities, values
+
+
+class MappedTreap(Mapping):
+    """
+    A read-only mapping served directly from a memory-mapped Treap file.
+
+    The keys column of the file is searched with binary search, and values
+    are decoded on access, so opening the file costs O(1) regardless of its
+    size and pages are loaded by the operating system only when touched.
+
+    This class implements a mapping, as defined by the `collections.abc.Mapping` class.
+
+    Parameters
+    ----------
+    path : str
+        The path of a file written by `Treap.save`.
+
+    Methods
+    -------
+    __getitem__(key)
+        Retrieves the value for the given key.
+    __iter__()
+        Returns an iterator for the keys in sorted order.
+    __reversed__()
+        Returns an iterator for the keys in reverse sorted order.
+    __len__()
+        Returns the number of keys.
+    irange(minimum, maximum, inclusive, reverse)
+        Returns an iterator over the keys within the given bounds.
+    close()
+        Releases the mapping of the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            count, keys_at, _, offsets_at, values_at = _layout(self._mmap)
+        except ValueError:
+            self._mmap.close()
+            raise
+        self._count = count
+        self._values_at = values_at
+        self._view = memoryview(self._mmap)
+        self._keys = self._view[keys_at : keys_at + count * ITEM_SIZE].cast("q")
+        self._offsets = self._view[offsets_at:values_at].cast("q")
+
+    def _value(self, index: int) -> str:
+        """
+        Decodes the value stored at the given position.
+
+        Parameters
+        ----------
+        index : int
+            The position of the key in sorted order.
+
+        Returns
+        -------
+        str
+            The value of the key.
+        """
+        start = self._values_at + self._offsets[index]
+        end = self._values_at + self._offsets[index + 1]
+        return self._mmap[start:end].decode()
+
+    def __getitem__(self, key: int) -> str:
+        """
+        Retrieves the value associated with the given key.
+
+        Parameters
+        ----------
+        key : int
+            The key for which the value is to be retrieved.
+
+        Returns
+        -------
+        str
+            The value associated with the key.
+
+        Raises
+        ------
+        KeyError
+            If the key is not found.
+        """
+        index = bisect_left(self._keys, key)
+        if index < self._count and self._keys[index] == key:
+            return self._value(index)
+        raise KeyError(f"Key {key} not found.")
+
+    def __iter__(self) -> Generator[int, None, None]:
+        """
+        Yields the keys in sorted order.
+
+        Yields
+        ------
+        int
+            The keys in sorted order.
+        """
+        yield from self._keys
+
+    def __reversed__(self) -> Generator[int, None, None]:
+        """
+        Yields the keys in reverse sorted order.
+
+        Yields
+        ------
+        int
+            The keys in reverse sorted order.
+        """
+        keys = self._keys
+        for index in range(self._count - 1, -1, -1):
+            yield keys[index]
+
+    def __len__(self) -> int:
+        """
+        Returns the number of keys.
+
+        Returns
+        -------
+        int
+            The number of keys.
+        """
+        return self._count
+
+    def irange(
+        self,
+        minimum: Optional[int] = None,
+        maximum: Optional[int] = None,
+        inclusive: Tuple[bool, bool] = (True, True),
+        reverse: bool = False,
+    ) -> Generator[int, None, None]:
+        """
+        Iterates over the keys between `minimum` and `maximum` in sorted order.
+
+        Parameters
+        ----------
+        minimum : int, optional
+            The lower bound of the range, unbounded if not given.
+        maximum : int, optional
+            The upper bound of the range, unbounded if not given.
+        inclusive : tuple of (bool, bool)
+            Whether the lower and the upper bounds belong to the range.
+        reverse : bool
+            If `True`, the keys are yielded in descending order.
+
+        Yields
+        ------
+        int
+            The keys within the range.
+        """
+        keys = self._keys
+        start, stop = 0, self._count
+        if minimum is not None:
+            start = (bisect_left if inclusive[0] else bisect_right)(keys, minimum)
+        if maximum is not None:
+            stop = (bisect_right if inclusive[1] else bisect_left)(keys, maximum)
+        positions = range(stop - 1, start - 1, -1) if reverse else range(start, stop)
+        for index in positions:
+            yield keys[index]
+
+    def close(self) -> None:
+        """
+        Releases the mapping of the file. The object is unusable afterwards.
+        """
+        self._keys.release()
+        self._offsets.release()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self) -> "MappedTreap":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        """
+        Returns the string representation of the mapping.
+
+        Returns
+        -------
+        str
+            The string representation of the mapping.
+        """
+        return f"MappedTreap({list(self)})"
@@ -1,6 +1,66 @@
+from array import array
 from collections.abc import MutableMapping
+from itertools import count, islice
+import math
+import operator
 import random
-from typing import Optional, Generator, Tuple, Any
+from typing import (
+    Optional,
+    Generator,
+    Tuple,
+    Any,
+    Callable,
+    Iterable,
+    List,
+    Mapping,
+    Union,
+)
+
+from .mapped_treap import MappedTreap, read_columns, write_columns
+
+
+class Aggregate:
+    """
+    A monoid that a Treap maintains over the values of every subtree.
+
+    Parameters
+    ----------
+    combine : Callable[[Any, Any], Any]
+        An associative function that joins the aggregates of two adjacent
+        key ranges, the smaller keys first.
+    identity : Any
+        The aggregate of an empty range, neutral for `combine`.
+    lift : Callable[[Any], Any], optional
+        Converts a single value into an aggregate. Values are used as they
+        are if not provided.
+
+    Examples
+    --------
+    >>> treap = Treap(aggregate=SUM)
+    >>> treap.update_batch([(1, 10), (2, 20), (3, 30)])
+    >>> treap.aggregate(2, 3)
+    50
+    """
+
+    def __init__(
+        self,
+        combine: Callable[[Any, Any], Any],
+        identity: Any,
+        lift: Optional[Callable[[Any], Any]] = None,
+    ) -> None:
+        self.combine = combine
+        self.identity = identity
+        self.lift: Callable[[Any], Any] = lift if lift else lambda value: value
+
+
+SUM = Aggregate(operator.add, 0)
+MIN = Aggregate(min, math.inf)
+MAX = Aggregate(max, -math.inf)
+COUNT = Aggregate(operator.add, 0, lambda value: 1)
+
+# Versions are unique across all Treaps, so a Treap never modifies in place a
+# node created by another Treap that shares it.
+_versions = count(1)
 
 
 class TreapNode:
@@ -15,35 +75,53 @@ class TreapNode:
         The value associated with the key.
     priority : int, optional
         The priority of the node, used for balancing the Treap. If not provided,
-        a random priority is assigned.
+        a random 63-bit priority is assigned, which makes ties practically
+        impossible and keeps the expected depth logarithmic.
+
+    Attributes
+    ----------
+    size : int
+        The number of nodes in the subtree rooted at this node.
+    version : int
+        The version of the owning Treap in which the node was created.
+    aggregate : Any
+        The aggregate of the values in the subtree, if the Treap has one.
     """
 
     def __init__(self, key: int, value: str, priority: Optional[int] = None) -> None:
         self.key: int = key
         self.value: str = value
         self.priority: int = (
-            priority if priority is not None else random.randint(1, 100)
+            priority if priority is not None else random.getrandbits(63)
         )
         self.left: Optional["TreapNode"] = None
         self.right: Optional["TreapNode"] = None
+        self.size: int = 1
+        self.version: int = 0
+        self.aggregate: Any = None
 
 
-class Treap(MutableMapping):
+class TreapView(Mapping):
     """
-    A Treap is a data structure that combines properties of a binary search tree
-    and a heap. It is balanced using priorities assigned to nodes and maintains
-    the binary search tree property for keys.
+    A read-only view of a Treap.
 
-    This class implements a mutable mapping, as defined by the `collections.abc.MutableMapping` class.
+    Holds the root of a tree and implements all the operations that do not
+    modify it. `Treap` extends it with the mutating operations, and
+    `Treap.snapshot` returns instances of this class.
+
+    This class implements a mapping, as defined by the `collections.abc.Mapping` class.
+
+    Parameters
+    ----------
+    root : TreapNode or None
+        The root of the tree to view.
+    aggregate : Aggregate, optional
+        The aggregate maintained in the nodes of the tree.
 
     Methods
     -------
-    __setitem__(key, value)
-        Inserts the key-value pair into the Treap.
     __getitem__(key)
         Retrieves the value for the given key.
-    __delitem__(key)
-        Deletes the key-value pair.
     __contains__(key)
         Returns `True` if the key is in the Treap, otherwise `False`.
     __iter__()
@@ -52,158 +130,153 @@ class Treap(MutableMapping):
         Returns an iterator for the keys in reverse sorted order.
     __len__()
         Returns the number of keys in the Treap.
+    select(index)
+        Returns the key at the given position in sorted order.
+    rank(key)
+        Returns the number of keys less than the given key.
+    islice(start, stop, reverse)
+        Returns an iterator over the keys at the given positions.
+    irange(minimum, maximum, inclusive, reverse)
+        Returns an iterator over the keys within the given bounds.
+    floor(key), ceiling(key)
+        Return the nearest key not greater / not less than the given key.
+    min(), max()
+        Return the smallest / largest key.
+    bisect_left(key), bisect_right(key)
+        Return the insertion position of the key in sorted order.
+    aggregate(minimum, maximum)
+        Returns the aggregate of the values within the given bounds.
+    save(path)
+        Writes the contents to a compact binary file.
     """
 
-    def __init__(self) -> None:
-        self.root: Optional[TreapNode] = None
-
-    def _split(
-        self, node: Optional[TreapNode], key: int
-    ) -> Tuple[Optional[TreapNode], Optional[TreapNode]]:
-        """
-        Splits the tree rooted at the given node into two subtrees based on the provided key.
-
-        Parameters
-        ----------
-        node : TreapNode or None
-            The root of the tree to split.
-        key : int
-            The key at which to split the tree.
+    def __init__(
+        self, root: Optional[TreapNode] = None, aggregate: Optional[Aggregate] = None
+    ) -> None:
+        self.root: Optional[TreapNode] = root
+        self._aggregate = aggregate
 
-        Returns
-        -------
-        tuple of (TreapNode or None, TreapNode or None)
-            The left and right subtrees resulting from the split.
+    def save(self, path: str) -> None:
         """
-        if not node:
-            return None, None
-        elif key > node.key:
-            node.right, t2 = self._split(node.right, key)
-            return node, t2
-        else:
-            t1, node.left = self._split(node.left, key)
-            return t1, node
+        Writes the keys, priorities and values to a compact binary file.
 
-    def _merge(
-        self, t1: Optional[TreapNode], t2: Optional[TreapNode]
-    ) -> Optional[TreapNode]:
-        """
-        Merges two Treap subtrees into one, maintaining the heap property.
+        The file holds the keys, the priorities and the value offsets as
+        packed int64 columns in sorted order, followed by the UTF-8 encoded
+        values, and can be read back with `Treap.load`. Keys must fit into
+        64 bits and values must be strings.
 
         Parameters
         ----------
-        t1 : TreapNode or None
-            The first subtree to merge.
-        t2 : TreapNode or None
-            The second subtree to merge.
+        path : str
+            The path of the file.
 
-        Returns
-        -------
-        TreapNode or None
-            The root of the merged subtree.
+        Raises
+        ------
+        TypeError
+            If some value is not a string.
         """
-        if not t1 or not t2:
-            return t1 or t2
-        if t1.priority > t2.priority:
-            t1.right = self._merge(t1.right, t2)
-            return t1
-        else:
-            t2.left = self._merge(t1, t2.left)
-            return t2
+        keys = array("q")
+        priorities = array("q")
+        values = []
+        stack: List[TreapNode] = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            keys.append(node.key)
+            priorities.append(node.priority)
+            values.append(node.value)
+            node = node.right
+        write_columns(path, keys, priorities, values)
 
-    def _insert(self, node: Optional[TreapNode], key: int, value: str) -> TreapNode:
+    def aggregate(
+        self, minimum: Optional[int] = None, maximum: Optional[int] = None
+    ) -> Any:
         """
-        Inserts a new node with the given key and value into the tree rooted at the given node.
+        Returns the aggregate of the values whose keys are within the given bounds.
 
-        If a node with the same key already exists, the value is updated.
+        Both bounds are inclusive. The query walks down to the topmost node in
+        range and then along the two range boundaries, combining the stored
+        aggregates of the subtrees that lie entirely inside, so it takes
+        O(log n) regardless of the number of keys in the range.
 
         Parameters
         ----------
-        node : TreapNode or None
-            The root of the subtree in which to insert the new node.
-        key : int
-            The key for the new node.
-        value : str
-            The value for the new node.
+        minimum : int, optional
+            The lower bound of the range, unbounded if not given.
+        maximum : int, optional
+            The upper bound of the range, unbounded if not given.
 
         Returns
         -------
-        TreapNode
-            The root of the subtree after the insertion.
+        Any
+            The aggregate of the values in the range, the identity of the
+            aggregate for an empty range.
+
+        Raises
+        ------
+        ValueError
+            If the Treap was created without an aggregate.
         """
+        if self._aggregate is None:
+            raise ValueError("Treap was created without an aggregate.")
+        combine, lift = self._aggregate.combine, self._aggregate.lift
+        identity = self._aggregate.identity
+
+        node = self.root
+        while node:
+            if minimum is not None and node.key < minimum:
+                node = node.right
+            elif maximum is not None and node.key > maximum:
+                node = node.left
+            else:
+                break
         if not node:
-            return TreapNode(key, value)
-        if key == node.key:
-            node.value = value
-        elif key < node.key:
-            node.left = self._insert(node.left, key, value)
-            if node.left and node.left.priority > node.priority:
-                node = self._rotate_right(node)
-        else:
-            node.right = self._insert(node.right, key, value)
-            if node.right and node.right.priority > node.priority:
-                node = self._rotate_left(node)
-        return node
+            return identity
 
-    def _rotate_right(self, node: TreapNode) -> TreapNode:
-        """
-        Rotates the given subtree to the right.
+        # keys of the left subtree not less than the minimum, collected from
+        # the largest ones down
+        suffix = identity
+        current = node.left
+        while current:
+            if minimum is None or current.key >= minimum:
+                right = current.right.aggregate if current.right else identity
+                suffix = combine(combine(lift(current.value), right), suffix)
+                current = current.left
+            else:
+                current = current.right
 
-        Parameters
-        ----------
-        node : TreapNode
-            The root of the subtree to rotate.
+        # keys of the right subtree not greater than the maximum
+        prefix = identity
+        current = node.right
+        while current:
+            if maximum is None or current.key <= maximum:
+                left = current.left.aggregate if current.left else identity
+                prefix = combine(prefix, combine(left, lift(current.value)))
+                current = current.right
+            else:
+                current = current.left
 
-        Returns
-        -------
-        TreapNode
-            The new root of the subtree after rotation.
-        """
-        left = node.left
-        if not left:
-            return node  # if there is no left child, we return the node itself
-        node.left = left.right
-        if left:
-            left.right = node
-        return left
+        return combine(combine(suffix, lift(node.value)), prefix)
 
-    def _rotate_left(self, node: TreapNode) -> TreapNode:
+    @staticmethod
+    def _size(node: Optional[TreapNode]) -> int:
         """
-        Rotates the given subtree to the left.
+        Returns the size of the subtree rooted at the given node.
 
         Parameters
         ----------
-        node : TreapNode
-            The root of the subtree to rotate.
+        node : TreapNode or None
+            The root of the subtree.
 
         Returns
         -------
-        TreapNode
-            The new root of the subtree after rotation.
-        """
-        right = node.right
-        if not right:
-            return node  # if there is no right child, we return the node itself
-        node.right = right.left
-        if right:
-            right.left = node
-        return right
-
-    def __setitem__(self, key: int, value: str) -> None:
-        """
-        Sets the value for the given key in the Treap.
-
-        Parameters
-        ----------
-        key : int
-            The key to insert or update.
-        value : str
-            The value associated with the key.
+        int
+            The number of nodes in the subtree, 0 for an empty subtree.
         """
-        if self.root:
-            self.root = self._insert(self.root, key, value)
-        else:
-            self.root = TreapNode(key, value)
+        return node.size if node else 0
 
     def __getitem__(self, key: int) -> str:
         """
@@ -234,53 +307,6 @@ class Treap(MutableMapping):
                 node = node.right
         raise KeyError(f"Key {key} not found.")
 
-    def __delitem__(self, key: int) -> None:
-        """
-        Deletes the key-value pair associated with the given key.
-
-        Parameters
-        ----------
-        key : int
-            The key to delete.
-
-        Raises
-        ------
-        KeyError
-            If the key is not found in the Treap.
-        """
-        self.root = self._delete(self.root, key)
-
-    def _delete(self, node: Optional[TreapNode], key: int) -> Optional[TreapNode]:
-        """
-        Deletes a node with the given key in the subtree rooted at the given node.
-
-        Parameters
-        ----------
-        node : TreapNode or None
-            The root of the subtree to delete the node from.
-        key : int
-            The key of the node to delete.
-
-        Returns
-        -------
-        TreapNode or None
-            The root of the subtree after the node is deleted.
-
-        Raises
-        ------
-        KeyError
-            If the key is not found in the subtree.
-        """
-        if not node:
-            raise KeyError(f"Key {key} not found.")
-        if key < node.key:
-            node.left = self._delete(node.left, key)
-        elif key > node.key:
-            node.right = self._delete(node.right, key)
-        else:
-            return self._merge(node.left, node.right)
-        return node
-
     def __contains__(self, key: Any) -> bool:
         """
         Checks if the given key is present in the Treap.
@@ -327,7 +353,10 @@ class Treap(MutableMapping):
         self, node: Optional[TreapNode]
     ) -> Generator[int, None, None]:
         """
-        Helper method for in-order traversal.
+        Helper method for in-order traversal with an explicit stack.
+
+        Every node is pushed and popped once, so each key costs O(1) amortized
+        instead of passing through one generator per tree level.
 
         Parameters
         ----------
@@ -339,16 +368,20 @@ class Treap(MutableMapping):
         int
             The keys of the nodes in in-order.
         """
-        if node:
-            yield from self._in_order_traversal(node.left)
+        stack: List[TreapNode] = []
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
             yield node.key
-            yield from self._in_order_traversal(node.right)
+            node = node.right
 
     def _reverse_in_order_traversal(
         self, node: Optional[TreapNode]
     ) -> Generator[int, None, None]:
         """
-        Helper method for reverse in-order traversal.
+        Helper method for reverse in-order traversal with an explicit stack.
 
         Parameters
         ----------
@@ -360,10 +393,14 @@ class Treap(MutableMapping):
         int
             The keys of the nodes in reverse in-order.
         """
-        if node:
-            yield from self._reverse_in_order_traversal(node.right)
+        stack: List[TreapNode] = []
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.right
+            node = stack.pop()
             yield node.key
-            yield from self._reverse_in_order_traversal(node.left)
+            node = node.left
 
     def __len__(self) -> int:
         """
@@ -374,15 +411,1326 @@ class Treap(MutableMapping):
         int
             The number of nodes in the Treap.
         """
-        return sum(1 for _ in self)
+        return self._size(self.root)
 
-    def __repr__(self) -> str:
+    def select(self, index: int) -> int:
         """
-        Returns the string representation of the Treap.
+        Returns the key at the given position in sorted order.
+
+        Negative indices count from the largest key, as for lists.
+
+        Parameters
+        ----------
+        index : int
+            The position of the key, 0 is the smallest key.
 
         Returns
         -------
-        str
-            The string representation of the Treap.
+        int
+            The key at the given position.
+
+        Raises
+        ------
+        IndexError
+            If the index is out of range.
+        """
+        size = len(self)
+        position = index + size if index < 0 else index
+        if not 0 <= position < size:
+            raise IndexError(f"Index {index} out of range.")
+        index = position
+        node = self.root
+        while node:
+            left_size = self._size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node.key
+            else:
+                index -= left_size + 1
+                node = node.right
+        raise AssertionError("subtree sizes are inconsistent")
+
+    def rank(self, key: int) -> int:
+        """
+        Returns the number of keys in the Treap that are less than the given key.
+
+        The key itself does not have to be present in the Treap.
+
+        Parameters
+        ----------
+        key : int
+            The key to rank.
+
+        Returns
+        -------
+        int
+            The number of keys less than `key`.
+        """
+        result = 0
+        node = self.root
+        while node:
+            if key > node.key:
+                result += self._size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return result
+
+    def bisect_left(self, key: int) -> int:
+        """
+        Returns the position at which the key would be inserted before equal keys.
+
+        Parameters
+        ----------
+        key : int
+            The key to locate.
+
+        Returns
+        -------
+        int
+            The number of keys less than `key`.
+        """
+        return self.rank(key)
+
+    def bisect_right(self, key: int) -> int:
+        """
+        Returns the position at which the key would be inserted after equal keys.
+
+        Parameters
+        ----------
+        key : int
+            The key to locate.
+
+        Returns
+        -------
+        int
+            The number of keys less than or equal to `key`.
+        """
+        result = 0
+        node = self.root
+        while node:
+            if key >= node.key:
+                result += self._size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return result
+
+    def floor(self, key: int) -> Optional[int]:
+        """
+        Returns the largest key in the Treap that is less than or equal to the given key.
+
+        Parameters
+        ----------
+        key : int
+            The key to look up.
+
+        Returns
+        -------
+        int or None
+            The nearest key not greater than `key`, or `None` if there is none.
+        """
+        result = None
+        node = self.root
+        while node:
+            if node.key == key:
+                return key
+            if node.key < key:
+                result = node.key
+                node = node.right
+            else:
+                node = node.left
+        return result
+
+    def ceiling(self, key: int) -> Optional[int]:
+        """
+        Returns the smallest key in the Treap that is greater than or equal to the given key.
+
+        Parameters
+        ----------
+        key : int
+            The key to look up.
+
+        Returns
+        -------
+        int or None
+            The nearest key not less than `key`, or `None` if there is none.
+        """
+        result = None
+        node = self.root
+        while node:
+            if node.key == key:
+                return key
+            if node.key > key:
+                result = node.key
+                node = node.left
+            else:
+                node = node.right
+        return result
+
+    def min(self) -> int:
         """
-        return f"Treap({list(self)})"
+        Returns the smallest key in the Treap.
+
+        Returns
+        -------
+        int
+            The smallest key.
+
+        Raises
+        ------
+        ValueError
+            If the Treap is empty.
+        """
+        node = self.root
+        if not node:
+            raise ValueError("Treap is empty.")
+        while node.left:
+            node = node.left
+        return node.key
+
+    def max(self) -> int:
+        """
+        Returns the largest key in the Treap.
+
+        Returns
+        -------
+        int
+            The largest key.
+
+        Raises
+        ------
+        ValueError
+            If the Treap is empty.
+        """
+        node = self.root
+        if not node:
+            raise ValueError("Treap is empty.")
+        while node.right:
+            node = node.right
+        return node.key
+
+    def irange(
+        self,
+        minimum: Optional[int] = None,
+        maximum: Optional[int] = None,
+        inclusive: Tuple[bool, bool] = (True, True),
+        reverse: bool = False,
+    ) -> Generator[int, None, None]:
+        """
+        Iterates over the keys between `minimum` and `maximum` in sorted order.
+
+        Only the nodes on the path to the first key of the range and the
+        yielded nodes are visited, so a range of k keys costs O(log n + k).
+
+        Parameters
+        ----------
+        minimum : int, optional
+            The lower bound of the range, unbounded if not given.
+        maximum : int, optional
+            The upper bound of the range, unbounded if not given.
+        inclusive : tuple of (bool, bool)
+            Whether the lower and the upper bounds belong to the range.
+        reverse : bool
+            If `True`, the keys are yielded in descending order.
+
+        Yields
+        ------
+        int
+            The keys within the range.
+        """
+        include_min, include_max = inclusive
+
+        def above_min(key: int) -> bool:
+            if minimum is None:
+                return True
+            return key >= minimum if include_min else key > minimum
+
+        def below_max(key: int) -> bool:
+            if maximum is None:
+                return True
+            return key <= maximum if include_max else key < maximum
+
+        if reverse:
+            start_ok, stop_ok, first, second = below_max, above_min, "right", "left"
+        else:
+            start_ok, stop_ok, first, second = above_min, below_max, "left", "right"
+
+        # stack of the nodes in range on the path to the first key
+        stack = []
+        node = self.root
+        while node:
+            if start_ok(node.key):
+                stack.append(node)
+                node = getattr(node, first)
+            else:
+                node = getattr(node, second)
+        while stack:
+            node = stack.pop()
+            if not stop_ok(node.key):
+                return
+            yield node.key
+            node = getattr(node, second)
+            while node:
+                stack.append(node)
+                node = getattr(node, first)
+
+    def islice(
+        self,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        reverse: bool = False,
+    ) -> Generator[int, None, None]:
+        """
+        Iterates over the keys at positions `start` to `stop` in sorted order.
+
+        The bounds follow the slicing rules for lists, so `islice(-10)` yields
+        the ten largest keys. Only the nodes on the path to the first position
+        and the yielded nodes are visited.
+
+        Parameters
+        ----------
+        start : int, optional
+            The position of the first key, inclusive.
+        stop : int, optional
+            The position of the last key, exclusive.
+        reverse : bool
+            If `True`, the keys of the range are yielded in descending order.
+
+        Yields
+        ------
+        int
+            The keys at the positions of the range.
+        """
+        size = len(self)
+        start, stop, _ = slice(start, stop).indices(size)
+        if start >= stop:
+            return
+        if reverse:
+            keys = self._iter_from_position(size - stop, "right", "left")
+        else:
+            keys = self._iter_from_position(start, "left", "right")
+        yield from islice(keys, stop - start)
+
+    def _iter_from_position(
+        self, index: int, first: str, second: str
+    ) -> Generator[int, None, None]:
+        """
+        Helper method for traversal starting at the key with the given position.
+
+        Parameters
+        ----------
+        index : int
+            The position to start from, counted in traversal order.
+        first : str
+            The child visited before the node (`"left"` for sorted order).
+        second : str
+            The child visited after the node.
+
+        Yields
+        ------
+        int
+            The keys starting from the given position in traversal order.
+        """
+        stack = []
+        node = self.root
+        while node:
+            before = self._size(getattr(node, first))
+            if index < before:
+                stack.append(node)
+                node = getattr(node, first)
+            elif index == before:
+                stack.append(node)
+                break
+            else:
+                index -= before + 1
+                node = getattr(node, second)
+        while stack:
+            node = stack.pop()
+            yield node.key
+            node = getattr(node, second)
+            while node:
+                stack.append(node)
+                node = getattr(node, first)
+
+    def __repr__(self) -> str:
+        """
+        Returns the string representation of the Treap.
+
+        Returns
+        -------
+        str
+            The string representation of the Treap.
+        """
+        return f"{type(self).__name__}({list(self)})"
+
+
+class Treap(TreapView, MutableMapping):
+    """
+    A Treap is a data structure that combines properties of a binary search tree
+    and a heap. It is balanced using priorities assigned to nodes and maintains
+    the binary search tree property for keys.
+
+    This class implements a mutable mapping, as defined by the `collections.abc.MutableMapping` class.
+    The read-only operations are inherited from `TreapView`.
+
+    A Treap never modifies a node that may be shared with a snapshot or with
+    another Treap: the nodes on the modified paths are copied instead (path
+    copying). Nodes created after the last snapshot or set operation are
+    still modified in place, so a Treap that shares nothing pays almost
+    nothing for it.
+
+    Parameters
+    ----------
+    persistent : bool
+        Whether the Treap supports `snapshot`.
+    aggregate : Aggregate, optional
+        A monoid over the values to maintain in every subtree, for example
+        `SUM`, `MIN`, `MAX` or `COUNT`, which enables `aggregate` queries.
+
+    Methods
+    -------
+    __setitem__(key, value)
+        Inserts the key-value pair into the Treap.
+    __delitem__(key)
+        Deletes the key-value pair.
+    from_sorted(items)
+        Builds a Treap from key-value pairs sorted by key in linear time.
+    from_items(items)
+        Builds a Treap from arbitrary key-value pairs.
+    pop_min(), pop_max()
+        Remove and return the item with the smallest / largest key.
+    update_batch(items), delete_batch(keys)
+        Apply many insertions / deletions with a single tree sweep.
+    union(other), intersection(other), difference(other)
+        Return a new Treap combining the keys with the keys of another Treap.
+    snapshot()
+        Returns an immutable view of the current contents in O(1).
+    load(path, mmap)
+        Reads a Treap written by `save`.
+    """
+
+    def __init__(
+        self, persistent: bool = False, aggregate: Optional[Aggregate] = None
+    ) -> None:
+        super().__init__(aggregate=aggregate)
+        self.persistent = persistent
+        self._version = next(_versions)  # nodes of other versions may be shared
+        self._shared = False  # whether any node may be shared
+
+    def snapshot(self) -> TreapView:
+        """
+        Returns an immutable view of the current contents of the Treap.
+
+        The view shares all the nodes with the Treap and takes O(1) to create.
+        Later modifications of the Treap copy the nodes they touch, so the view
+        can be read, for example from another thread, without any locking.
+
+        Returns
+        -------
+        TreapView
+            A read-only view of the current contents.
+
+        Raises
+        ------
+        ValueError
+            If the Treap is not persistent.
+        """
+        if not self.persistent:
+            raise ValueError("Snapshots require a Treap created with persistent=True.")
+        self._version = next(_versions)
+        self._shared = True
+        return TreapView(self.root, self._aggregate)
+
+    def _new_node(
+        self, key: int, value: str, priority: Optional[int] = None
+    ) -> TreapNode:
+        """
+        Creates a node that belongs to the current version of the Treap.
+
+        Parameters
+        ----------
+        key : int
+            The key for the node.
+        value : str
+            The value associated with the key.
+        priority : int, optional
+            The priority of the node, random if not provided.
+
+        Returns
+        -------
+        TreapNode
+            The new node.
+        """
+        node = TreapNode(key, value, priority)
+        node.version = self._version
+        return node
+
+    def _touch(self, node: TreapNode) -> TreapNode:
+        """
+        Returns a node that can be modified in place instead of the given one.
+
+        A node of another version, which may be shared with a snapshot or
+        another Treap, is replaced by a copy; otherwise the node itself is
+        returned.
+
+        Parameters
+        ----------
+        node : TreapNode
+            The node that is about to be modified.
+
+        Returns
+        -------
+        TreapNode
+            The node itself or its copy.
+        """
+        if not self._shared or node.version == self._version:
+            return node
+        copy = self._new_node(node.key, node.value, node.priority)
+        copy.left, copy.right, copy.size = node.left, node.right, node.size
+        copy.aggregate = node.aggregate
+        return copy
+
+    def _copy_path(self, path: List[TreapNode]) -> List[TreapNode]:
+        """
+        Touches every node of a root-to-node path and relinks the copies.
+
+        Parameters
+        ----------
+        path : list of TreapNode
+            The nodes of a path, each one a child of the previous one.
+
+        Returns
+        -------
+        list of TreapNode
+            The nodes of the path that can be modified in place. The first one
+            is the new root of the subtree.
+        """
+        if not self._shared:
+            return path
+        copies = [self._touch(node) for node in path]
+        for parent, original, copy in zip(copies, path[1:], copies[1:]):
+            if copy is not original:
+                if parent.left is original:
+                    parent.left = copy
+                else:
+                    parent.right = copy
+        return copies
+
+    @classmethod
+    def from_sorted(
+        cls,
+        items: Iterable[Tuple[int, str]],
+        persistent: bool = False,
+        aggregate: Optional[Aggregate] = None,
+    ) -> "Treap":
+        """
+        Builds a Treap from key-value pairs sorted by key in O(n).
+
+        Parameters
+        ----------
+        items : iterable of (int, str)
+            The key-value pairs in strictly increasing order of keys.
+        persistent : bool
+            Whether the Treap supports `snapshot`.
+        aggregate : Aggregate, optional
+            A monoid over the values to maintain in every subtree.
+
+        Returns
+        -------
+        Treap
+            A new Treap containing the given pairs.
+
+        Raises
+        ------
+        ValueError
+            If the keys are not in strictly increasing order.
+        """
+        treap = cls(persistent, aggregate)
+        treap.root = treap._build(items)
+        return treap
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Union[Mapping[int, str], Iterable[Tuple[int, str]]],
+        persistent: bool = False,
+        aggregate: Optional[Aggregate] = None,
+    ) -> "Treap":
+        """
+        Builds a Treap from key-value pairs in any order.
+
+        The pairs are sorted once and then bulk-loaded with `from_sorted`,
+        which is much cheaper than inserting them one by one. If a key occurs
+        several times, the last value wins, as for `dict`.
+
+        Parameters
+        ----------
+        items : mapping or iterable of (int, str)
+            The key-value pairs to put into the Treap.
+        persistent : bool
+            Whether the Treap supports `snapshot`.
+        aggregate : Aggregate, optional
+            A monoid over the values to maintain in every subtree.
+
+        Returns
+        -------
+        Treap
+            A new Treap containing the given pairs.
+        """
+        return cls.from_sorted(sorted(dict(items).items()), persistent, aggregate)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        mmap: bool = False,
+        persistent: bool = False,
+        aggregate: Optional[Aggregate] = None,
+    ) -> Union["Treap", MappedTreap]:
+        """
+        Reads a Treap from a file written by `save`.
+
+        With `mmap=False` the file is read at once and the tree is rebuilt in
+        O(n) with the saved priorities, so it has exactly the saved shape.
+        With `mmap=True` the file is memory-mapped and served as a read-only
+        `MappedTreap` without deserializing it, which is instant for any size.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+        mmap : bool
+            Whether to return a read-only memory-mapped view of the file.
+        persistent : bool
+            Whether the loaded Treap supports `snapshot`.
+        aggregate : Aggregate, optional
+            A monoid over the values to maintain in every subtree.
+
+        Returns
+        -------
+        Treap or MappedTreap
+            The loaded Treap, or the memory-mapped view of the file.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a valid Treap file.
+        """
+        if mmap:
+            return MappedTreap(path)
+        keys, priorities, values = read_columns(path)
+        treap = cls(persistent, aggregate)
+        treap.root = treap._build(zip(keys, values), priorities)
+        return treap
+
+    def _build(
+        self,
+        items: Iterable[Tuple[int, str]],
+        priorities: Optional[Iterable[int]] = None,
+        aggregate: bool = True,
+    ) -> Optional[TreapNode]:
+        """
+        Builds a subtree from sorted key-value pairs as a Cartesian tree.
+
+        The right spine of the tree built so far is kept on a stack. Each new
+        node pops the spine nodes with lower priority, adopts the last popped
+        one as its left child and becomes the right child of the new top, so
+        every node is pushed and popped once.
+
+        Parameters
+        ----------
+        items : iterable of (int, str)
+            The key-value pairs in strictly increasing order of keys.
+        priorities : iterable of int, optional
+            The priorities of the nodes, random if not provided.
+        aggregate : bool
+            Whether to compute the aggregates, False for temporary trees whose
+            values are only placeholders.
+
+        Returns
+        -------
+        TreapNode or None
+            The root of the built subtree.
+
+        Raises
+        ------
+        ValueError
+            If the keys are not in strictly increasing order.
+        """
+        stack: List[TreapNode] = []
+        priority_of = iter(priorities) if priorities is not None else None
+        for key, value in items:
+            if stack and not key > stack[-1].key:
+                raise ValueError("Keys must be in strictly increasing order.")
+            priority = next(priority_of) if priority_of else None
+            node = self._new_node(key, value, priority)
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+                self._update(last, aggregate)  # its subtree is complete
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        root = None
+        while stack:
+            root = stack.pop()
+            self._update(root, aggregate)
+        return root
+
+    def _update(self, node: TreapNode, aggregate: bool = True) -> None:
+        """
+        Recomputes the subtree size and aggregate of the given node from its children.
+
+        Must be called whenever the children of the node change.
+
+        Parameters
+        ----------
+        node : TreapNode
+            The node to update.
+        aggregate : bool
+            Whether to recompute the aggregate, False for the nodes of trees
+            that only provide keys.
+        """
+        left, right = node.left, node.right
+        node.size = 1 + (left.size if left else 0) + (right.size if right else 0)
+        if aggregate and self._aggregate:
+            combine = self._aggregate.combine
+            aggregate = self._aggregate.lift(node.value)
+            if left:
+                aggregate = combine(left.aggregate, aggregate)
+            if right:
+                aggregate = combine(aggregate, right.aggregate)
+            node.aggregate = aggregate
+
+    def _split(
+        self, node: Optional[TreapNode], key: int, aggregate: bool = True
+    ) -> Tuple[Optional[TreapNode], Optional[TreapNode]]:
+        """
+        Splits the tree rooted at the given node into two subtrees based on the provided key.
+
+        The split walks down a single path and hangs the visited nodes onto the
+        right spine of the left subtree or the left spine of the right subtree.
+
+        Parameters
+        ----------
+        node : TreapNode or None
+            The root of the tree to split.
+        key : int
+            The key at which to split the tree.
+        aggregate : bool
+            Whether to recompute the aggregates, False for trees that only
+            provide keys.
+
+        Returns
+        -------
+        tuple of (TreapNode or None, TreapNode or None)
+            The left and right subtrees resulting from the split: keys less
+            than `key` and keys greater than or equal to `key`.
+        """
+        left_root: Optional[TreapNode] = None
+        right_root: Optional[TreapNode] = None
+        left_tail: Optional[TreapNode] = None  # last nodes attached to each side
+        right_tail: Optional[TreapNode] = None
+        path = []
+        while node:
+            node = self._touch(node)
+            path.append(node)
+            if key > node.key:
+                if left_tail:
+                    left_tail.right = node
+                else:
+                    left_root = node
+                left_tail = node
+                node = node.right
+            else:
+                if right_tail:
+                    right_tail.left = node
+                else:
+                    right_root = node
+                right_tail = node
+                node = node.left
+        if left_tail:
+            left_tail.right = None
+        if right_tail:
+            right_tail.left = None
+        for visited in reversed(path):
+            self._update(visited, aggregate)
+        return left_root, right_root
+
+    def _merge(
+        self, t1: Optional[TreapNode], t2: Optional[TreapNode]
+    ) -> Optional[TreapNode]:
+        """
+        Merges two Treap subtrees into one, maintaining the heap property.
+
+        All keys in `t1` must be less than all keys in `t2`. The merge zips the
+        right spine of `t1` with the left spine of `t2` in priority order.
+
+        Parameters
+        ----------
+        t1 : TreapNode or None
+            The first subtree to merge.
+        t2 : TreapNode or None
+            The second subtree to merge.
+
+        Returns
+        -------
+        TreapNode or None
+            The root of the merged subtree.
+        """
+        root: Optional[TreapNode] = None
+        parent: Optional[TreapNode] = None
+        attach_left = False
+        path = []
+        while t1 and t2:
+            if t1.priority > t2.priority:
+                child = self._touch(t1)
+                t1, next_left = child.right, False
+            else:
+                child = self._touch(t2)
+                t2, next_left = child.left, True
+            if parent is None:
+                root = child
+            elif attach_left:
+                parent.left = child
+            else:
+                parent.right = child
+            path.append(child)
+            parent, attach_left = child, next_left
+        rest = t1 or t2
+        if parent is None:
+            return rest
+        if attach_left:
+            parent.left = rest
+        else:
+            parent.right = rest
+        for visited in reversed(path):
+            self._update(visited)
+        return root
+
+    def _insert(self, node: Optional[TreapNode], key: int, value: str) -> TreapNode:
+        """
+        Inserts a new node with the given key and value into the tree rooted at the given node.
+
+        If a node with the same key already exists, the value is updated.
+        Otherwise the new node is placed where its priority fits on the search
+        path, and the subtree it replaces is split around the new key.
+
+        Parameters
+        ----------
+        node : TreapNode or None
+            The root of the subtree in which to insert the new node.
+        key : int
+            The key for the new node.
+        value : str
+            The value for the new node.
+
+        Returns
+        -------
+        TreapNode
+            The root of the subtree after the insertion.
+        """
+        path = []
+        current = node
+        while current:
+            path.append(current)
+            if key == current.key:
+                path = self._copy_path(path)
+                path[-1].value = value
+                for visited in reversed(path):
+                    self._update(visited)
+                return path[0]
+            current = current.left if key < current.key else current.right
+
+        new = self._new_node(key, value)
+        go_left = False
+        path = []
+        current = node
+        # descend until the new node has to become the root of the subtree
+        while current and current.priority >= new.priority:
+            path.append(current)
+            go_left = key < current.key
+            current = current.left if go_left else current.right
+        new.left, new.right = self._split(current, key)
+        self._update(new)
+        if not path:
+            return new
+        path = self._copy_path(path)
+        if go_left:
+            path[-1].left = new
+        else:
+            path[-1].right = new
+        for visited in reversed(path):
+            self._update(visited)
+        return path[0]
+
+    def __setitem__(self, key: int, value: str) -> None:
+        """
+        Sets the value for the given key in the Treap.
+
+        Parameters
+        ----------
+        key : int
+            The key to insert or update.
+        value : str
+            The value associated with the key.
+        """
+        self.root = self._insert(self.root, key, value)
+
+    def __delitem__(self, key: int) -> None:
+        """
+        Deletes the key-value pair associated with the given key.
+
+        Parameters
+        ----------
+        key : int
+            The key to delete.
+
+        Raises
+        ------
+        KeyError
+            If the key is not found in the Treap.
+        """
+        self.root = self._delete(self.root, key)
+
+    def _delete(self, node: Optional[TreapNode], key: int) -> Optional[TreapNode]:
+        """
+        Deletes a node with the given key in the subtree rooted at the given node.
+
+        Parameters
+        ----------
+        node : TreapNode or None
+            The root of the subtree to delete the node from.
+        key : int
+            The key of the node to delete.
+
+        Returns
+        -------
+        TreapNode or None
+            The root of the subtree after the node is deleted.
+
+        Raises
+        ------
+        KeyError
+            If the key is not found in the subtree.
+        """
+        go_left = False
+        path = []
+        current = node
+        while current and key != current.key:
+            path.append(current)
+            go_left = key < current.key
+            current = current.left if go_left else current.right
+        if not current:
+            raise KeyError(f"Key {key} not found.")
+
+        merged = self._merge(current.left, current.right)
+        if not path:
+            return merged
+        path = self._copy_path(path)
+        if go_left:
+            path[-1].left = merged
+        else:
+            path[-1].right = merged
+        for visited in reversed(path):
+            self._update(visited)
+        return path[0]
+
+    def pop_min(self) -> Tuple[int, str]:
+        """
+        Removes the item with the smallest key and returns it.
+
+        Returns
+        -------
+        tuple of (int, str)
+            The removed key and its value.
+
+        Raises
+        ------
+        KeyError
+            If the Treap is empty.
+        """
+        return self._pop_end("left", "right")
+
+    def pop_max(self) -> Tuple[int, str]:
+        """
+        Removes the item with the largest key and returns it.
+
+        Returns
+        -------
+        tuple of (int, str)
+            The removed key and its value.
+
+        Raises
+        ------
+        KeyError
+            If the Treap is empty.
+        """
+        return self._pop_end("right", "left")
+
+    def _pop_end(self, side: str, other: str) -> Tuple[int, str]:
+        """
+        Helper method that unlinks the outermost node on the given side.
+
+        The outermost node has no child on that side, so it is replaced by its
+        other child and only the sizes along the path need to be updated.
+
+        Parameters
+        ----------
+        side : str
+            `"left"` to remove the smallest key, `"right"` for the largest.
+        other : str
+            The opposite side.
+
+        Returns
+        -------
+        tuple of (int, str)
+            The removed key and its value.
+
+        Raises
+        ------
+        KeyError
+            If the Treap is empty.
+        """
+        node = self.root
+        if not node:
+            raise KeyError("Treap is empty.")
+        path = []
+        while getattr(node, side):
+            path.append(node)
+            node = getattr(node, side)
+        if not path:
+            self.root = getattr(node, other)
+            return node.key, node.value
+        path = self._copy_path(path)
+        setattr(path[-1], side, getattr(node, other))
+        for visited in reversed(path):
+            self._update(visited)
+        self.root = path[0]
+        return node.key, node.value
+
+    def update_batch(
+        self, items: Union[Mapping[int, str], Iterable[Tuple[int, str]]]
+    ) -> None:
+        """
+        Sets the values of many keys at once.
+
+        The batch is sorted once, bulk-loaded into a temporary tree in linear
+        time and joined with the Treap in a single `union` sweep, instead of
+        descending from the root for every key. If a key occurs several times
+        in the batch, the last value wins.
+
+        Parameters
+        ----------
+        items : mapping or iterable of (int, str)
+            The key-value pairs to insert or update.
+        """
+        batch = self._build(sorted(dict(items).items()))
+        self.root = self._union(self.root, batch)
+
+    def delete_batch(self, keys: Iterable[int]) -> None:
+        """
+        Deletes many keys at once.
+
+        Like `update_batch`, the keys are sorted, bulk-loaded and removed with
+        a single `difference` sweep. Keys that are not present are ignored.
+
+        Parameters
+        ----------
+        keys : iterable of int
+            The keys to delete.
+        """
+        batch = self._build(((key, "") for key in sorted(set(keys))), aggregate=False)
+        self.root = self._difference(self.root, batch)
+
+    def _share(self, other: "Treap") -> "Treap":
+        """
+        Creates an empty Treap for the result of a set operation that may
+        share the nodes of this Treap and `other`.
+
+        Both Treaps switch to new versions, so none of the three modifies the
+        shared nodes in place afterwards.
+
+        Parameters
+        ----------
+        other : Treap
+            The second operand.
+
+        Returns
+        -------
+        Treap
+            The empty result.
+        """
+        self._version = next(_versions)
+        other._version = next(_versions)
+        result = type(self)(self.persistent, self._aggregate)
+        self._shared = other._shared = result._shared = True
+        return result
+
+    def union(self, other: "Treap") -> "Treap":
+        """
+        Returns a new Treap with the items of this Treap and another one.
+
+        Values of the keys present in both Treaps are taken from `other`, as
+        for `dict.update`. The trees are combined by splitting and joining
+        subtrees, which takes O(m log(n/m)) for sizes m <= n instead of one
+        root descent per key. The result shares the subtrees it does not
+        change with both Treaps and copies only the nodes on the changed
+        paths. Both Treaps are left unchanged.
+
+        Parameters
+        ----------
+        other : Treap
+            The Treap whose items are added.
+
+        Returns
+        -------
+        Treap
+            The union.
+        """
+        result = self._share(other)
+        root = other.root
+        if other._aggregate is not self._aggregate:
+            root = result._copy(root)  # its nodes become part of the result
+        result.root = result._union(self.root, root)
+        return result
+
+    def intersection(self, other: "Treap") -> "Treap":
+        """
+        Returns a new Treap with the items whose keys are present in another Treap.
+
+        The values are taken from this Treap. Both Treaps are left unchanged.
+
+        Parameters
+        ----------
+        other : Treap
+            The Treap whose keys are kept.
+
+        Returns
+        -------
+        Treap
+            The intersection.
+        """
+        result = self._share(other)
+        result.root = result._intersection(self.root, other.root)
+        return result
+
+    def difference(self, other: "Treap") -> "Treap":
+        """
+        Returns a new Treap with the items whose keys are absent from another Treap.
+
+        Both Treaps are left unchanged.
+
+        Parameters
+        ----------
+        other : Treap
+            The Treap whose keys are removed.
+
+        Returns
+        -------
+        Treap
+            The difference.
+        """
+        result = self._share(other)
+        result.root = result._difference(self.root, other.root)
+        return result
+
+    def _copy(self, node: Optional[TreapNode]) -> Optional[TreapNode]:
+        """
+        Copies the structure of a subtree, keeping keys, values and priorities.
+
+        The sizes and aggregates are recomputed, because the subtree may come
+        from a Treap with a different aggregate.
+
+        Parameters
+        ----------
+        node : TreapNode or None
+            The root of the subtree to copy.
+
+        Returns
+        -------
+        TreapNode or None
+            The root of the copy.
+        """
+        if not node:
+            return None
+        root = self._new_node(node.key, node.value, node.priority)
+        copies = []
+        stack = [(node, root)]
+        while stack:
+            original, copy = stack.pop()
+            copies.append(copy)
+            if original.left:
+                copy.left = self._new_node(
+                    original.left.key, original.left.value, original.left.priority
+                )
+                stack.append((original.left, copy.left))
+            if original.right:
+                copy.right = self._new_node(
+                    original.right.key, original.right.value, original.right.priority
+                )
+                stack.append((original.right, copy.right))
+        for copy in reversed(copies):  # children are copied after their parents
+            self._update(copy)
+        return root
+
+    def _split_off_key(
+        self, node: Optional[TreapNode], key: int, aggregate: bool = True
+    ) -> Tuple[Optional[TreapNode], Optional[TreapNode]]:
+        """
+        Removes the node with the given key from a subtree of keys not less than it.
+
+        Such a node can only be the leftmost one, so a single descent is enough.
+
+        Parameters
+        ----------
+        node : TreapNode or None
+            The root of a subtree whose keys are all greater than or equal to `key`.
+        key : int
+            The key to remove.
+        aggregate : bool
+            Whether to recompute the aggregates, False for trees that only
+            provide keys.
+
+        Returns
+        -------
+        tuple of (TreapNode or None, TreapNode or None)
+            The removed node (or `None` if the key is absent) and the root of
+            the remaining subtree.
+        """
+        path = []
+        current = node
+        while current and current.left:
+            path.append(current)
+            current = current.left
+        if not current or current.key != key:
+            return None, node
+        if not path:
+            return current, current.right
+        path = self._copy_path(path)
+        path[-1].left = current.right
+        for visited in reversed(path):
+            self._update(visited, aggregate)
+        return current, path[0]
+
+    def _union(
+        self, t1: Optional[TreapNode], t2: Optional[TreapNode]
+    ) -> Optional[TreapNode]:
+        """
+        Joins two subtrees with arbitrary keys into one.
+
+        The root with the higher priority stays on top, the other subtree is
+        split around its key and both halves are joined recursively.
+
+        Parameters
+        ----------
+        t1 : TreapNode or None
+            The first subtree.
+        t2 : TreapNode or None
+            The second subtree, whose values win for common keys.
+
+        Returns
+        -------
+        TreapNode or None
+            The root of the joined subtree.
+        """
+        if not t1 or not t2:
+            return t1 or t2
+        if t1.priority >= t2.priority:
+            t1 = self._touch(t1)
+            less, rest = self._split(t2, t1.key)
+            same, greater = self._split_off_key(rest, t1.key)
+            if same:
+                t1.value = same.value
+            t1.left = self._union(t1.left, less)
+            t1.right = self._union(t1.right, greater)
+            self._update(t1)
+            return t1
+        t2 = self._touch(t2)
+        less, rest = self._split(t1, t2.key)
+        _, greater = self._split_off_key(rest, t2.key)
+        t2.left = self._union(less, t2.left)
+        t2.right = self._union(greater, t2.right)
+        self._update(t2)
+        return t2
+
+    def _intersection(
+        self, t1: Optional[TreapNode], t2: Optional[TreapNode]
+    ) -> Optional[TreapNode]:
+        """
+        Keeps the keys of the first subtree that are present in the second one.
+
+        Parameters
+        ----------
+        t1 : TreapNode or None
+            The first subtree, whose values are kept.
+        t2 : TreapNode or None
+            The second subtree.
+
+        Returns
+        -------
+        TreapNode or None
+            The root of the resulting subtree.
+        """
+        if not t1 or not t2:
+            return None
+        root_is_first = t1.priority >= t2.priority
+        root, other = (t1, t2) if root_is_first else (t2, t1)
+        # the nodes of the second subtree only provide keys
+        less, rest = self._split(other, root.key, not root_is_first)
+        same, greater = self._split_off_key(rest, root.key, not root_is_first)
+        if root_is_first:
+            left = self._intersection(root.left, less)
+            right = self._intersection(root.right, greater)
+        else:
+            left = self._intersection(less, root.left)
+            right = self._intersection(greater, root.right)
+        if not same:
+            return self._merge(left, right)
+        root = self._touch(root)
+        if not root_is_first:
+            root.value = same.value  # values are taken from the first subtree
+        root.left, root.right = left, right
+        self._update(root)
+        return root
+
+    def _difference(
+        self, t1: Optional[TreapNode], t2: Optional[TreapNode]
+    ) -> Optional[TreapNode]:
+        """
+        Keeps the keys of the first subtree that are absent from the second one.
+
+        Parameters
+        ----------
+        t1 : TreapNode or None
+            The subtree to remove keys from.
+        t2 : TreapNode or None
+            The subtree with the keys to remove.
+
+        Returns
+        -------
+        TreapNode or None
+            The root of the resulting subtree.
+        """
+        if not t1 or not t2:
+            return t1
+        if t1.priority >= t2.priority:
+            # the nodes of the second subtree only provide keys
+            less, rest = self._split(t2, t1.key, aggregate=False)
+            same, greater = self._split_off_key(rest, t1.key, aggregate=False)
+            left = self._difference(t1.left, less)
+            right = self._difference(t1.right, greater)
+            if same:
+                return self._merge(left, right)
+            t1 = self._touch(t1)
+            t1.left, t1.right = left, right
+            self._update(t1)
+            return t1
+        less, rest = self._split(t1, t2.key)
+        _, greater = self._split_off_key(rest, t2.key)
+        return self._merge(
+            self._difference(less, t2.left), self._difference(greater, t2.right)
+        )
@@ -0,0 +1,78 @@
+import argparse
+import functools
+import sys
+import time
+
+import shared
+
+sys.path.insert(0, str(shared.ROOT))
+
+from project.decorators.cache_decorator import cache_results  # noqa: E402
+
+
+def one(x):
+    return x
+
+
+def two(x, y):
+    return x + y
+
+
+def measure(title, func, count, repeat):
+    """Runs `func` `repeat` times and prints the best time and the time per call."""
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"  {title:<28} {elapsed:8.3f} s  {elapsed / count * 1e9:8.0f} ns/call")
+
+
+def decorators(size):
+    """Returns the compared decorators by name."""
+    return {
+        "plain": lambda func: func,
+        "functools.lru_cache": functools.lru_cache(maxsize=size),
+        "cache_results": cache_results(max_size=size),
+        "cache_results typed": cache_results(max_size=size, typed=True),
+        "cache_results key=": cache_results(max_size=size, key=lambda *args: args),
+        "cache_results lfu": cache_results(max_size=size, policy="lfu"),
+        "cache_results thread_safe": cache_results(max_size=size, thread_safe=True),
+    }
+
+
+def bench(calls, keys, repeat):
+    """Measures the overhead of the hits: all the keys fit in the caches."""
+    size = 4 * keys  # leaves room for the uneven shards of thread-safe caches
+    arguments = [i % keys for i in range(calls)]
+    strings = [str(x) for x in arguments]
+    cases = {
+        "f(int)": lambda f, g: [f(x) for x in arguments],
+        "f(str)": lambda f, g: [f(s) for s in strings],
+        "f(int, int)": lambda f, g: [g(x, 1) for x in arguments],
+        "f(int, y=int)": lambda f, g: [g(x, y=1) for x in arguments],
+    }
+    print(f"calls = {calls}, distinct keys = {keys}")
+    for case, run in cases.items():
+        print(case)
+        for name, decorator in decorators(size).items():
+            if name == "cache_results key=" and "y=" in case:
+                continue  # the key function takes only positional arguments
+            f, g = decorator(one), decorator(two)
+            run(f, g)  # fills the caches
+            measure(name, lambda: run(f, g), calls, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Overhead of cache_results compared with functools.lru_cache."
+    )
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    bench(args.calls, args.keys, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
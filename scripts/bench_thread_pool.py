@@ -0,0 +1,100 @@
+import argparse
+from collections import deque
+import itertools
+import sys
+import threading
+import time
+
+import shared
+
+sys.path.insert(0, str(shared.ROOT))
+
+from project.threadpool.thread_pool import ThreadPool  # noqa: E402
+
+
+def bench_depth(depth, num_threads, metrics=False, batch_size=1, many=False):
+    """Fills the queue to `depth` tasks while the workers are blocked, then drains it."""
+    pool = ThreadPool(num_threads, metrics=metrics, batch_size=batch_size)
+    gate = threading.Event()
+    done = threading.Event()
+    counter = itertools.count(1)
+
+    def task():
+        if next(counter) == depth:
+            done.set()
+
+    for _ in range(num_threads):
+        pool.enqueue(gate.wait)
+
+    start = time.perf_counter()
+    if many:
+        pool.enqueue_many(itertools.repeat(task, depth))
+    else:
+        for _ in range(depth):
+            pool.enqueue(task)
+    enqueued = time.perf_counter()
+    gate.set()
+    done.wait()
+    drained = time.perf_counter()
+    pool.dispose()
+
+    enqueue_rate = depth / (enqueued - start)
+    drain_rate = depth / (drained - enqueued)
+    print(
+        f"  depth {depth:>8}  enqueue {enqueue_rate:>10.0f} tasks/s"
+        f"  dequeue+run {drain_rate:>10.0f} tasks/s"
+    )
+
+
+def bench_containers(depth):
+    """Compares draining `depth` items from a list and from a deque."""
+    items = list(range(depth))
+    start = time.perf_counter()
+    while items:
+        items.pop(0)
+    list_time = time.perf_counter() - start
+
+    queued = deque(range(depth))
+    start = time.perf_counter()
+    while queued:
+        queued.popleft()
+    deque_time = time.perf_counter() - start
+    print(
+        f"  depth {depth:>8}  list.pop(0) {list_time:8.3f} s"
+        f"  deque.popleft() {deque_time:8.3f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the ThreadPool queue.")
+    parser.add_argument(
+        "depths", nargs="*", type=int, default=[1_000, 10_000, 100_000, 300_000]
+    )
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--metrics", action="store_true", help="enable the timing of tasks"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1, help="tasks taken by a thread at once"
+    )
+    parser.add_argument(
+        "--many", action="store_true", help="enqueue the tasks with enqueue_many"
+    )
+    args = parser.parse_args()
+
+    print(f"ThreadPool with {args.threads} threads")
+    for depth in args.depths:
+        bench_depth(
+            depth,
+            args.threads,
+            metrics=args.metrics,
+            batch_size=args.batch_size,
+            many=args.many,
+        )
+    print("Queue containers")
+    for depth in args.depths:
+        bench_containers(depth)
+
+
+if __name__ == "__main__":
+    main()
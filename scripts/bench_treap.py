@@ -0,0 +1,79 @@
+import argparse
+import random
+import sys
+import time
+
+import shared
+
+sys.path.insert(0, str(shared.ROOT))
+
+from project.treap.treap import Treap  # noqa: E402
+
+
+def depth(treap):
+    """Returns the depth of the treap, computed without recursion."""
+    result = 0
+    stack = [(treap.root, 1)] if treap.root else []
+    while stack:
+        node, level = stack.pop()
+        result = max(result, level)
+        for child in (node.left, node.right):
+            if child:
+                stack.append((child, level + 1))
+    return result
+
+
+def measure(title, func, count):
+    """Runs `func` once and prints the total time and the time per operation."""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"  {title:<14} {elapsed:8.3f} s  {elapsed / count * 1e9:8.0f} ns/op")
+
+
+def bench(size):
+    keys = list(range(size))
+    random.shuffle(keys)
+    treap = Treap()
+
+    def insert():
+        for key in keys:
+            treap[key] = "v"
+
+    def lookup():
+        for key in keys:
+            treap[key]
+
+    def iterate():
+        for _ in treap:
+            pass
+
+    def bulk_load():
+        Treap.from_sorted((key, "v") for key in range(size))
+
+    def delete():
+        for key in keys:
+            del treap[key]
+
+    print(f"n = {size}")
+    measure("insert", insert, size)
+    print(f"  depth          {depth(treap)}")
+    measure("lookup", lookup, size)
+    measure("iterate", iterate, size)
+    measure("len x 1000", lambda: [len(treap) for _ in range(1000)], 1000)
+    measure("from_sorted", bulk_load, size)
+    measure("delete", delete, size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the Treap core.")
+    parser.add_argument(
+        "sizes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000]
+    )
+    args = parser.parse_args()
+    for size in args.sizes:
+        bench(size)
+
+
+if __name__ == "__main__":
+    main()
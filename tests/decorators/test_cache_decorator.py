@@ -1,5 +1,11 @@
 import pytest
-from project.decorators.cache_decorator import cache_results
+import threading
+import time
+from project.decorators.cache_decorator import (
+    cache_results,
+    make_key,
+    registered_caches,
+)
 
 
 @cache_results(max_size=3)
@@ -15,12 +21,331 @@ def expensive_function(x, y):
         (1, 2, 3),  # Get from cache
         (2, 3, 5),  # Saved to cache
         (3, 4, 7),  # Saved to cache: cache full now (3, 5, 7)
+        (1, 2, 3),  # Get from cache, now the most recently used
+        (4, 5, 9),  # Added to cache, removes the least recently used result 5
         (1, 2, 3),  # Get from cache
-        (4, 5, 9),  # Added to cache, removes result 3 from cache
-        (1, 2, 3),  # New computation, added to cache
     ],
 )
 def test_cache_expensive_function(x, y, expected):
     """Test to verify caching behavior without flag."""
     result = expensive_function(x, y)
     assert result == expected
+
+
+def counting(func):
+    """Wraps a function to record the arguments of every call."""
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return func(*args, **kwargs)
+
+    wrapper.calls = calls
+    return wrapper
+
+
+def test_lru_keeps_hot_keys():
+    """Test that a hit protects the key from eviction."""
+    square = counting(lambda x: x * x)
+    cached = cache_results(max_size=2)(square)
+    for x in [1, 2, 1, 3, 1, 2]:
+        cached(x)
+    assert square.calls == [(1,), (2,), (3,), (2,)]
+
+
+def test_max_size_zero_disables_caching():
+    """Test that max_size=0 computes every call."""
+    square = counting(lambda x: x * x)
+    cached = cache_results(max_size=0)(square)
+    assert [cached(2), cached(2)] == [4, 4]
+    assert square.calls == [(2,), (2,)]
+
+
+def test_unbounded_cache():
+    """Test that max_size=None never evicts."""
+    square = counting(lambda x: x * x)
+    cached = cache_results(max_size=None)(square)
+    for _ in range(2):
+        for x in range(100):
+            cached(x)
+    assert len(square.calls) == 100
+
+
+def test_lfu_policy():
+    """Test that the least frequently used result is evicted."""
+    square = counting(lambda x: x * x)
+    cached = cache_results(max_size=2, policy="lfu")(square)
+    for x in [1, 1, 2, 3, 1, 2]:
+        cached(x)
+    assert square.calls == [(1,), (2,), (3,), (2,)]
+
+
+def test_ttl_policy():
+    """Test that results are recomputed after they expire."""
+    square = counting(lambda x: x * x)
+    cached = cache_results(max_size=10, policy="ttl", ttl=0.05)(square)
+    cached(3)
+    cached(3)
+    time.sleep(0.1)
+    cached(3)
+    assert square.calls == [(3,), (3,)]
+
+
+def test_size_policy():
+    """Test that the cache is bounded by the size of the results."""
+    make = counting(lambda n: "x" * n)
+    cached = cache_results(max_size=None, policy="size", max_bytes=250)(make)
+    for n in [100, 100, 10, 100]:
+        cached(n)
+    assert make.calls == [(100,), (10,)]
+    cached(200)  # does not fit together with the others
+    cached(100)
+    assert make.calls[-1] == (100,)
+
+
+def test_none_result_is_cached():
+    """Test that None results are cached like any other result."""
+    nothing = counting(lambda x: None)
+    cached = cache_results(max_size=2)(nothing)
+    assert cached(1) is None
+    assert cached(1) is None
+    assert nothing.calls == [(1,)]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"max_size": -1},
+        {"max_size": 1, "policy": "random"},
+        {"max_size": 1, "policy": "ttl"},
+        {"max_size": 1, "policy": "size"},
+        {"max_size": 1, "thread_safe": True, "shards": 0},
+        {"policy": "ttl", "ttl": 1},  # max_size=0 would cache nothing
+        {"policy": "size", "max_bytes": 1000},
+    ],
+)
+def test_invalid_arguments(kwargs):
+    """Test ValueError for invalid cache parameters."""
+    with pytest.raises(ValueError):
+        cache_results(**kwargs)
+
+
+def test_thread_safe_size_policy():
+    """Test that max_bytes bounds the whole thread-safe cache, not each shard."""
+    make = counting(lambda n: "x" * n)
+    cached = cache_results(
+        max_size=None, policy="size", max_bytes=1000, thread_safe=True, shards=8
+    )(make)
+    for n in [400, 400, 200, 200]:
+        cached(n)
+    assert make.calls == [(400,), (200,)]  # larger than max_bytes / shards
+    cached(800)
+    assert cached.cache_info().size == 1
+
+
+def run_in_threads(func, count):
+    """Calls `func(i)` in `count` threads started at the same time."""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def target(i):
+        barrier.wait()
+        try:
+            func(i)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def test_single_flight():
+    """Test that concurrent misses of the same key compute it once."""
+    slow = counting(lambda x: time.sleep(0.05) or x * 2)
+    cached = cache_results(max_size=10, thread_safe=True)(slow)
+    results = []
+    errors = run_in_threads(lambda i: results.append(cached(i % 2)), 8)
+    assert errors == []
+    assert sorted(results) == [0] * 4 + [2] * 4
+    assert sorted(slow.calls) == [(0,), (1,)]
+
+
+def test_single_flight_shares_exceptions():
+    """Test that waiting callers get the exception of the computing one."""
+
+    def fail(x):
+        time.sleep(0.05)
+        raise ValueError(x)
+
+    failing = counting(fail)
+    cached = cache_results(max_size=10, thread_safe=True)(failing)
+    errors = run_in_threads(lambda i: cached(1), 4)
+    assert len(errors) == 4
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert len(failing.calls) == 1
+    with pytest.raises(ValueError):
+        cached(1)  # exceptions are not cached
+    assert len(failing.calls) == 2
+
+
+def test_thread_safe_eviction():
+    """Test that a thread-safe cache stays within its bounds under contention."""
+    square = counting(lambda x: x * x)
+    cached = cache_results(max_size=16, thread_safe=True, shards=4)(square)
+
+    def scan(i):
+        for x in range(i, 200 + i):
+            assert cached(x) == x * x
+
+    errors = run_in_threads(scan, 8)
+    assert errors == []
+    assert [cached(x) for x in range(50)] == [x * x for x in range(50)]
+
+
+def test_thread_safe_recursion():
+    """Test that a cached function may call itself while computing."""
+
+    @cache_results(max_size=None, thread_safe=True)
+    def fibonacci(n):
+        return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+
+    assert fibonacci(80) == 23416728348467685
+
+
+def test_cache_info():
+    """Test the counters reported by cache_info()."""
+    cached = cache_results(max_size=2)(lambda x: x * x)
+    for x in [1, 1, 2, 3, 1]:
+        cached(x)
+    info = cached.cache_info()
+    assert (info.hits, info.misses, info.evictions) == (1, 4, 2)
+    assert (info.max_size, info.size) == (2, 2)
+    assert info.time_saved == pytest.approx(info.average_compute_time)
+    cached.cache_clear()
+    assert cached.cache_info()[:5] == (0, 0, 0, 2, 0)
+    cached(1)
+    assert cached.cache_info().misses == 1
+
+
+@pytest.mark.parametrize("kwargs", [{"max_size": 0}, {"thread_safe": True}])
+def test_cache_info_variants(kwargs):
+    """Test cache_info() of uncached and thread-safe functions."""
+    cached = cache_results(**{"max_size": 4, **kwargs})(lambda x: x)
+    for x in [1, 1, 1]:
+        cached(x)
+    info = cached.cache_info()
+    assert info.hits + info.misses == 3
+    assert info.misses == (3 if kwargs.get("max_size") == 0 else 1)
+    cached.cache_clear()
+    assert cached.cache_info().hits + cached.cache_info().misses == 0
+
+
+def test_hot_keys_sampling():
+    """Test that sampling reports the most used keys."""
+    sampled = []
+    cached = cache_results(max_size=4, sample_every=2, on_sample=sampled.append)(
+        lambda x: x
+    )
+    for x in [1, 1, 2, 1, 1, 3, 1, 1]:
+        cached(x)
+    assert len(sampled) == 4
+    assert cached.hot_keys(1) == [(1, 3)]
+    cached.cache_clear()
+    assert cached.hot_keys() == []
+    assert cache_results(max_size=4)(lambda x: x).hot_keys() == []
+    with pytest.raises(ValueError):
+        cache_results(sample_every=-1)
+
+
+def test_hot_keys_sampling_thread_safe():
+    """Test that concurrent calls can be sampled and reported safely."""
+    cached = cache_results(max_size=64, thread_safe=True, sample_every=1)(lambda x: x)
+
+    def call(i):
+        for j in range(2000):
+            cached(0 if j % 2 else i * 2000 + j)
+            if j % 100 == 0:
+                cached.hot_keys()
+
+    assert run_in_threads(call, 8) == []
+    assert cached.hot_keys(1)[0][0] == 0
+
+
+def test_registered_caches():
+    """Test that the registry lists the live cached functions."""
+
+    @cache_results(max_size=1)
+    def registered(x):
+        return x
+
+    assert registered in registered_caches()
+    assert expensive_function in registered_caches()
+    del registered
+    assert all(func.__name__ != "registered" for func in registered_caches())
+
+
+def test_make_key():
+    """Test that distinct calls get distinct keys."""
+    keys = [
+        make_key((1,), {}),
+        make_key(("1",), {}),
+        make_key(((1,),), {}),
+        make_key((1, 2), {}),
+        make_key(((1, 2),), {}),
+        make_key((1,), {"y": 2}),
+        make_key((1, "y", 2), {}),
+        make_key((1,), {}, typed=True),
+    ]
+    assert len(set(keys)) == len(keys)
+    assert make_key((1,), {}) == 1
+    assert make_key((), {"a": 1, "b": 2}) == make_key((), {"b": 2, "a": 1})
+
+
+@pytest.mark.parametrize("thread_safe", [False, True])
+def test_key_paths(thread_safe):
+    """Test that the inlined keys distinguish the calls like make_key."""
+    pair = counting(lambda *args, **kwargs: (args, kwargs))
+    cached = cache_results(max_size=None, thread_safe=thread_safe)(pair)
+    calls = [((1,), {}), (((1,),), {}), (("1",), {}), ((1, 2), {}), ((1,), {"y": 2})]
+    for args, kwargs in calls * 2:
+        assert cached(*args, **kwargs) == (args, kwargs)
+    assert len(pair.calls) == len(calls)
+    cached(y=2, z=3)
+    cached(z=3, y=2)
+    assert len(pair.calls) == len(calls) + 1
+
+
+@pytest.mark.parametrize("thread_safe", [False, True])
+def test_typed(thread_safe):
+    """Test that typed=True caches equal arguments of different types apart."""
+    untyped = cache_results(max_size=None, thread_safe=thread_safe)(lambda x: x)
+    typed = cache_results(max_size=None, typed=True, thread_safe=thread_safe)(
+        lambda x, y=0: (x, y)
+    )
+    assert untyped(1) == 1
+    assert untyped(1.0) == 1.0
+    assert untyped((1,)) == (1,)
+    assert untyped((1.0,)) == (1,)  # equal tuples share the result
+    assert type(typed(1)[0]) is int
+    assert type(typed(1.0)[0]) is float
+    assert type(typed(1, y=1)[1]) is int
+    assert type(typed(1, y=1.0)[1]) is float
+    assert typed.cache_info().size == 4
+
+
+@pytest.mark.parametrize("thread_safe", [False, True])
+def test_custom_key(thread_safe):
+    """Test that key= decides which calls share a result."""
+    lookup = counting(lambda name, verbose=False: name.upper())
+    cached = cache_results(
+        max_size=None,
+        thread_safe=thread_safe,
+        key=lambda name, verbose=False: name,
+    )(lookup)
+    assert cached("a") == cached("a", verbose=True) == "A"
+    assert cached("b") == "B"
+    assert lookup.calls == [("a",), ("b",)]
@@ -0,0 +1,133 @@
+import pytest
+from project.decorators.cache_policies import (
+    MISSING,
+    LRUCache,
+    LFUCache,
+    TTLCache,
+    SizeCache,
+    make_cache,
+    make_sharded_cache,
+)
+
+
+class FakeTimer:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_cache():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    cache.put("a", 10)  # updates do not evict
+    assert len(cache) == 2
+    assert cache.get("a") == 10
+    assert cache.evictions == 1
+
+
+def test_lfu_cache_ties_are_lru():
+    cache = LFUCache(max_size=3)
+    for key in "abc":
+        cache.put(key, key)
+    cache.get("a")
+    cache.get("b")
+    cache.put("d", "d")  # c is used least
+    assert cache.get("c") is MISSING
+    cache.put("e", "e")  # d is used least
+    assert cache.get("d") is MISSING
+    cache.get("e")
+    cache.get("e")
+    cache.put("f", "f")  # a and b were used twice, a longer ago
+    assert cache.get("a") is MISSING
+    assert [cache.get(key) for key in "bef"] == ["b", "e", "f"]
+    assert cache.evictions == 3
+
+
+def test_lfu_cache_clear():
+    cache = LFUCache(max_size=1)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.clear()
+    assert len(cache) == 0
+    cache.put("b", 2)
+    cache.put("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache():
+    timer = FakeTimer()
+    cache = TTLCache(ttl=10, max_size=2, timer=timer)
+    cache.put("a", 1)
+    timer.now = 5
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    timer.now = 10
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+    cache.put("c", 3)
+    cache.put("d", 4)  # full, b expires first
+    assert cache.get("b") is MISSING
+    timer.now = 30
+    cache.put("e", 5)  # drops the expired entries
+    assert len(cache) == 1
+    assert cache.evictions == 4
+
+
+def test_size_cache():
+    cache = SizeCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.get("a")
+    cache.put("c", "xxxx")  # b is the least recently used
+    assert cache.get("b") is MISSING
+    assert cache.total_bytes == 8
+    cache.put("d", "x" * 11)  # larger than the whole cache
+    assert cache.get("d") is MISSING
+    cache.put("a", "x")
+    assert cache.total_bytes == 5
+    cache.clear()
+    assert cache.total_bytes == 0
+
+
+@pytest.mark.parametrize(
+    "policy,cache_type",
+    [("lru", LRUCache), ("lfu", LFUCache), ("ttl", TTLCache), ("size", SizeCache)],
+)
+def test_make_cache(policy, cache_type):
+    cache = make_cache(policy, 5, ttl=1.0, max_bytes=100)
+    assert isinstance(cache, cache_type)
+    assert cache.max_size == 5
+
+
+def test_sharded_cache_bounds():
+    cache = make_sharded_cache(8, "lru", max_size=3)
+    assert len(cache._shards) == 3  # never more shards than entries
+    for x in range(100):
+        cache.get_or_compute(x, abs, (x,), {})
+    assert len(cache) <= 3
+    assert cache.evictions == 100 - len(cache)
+    cache.clear()
+    assert len(cache) == 0
+    with pytest.raises(ValueError):
+        make_sharded_cache(0, "lru", max_size=3)
+
+
+def test_sharded_cache_stats():
+    cache = make_sharded_cache(2, "lru", max_size=10)
+    for x in [1, 2, 1, 1]:
+        cache.get_or_compute(x, abs, (x,), {})
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.computed) == (2, 2, 2)
+    assert stats.compute_time >= 0
+    cache.clear()
+    assert cache.stats.hits == cache.stats.misses == 0
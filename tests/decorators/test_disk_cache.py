@@ -0,0 +1,163 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from project.decorators.cache_decorator import cache_results
+from project.decorators.cache_policies import MISSING
+from project.decorators.disk_cache import DiskCache, encode_key
+
+
+def make_square(path, calls, **kwargs):
+    """Returns a square function cached on disk that records its arguments."""
+
+    @cache_results(max_size=10, disk=DiskCache(path), **kwargs)
+    def square(x, power=2):
+        calls.append(x)
+        return x**power
+
+    return square
+
+
+def test_survives_restart(tmp_path):
+    path = tmp_path / "cache.db"
+    calls = []
+    square = make_square(path, calls)
+    assert [square(2), square(3, power=3), square(2)] == [4, 27, 4]
+    assert calls == [2, 3]
+    restarted = make_square(path, calls)  # a new memory cache and connection
+    assert [restarted(2), restarted(3, power=3), restarted(4)] == [4, 27, 16]
+    assert calls == [2, 3, 4]
+
+
+def test_thread_safe_tier(tmp_path):
+    path = tmp_path / "cache.db"
+    calls = []
+    make_square(path, calls, thread_safe=True)(5)
+    assert make_square(path, calls, thread_safe=True)(5) == 25
+    assert calls == [5]
+
+
+def test_lazy_open(tmp_path):
+    path = tmp_path / "cache.db"
+    disk = DiskCache(path)
+    assert not path.exists()
+    assert disk.get("key") is MISSING
+    assert path.exists()
+    disk.close()
+    disk.put("key", None)
+    assert disk.get("key") is None
+    assert (disk.hits, disk.misses) == (1, 1)
+
+
+def test_eviction_by_count(tmp_path):
+    disk = DiskCache(tmp_path / "cache.db", max_size=3)
+    for key in "abc":
+        disk.put(key, key)
+    disk.get("a")  # now the most recently used
+    disk.put("d", "d")
+    assert len(disk) == 3
+    assert disk.get("b") is MISSING
+    assert [disk.get(key) for key in "acd"] == ["a", "c", "d"]
+    assert disk.evictions == 1
+    disk.close()
+    reopened = DiskCache(tmp_path / "cache.db", max_size=2)
+    reopened.put("e", "e")
+    assert len(reopened) == 2
+    assert reopened.get("d") == "d"  # the recency survives restarts
+
+
+def test_eviction_by_bytes(tmp_path):
+    disk = DiskCache(tmp_path / "cache.db", max_bytes=8, serializer=json)
+    disk.put("a", "12345")  # 7 characters as JSON
+    disk.put("a", "123")
+    assert disk.total_bytes == 5
+    disk.put("b", "123")
+    assert disk.get("a") is MISSING
+    disk.put("c", "x" * 20)  # too large to store
+    assert disk.get("c") is MISSING
+    assert disk.get("b") == "123"
+    disk.clear()
+    assert len(disk) == disk.total_bytes == 0
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"thread_safe": True}])
+def test_unstorable_result_is_returned(tmp_path, kwargs):
+    disk = DiskCache(tmp_path / "cache.db")
+    calls = []
+
+    @cache_results(max_size=10, disk=disk, **kwargs)
+    def make_lock(x):
+        calls.append(x)
+        return threading.Lock()  # cannot be pickled
+
+    lock = make_lock(1)
+    assert make_lock(1) is lock  # kept in memory
+    assert calls == [1]
+    assert len(disk) == 0
+
+
+def test_undecodable_value_is_recomputed(tmp_path):
+    path = tmp_path / "cache.db"
+    calls = []
+    make_square(path, calls)(2)  # stored with pickle
+
+    def make_json_square():
+        @cache_results(max_size=10, disk=DiskCache(path, serializer=json))
+        def square(x, power=2):
+            calls.append(x)
+            return x**power
+
+        return square
+
+    assert make_json_square()(2) == 4  # the pickled value cannot be decoded
+    assert make_json_square()(2) == 4  # it has been replaced
+    assert calls == [2, 2]
+    disk = DiskCache(tmp_path / "other.db", serializer=json)
+    disk.put("key", "value")
+    disk._connect().execute("UPDATE entries SET value = ?", (b"\xff",))
+    assert disk.get("key") is MISSING
+    assert len(disk) == 0
+    assert (disk.hits, disk.misses) == (0, 1)
+
+
+def test_keys_are_stable_across_processes():
+    key = ((1, "a"), frozenset({("x", "1"), ("y", "2"), ("z", 3)}))
+    script = (
+        "from project.decorators.disk_cache import encode_key\n"
+        f"print(encode_key({key!r}).hex())"
+    )
+    for seed in ["1", "2"]:
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        output = subprocess.run(
+            [sys.executable, "-c", script], env=env, capture_output=True, text=True
+        ).stdout
+        assert output.split()[-1] == encode_key(key).hex()
+
+
+def test_bounds_hold_across_processes(tmp_path):
+    path = tmp_path / "cache.db"
+    script = (
+        "import sys\n"
+        "from project.decorators.disk_cache import DiskCache\n"
+        f"disk = DiskCache({str(path)!r}, max_size=100, max_bytes=5000)\n"
+        "for i in range(300):\n"
+        "    disk.put((sys.argv[1], i), 'x' * 30)\n"
+    )
+    writers = [
+        subprocess.Popen([sys.executable, "-c", script, str(n)]) for n in range(3)
+    ]
+    assert [writer.wait() for writer in writers] == [0, 0, 0]
+    disk = DiskCache(path)
+    assert len(disk) == 100
+    assert disk.total_bytes <= 5000
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        DiskCache(tmp_path / "cache.db", max_size=0)
+    with pytest.raises(ValueError):
+        DiskCache(tmp_path / "cache.db", max_bytes=0)
+    with pytest.raises(ValueError):
+        cache_results(max_size=0, disk=DiskCache(tmp_path / "cache.db"))
@@ -0,0 +1,148 @@
+import pytest
+import math
+import operator
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from project.matvec.matrix_operations import matrix_multiplication
+from project.threadpool.process_pool import ProcessPool
+
+
+@pytest.fixture
+def process_pool():
+    pool = ProcessPool(num_processes=2)
+    yield pool
+    pool.dispose()
+
+
+def test_submit_result(process_pool):
+    future = process_pool.submit(matrix_multiplication, [[1, 2], [3, 4]], [[5], [6]])
+    assert future.result(timeout=10) == [[17], [39]]
+
+
+def test_submit_keyword_arguments(process_pool):
+    assert process_pool.submit(int, "ff", base=16).result(timeout=10) == 255
+
+
+def test_submit_exception(process_pool):
+    future = process_pool.submit(math.sqrt, -1)
+    with pytest.raises(ValueError):
+        future.result(timeout=10)
+
+
+def test_submit_unpicklable(process_pool):
+    with pytest.raises(Exception):
+        process_pool.submit(lambda: 1)
+    assert process_pool.submit(abs, -1).result(timeout=10) == 1
+
+
+class TwoArgumentError(Exception):
+    """An exception that cannot be unpickled: only `a` is kept in its args."""
+
+    def __init__(self, a, b):
+        super().__init__(a)
+
+
+def raise_two_argument_error():
+    raise TwoArgumentError(1, 2)
+
+
+def test_submit_exception_not_unpicklable(process_pool):
+    future = process_pool.submit(raise_two_argument_error)
+    with pytest.raises(RuntimeError) as error:
+        future.result(timeout=10)
+    assert isinstance(error.value.__cause__, TypeError)
+    assert process_pool.submit(abs, -3).result(timeout=10) == 3
+
+
+@pytest.mark.parametrize("chunksize", [1, 3, 100])
+def test_map(process_pool, chunksize):
+    results = process_pool.map(math.factorial, range(20), chunksize=chunksize)
+    assert list(results) == [math.factorial(n) for n in range(20)]
+
+
+def test_map_invalid_chunksize(process_pool):
+    with pytest.raises(ValueError):
+        process_pool.map(abs, [1], chunksize=0)
+
+
+def test_enqueue_runs_before_dispose():
+    pool = ProcessPool(num_processes=2)
+    for _ in range(5):
+        pool.enqueue(partial(operator.mul, 6, 7))
+    future = pool.submit(operator.add, 1, 2)
+    pool.dispose()
+    assert future.result(timeout=0) == 3
+    pool.dispose()  # a second call does nothing
+
+
+def test_submit_after_dispose():
+    pool = ProcessPool(num_processes=1)
+    pool.dispose()
+    with pytest.raises(RuntimeError):
+        pool.enqueue(partial(abs, -1))
+
+
+def test_worker_death_is_reported():
+    pool = ProcessPool(num_processes=1)
+    pid = pool.processes[0].pid
+    future = pool.submit(os._exit, 1)
+    with pytest.raises(BrokenProcessPool):
+        future.result(timeout=10)
+    assert pool.submit(abs, -1).result(timeout=10) == 1
+    assert pool.processes[0].pid != pid  # the worker was replaced
+    pool.dispose()
+
+
+def test_worker_death_spares_other_workers():
+    pool = ProcessPool(num_processes=2)
+    slow = pool.submit(time.sleep, 0.5)  # keeps the first worker busy
+    crash = pool.submit(os._exit, 1)  # sent to the idle worker
+    with pytest.raises(BrokenProcessPool):
+        crash.result(timeout=10)
+    assert slow.result(timeout=10) is None
+    assert list(pool.map(abs, range(-5, 0))) == [5, 4, 3, 2, 1]
+    pool.dispose()
+
+
+def test_dispatched_task_cannot_be_cancelled(process_pool):
+    future = process_pool.submit(time.sleep, 0.2)
+    assert not future.cancel()
+    assert future.result(timeout=10) is None
+
+
+def is_running(pid):
+    """Returns whether the process exists and is not a zombie."""
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_workers_exit_with_parent():
+    script = (
+        "import os\n"
+        "from project.threadpool.process_pool import ProcessPool\n"
+        "pool = ProcessPool(num_processes=2)\n"
+        "try:\n"
+        "    pool.submit(os._exit, 1).result(timeout=10)\n"  # replaces a worker
+        "except Exception:\n"
+        "    pass\n"
+        "assert pool.submit(abs, -1).result(timeout=10) == 1\n"
+        "print(*[process.pid for process in pool.processes], flush=True)\n"
+        "os._exit(0)\n"  # skips dispose() and the cleanup of multiprocessing
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, timeout=30
+    ).stdout
+    pids = [int(pid) for pid in output.splitlines()[-1].split()]
+    assert len(pids) == 2
+    deadline = time.monotonic() + 10
+    while any(map(is_running, pids)) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not any(map(is_running, pids))
@@ -1,4 +1,6 @@
 import pytest
+import asyncio
+import queue
 import threading
 import time
 from project.threadpool.thread_pool import ThreadPool
@@ -85,3 +87,638 @@ def test_pool_size_not_less_than_n_2():
         len(pool.threads) < n
     )  # check that there are not less than n threads in the pool
     pool.dispose()
+
+
+def test_submit_result(thread_pool):
+    future = thread_pool.submit(lambda x, y=1: x * y, 6, y=7)
+    assert future.result(timeout=1) == 42
+    assert future.exception() is None
+
+
+def test_submit_exception(thread_pool):
+    def fail():
+        raise ValueError("boom")
+
+    future = thread_pool.submit(fail)
+    assert isinstance(future.exception(timeout=1), ValueError)
+    with pytest.raises(ValueError):
+        future.result()
+
+
+def test_submit_done_callback(thread_pool):
+    done = threading.Event()
+    results = []
+
+    def callback(future):
+        results.append(future.result())
+        done.set()
+
+    thread_pool.submit(sum, [1, 2, 3]).add_done_callback(callback)
+    assert done.wait(timeout=1)
+    assert results == [6]
+
+
+@pytest.mark.parametrize("chunksize", [1, 3, 100])
+def test_map(thread_pool, chunksize):
+    def square(x):
+        time.sleep(0.001 * (x % 3))
+        return x * x
+
+    results = thread_pool.map(square, range(20), chunksize=chunksize)
+    assert list(results) == [x * x for x in range(20)]
+
+
+def test_map_invalid_chunksize(thread_pool):
+    with pytest.raises(ValueError):
+        thread_pool.map(abs, [1], chunksize=0)
+
+
+def test_bounded_queue_rejects_when_full():
+    pool = ThreadPool(num_threads=1, max_queue_size=2)
+    gate = threading.Event()
+    pool.enqueue(gate.wait)  # keeps the only thread busy
+    time.sleep(0.1)
+    pool.enqueue(lambda: None)
+    pool.enqueue(lambda: None)
+    with pytest.raises(queue.Full):
+        pool.enqueue(lambda: None, block=False)
+    with pytest.raises(queue.Full):
+        pool.enqueue(lambda: None, timeout=0.05)
+    gate.set()
+    pool.dispose()
+
+
+def test_bounded_queue_blocks_until_free():
+    pool = ThreadPool(num_threads=2, max_queue_size=1)
+    results = []
+    for i in range(20):
+        pool.enqueue(lambda i=i: results.append(i))  # blocks instead of failing
+    assert pool.submit(len, results).result(timeout=1) >= 0
+    pool.dispose()
+    assert sorted(results) == list(range(20))
+
+
+def test_work_stealing_local_enqueue():
+    pool = ThreadPool(num_threads=2, work_stealing=True)
+    queued = []
+    done = threading.Event()
+
+    def parent():
+        pool.enqueue(done.set)
+        queued.append(len(pool.tasks))  # the child is not in the shared queue
+
+    pool.enqueue(parent)
+    assert done.wait(timeout=1)
+    pool.dispose()
+    assert queued == [0]
+
+
+def test_work_stealing_spreads_fan_out():
+    pool = ThreadPool(num_threads=4, work_stealing=True)
+    lock = threading.Lock()
+    threads = set()
+    count = [0]
+    done = threading.Event()
+
+    def leaf():
+        time.sleep(0.01)
+        with lock:
+            threads.add(threading.current_thread().name)
+            count[0] += 1
+            if count[0] == 28:
+                done.set()
+
+    def node(depth):
+        if depth == 0:
+            leaf()
+            return
+        for _ in range(2):
+            pool.enqueue(lambda: node(depth - 1))
+        leaf()
+
+    for _ in range(4):
+        pool.enqueue(lambda: node(2))  # 4 trees of 1 + 2 + 4 leaves
+    finished = done.wait(timeout=5)
+    pool.dispose()
+    assert finished
+    assert len(threads) > 1
+
+
+def test_work_stealing_idle_threads_sleep(monkeypatch):
+    waits = []
+    wait = threading.Condition.wait
+
+    def counting_wait(self, timeout=None):
+        waits.append(timeout)
+        return wait(self, timeout)
+
+    monkeypatch.setattr(threading.Condition, "wait", counting_wait)
+    pool = ThreadPool(num_threads=4, work_stealing=True)
+    time.sleep(0.3)
+    idle_waits = len(waits)
+    assert list(pool.map(abs, range(-20, 0))) == list(range(20, 0, -1))
+    pool.dispose()
+    assert idle_waits <= 8  # no periodic wakeups while there is no work
+
+
+def test_work_stealing_map():
+    pool = ThreadPool(num_threads=3, work_stealing=True)
+    assert list(pool.map(lambda x: x + 1, range(50), chunksize=4)) == list(range(1, 51))
+    pool.dispose()
+
+
+def test_elastic_pool_grows_and_shrinks():
+    pool = ThreadPool(num_threads=1, max_threads=3, idle_timeout=0.1)
+    gate = threading.Event()
+    for _ in range(5):
+        pool.enqueue(gate.wait)
+    grown = pool.size
+    gate.set()
+    deadline = time.monotonic() + 5
+    while pool.size > 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    shrunk = pool.size
+    pool.dispose()
+    assert grown == 3
+    assert shrunk == 1
+    events = [event for _, event, _ in pool.scaling_events]
+    assert events == ["grow", "grow", "shrink", "shrink"]
+
+
+def test_elastic_pool_grows_on_wait_time():
+    pool = ThreadPool(num_threads=1, max_threads=2, grow_threshold=100, max_wait=0.05)
+    gate = threading.Event()
+    pool.enqueue(gate.wait)
+    pool.enqueue(gate.set)
+    assert pool.size == 1  # the queue is short and has not waited yet
+    time.sleep(0.1)
+    pool.enqueue(lambda: None)
+    finished = gate.wait(timeout=1)
+    size = pool.size
+    pool.dispose()
+    assert finished
+    assert size == 2
+
+
+def test_elastic_work_stealing_retires_threads():
+    pool = ThreadPool(
+        num_threads=1, max_threads=3, idle_timeout=0.1, work_stealing=True
+    )
+    results = []
+    done = threading.Event()
+
+    def child(i):
+        results.append(i)
+        if len(results) == 10:
+            done.set()
+
+    def parent():
+        for i in range(10):
+            pool.enqueue(lambda i=i: child(i))
+
+    gate = threading.Event()
+    pool.enqueue(gate.wait)
+    pool.enqueue(parent)
+    gate.set()
+    finished = done.wait(timeout=2)
+    time.sleep(0.3)
+    size = pool.size
+    pool.dispose()
+    assert finished
+    assert sorted(results) == list(range(10))
+    assert size == 1
+
+
+def test_invalid_max_threads():
+    with pytest.raises(ValueError):
+        ThreadPool(num_threads=2, max_threads=1)
+
+
+def test_priority_scheduling():
+    pool = ThreadPool(num_threads=1, scheduling="priority")
+    gate = threading.Event()
+    order = []
+    pool.enqueue(gate.wait)  # keeps the only thread busy while tasks are queued
+    time.sleep(0.05)
+    for priority, name in [(5, "batch"), (0, "urgent"), (5, "batch2"), (1, "normal")]:
+        pool.enqueue(lambda name=name: order.append(name), priority=priority)
+    gate.set()
+    pool.submit_task(lambda: None, priority=10).result(timeout=1)
+    pool.dispose()
+    assert order == ["urgent", "normal", "batch", "batch2"]
+
+
+def test_priority_aging():
+    pool = ThreadPool(num_threads=1, scheduling="priority", aging=100.0)
+    gate = threading.Event()
+    order = []
+    pool.enqueue(gate.wait)
+    time.sleep(0.05)
+    pool.enqueue(lambda: order.append("old"), priority=5)
+    time.sleep(0.1)  # 0.1 s of waiting is worth 10 priority levels
+    pool.enqueue(lambda: order.append("new"), priority=0)
+    gate.set()
+    pool.submit_task(lambda: None, priority=100).result(timeout=1)
+    pool.dispose()
+    assert order == ["old", "new"]
+
+
+def test_deadline_expires_queued_task():
+    pool = ThreadPool(num_threads=1, scheduling="priority")
+    gate = threading.Event()
+    pool.enqueue(gate.wait)
+    time.sleep(0.05)
+    late = pool.submit_task(lambda: "late", deadline=time.monotonic() + 0.05)
+    in_time = pool.submit_task(lambda: "ok", deadline=time.monotonic() + 10)
+    time.sleep(0.1)
+    gate.set()
+    with pytest.raises(TimeoutError):
+        late.result(timeout=1)
+    assert in_time.result(timeout=1) == "ok"
+    passed = pool.submit_task(lambda: None, deadline=time.monotonic() - 1)
+    assert isinstance(passed.exception(timeout=0), TimeoutError)  # fails at once
+    pool.dispose()
+
+
+def test_invalid_scheduling_options():
+    with pytest.raises(ValueError):
+        ThreadPool(num_threads=1, scheduling="lifo")
+    with pytest.raises(ValueError):
+        ThreadPool(num_threads=1, scheduling="priority", work_stealing=True)
+    pool = ThreadPool(num_threads=1)
+    with pytest.raises(ValueError):
+        pool.enqueue(lambda: None, priority=1)
+    pool.dispose()
+
+
+def test_failing_task_does_not_kill_worker(caplog):
+    pool = ThreadPool(num_threads=1)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    pool.enqueue(fail)
+    assert pool.submit(lambda: 42).result(timeout=1) == 42
+    pool.dispose()
+    assert "boom" in caplog.text
+    assert pool.snapshot()["failed"] == 1
+
+
+def test_snapshot_and_hooks():
+    pool = ThreadPool(num_threads=2, max_queue_size=1, metrics=True)
+    records = []
+    pool.hooks.append(lambda wait, run, error: records.append((wait, run, error)))
+    gate = threading.Event()
+    pool.enqueue(gate.wait)
+    pool.enqueue(gate.wait)
+    time.sleep(0.05)
+    pool.enqueue(lambda: time.sleep(0.01))
+    with pytest.raises(queue.Full):
+        pool.enqueue(lambda: None, block=False)
+    busy = pool.snapshot()
+    gate.set()
+    pool.submit(lambda: None).result(timeout=1)
+    time.sleep(0.05)
+    snapshot = pool.snapshot()
+    pool.dispose()
+    assert busy["queued"] == 1
+    assert busy["rejected"] == 1
+    assert busy["idle"] == 0
+    assert snapshot["enqueued"] == 4
+    assert snapshot["completed"] == 4
+    assert snapshot["wait_time"]["count"] == 4
+    assert snapshot["run_time"]["max"] >= 0.05  # the gated tasks
+    assert sum(snapshot["run_time"]["buckets"].values()) == 4
+    assert len(snapshot["busy_ratio"]) == 2
+    assert all(0 < ratio <= 1 for ratio in snapshot["busy_ratio"].values())
+    assert len(records) == 4
+    assert all(error is None for _, _, error in records)
+
+
+def test_snapshot_counts_expired_tasks():
+    pool = ThreadPool(num_threads=1, scheduling="priority")
+    pool.enqueue(lambda: None, deadline=time.monotonic() - 1)
+    pool.dispose()
+    assert pool.snapshot()["expired"] == 1
+
+
+def test_snapshot_work_stealing():
+    pool = ThreadPool(num_threads=2, work_stealing=True)
+    done = threading.Event()
+    pool.enqueue(lambda: pool.enqueue(done.set))
+    assert done.wait(timeout=1)
+    time.sleep(0.05)
+    snapshot = pool.snapshot()
+    pool.dispose()
+    assert snapshot["enqueued"] == 2
+    assert snapshot["completed"] == 2
+
+
+def test_metrics_disabled_by_default():
+    pool = ThreadPool(num_threads=1)
+    records = []
+    pool.hooks.append(lambda *record: records.append(record))
+    pool.enqueue(lambda: 1 / 0)
+    pool.submit(lambda: None).result(timeout=1)
+    time.sleep(0.05)
+    snapshot = pool.snapshot()
+    pool.dispose()
+    assert snapshot["completed"] == 1
+    assert snapshot["failed"] == 1
+    assert snapshot["run_time"]["count"] == 0
+    assert records == []
+
+
+def test_join_waits_for_all_tasks():
+    pool = ThreadPool(num_threads=2)
+    result = []
+    for i in range(10):
+        pool.enqueue(lambda i=i: (time.sleep(0.01), result.append(i)))
+    assert pool.join(timeout=5)
+    assert sorted(result) == list(range(10))
+    assert pool.join(timeout=0)  # nothing left to wait for
+    pool.dispose()
+
+
+def test_join_timeout():
+    pool = ThreadPool(num_threads=1)
+    gate = threading.Event()
+    pool.enqueue(gate.wait)
+    assert not pool.join(timeout=0.05)
+    gate.set()
+    assert pool.join(timeout=1)
+    pool.dispose()
+
+
+def test_join_work_stealing_children():
+    pool = ThreadPool(num_threads=3, work_stealing=True)
+    result = []
+
+    def node(depth):
+        time.sleep(0.005)
+        result.append(depth)
+        if depth:
+            for _ in range(2):
+                pool.enqueue(lambda: node(depth - 1))
+
+    pool.enqueue(lambda: node(4))
+    assert pool.join(timeout=5)
+    assert len(result) == 31  # 1 + 2 + 4 + 8 + 16 nodes
+    pool.dispose()
+
+
+def test_shutdown_drains_queue():
+    pool = ThreadPool(num_threads=1)
+    result = []
+    for i in range(5):
+        pool.enqueue(lambda i=i: (time.sleep(0.01), result.append(i)))
+    future = pool.submit(lambda: "last")
+    assert pool.shutdown(timeout=5)
+    assert result == [0, 1, 2, 3, 4]
+    assert future.result(timeout=0) == "last"
+    with pytest.raises(RuntimeError):
+        pool.enqueue(lambda: None)
+    with pytest.raises(RuntimeError):
+        pool.submit(lambda: None)
+
+
+def test_shutdown_cancel_pending():
+    pool = ThreadPool(num_threads=1)
+    gate = threading.Event()
+    result = []
+    pool.enqueue(gate.wait)
+    time.sleep(0.05)
+    pool.enqueue(lambda: result.append("plain"))
+    future = pool.submit(lambda: result.append("future"))
+    assert not pool.shutdown(wait=False, cancel_pending=True)
+    gate.set()
+    assert pool.shutdown(timeout=5)
+    assert future.cancelled()
+    assert result == ["plain"]
+
+
+def test_shutdown_without_drain():
+    pool = ThreadPool(num_threads=1)
+    gate = threading.Event()
+    result = []
+    pool.enqueue(gate.wait)
+    time.sleep(0.05)
+    pool.enqueue(lambda: result.append(1))
+    future = pool.submit(lambda: 2)
+    threading.Timer(0.05, gate.set).start()
+    assert pool.shutdown(drain=False, timeout=5)
+    assert result == []
+    assert future.cancelled()
+    assert pool.join(timeout=0)
+
+
+def test_shutdown_drain_allows_follow_up_tasks():
+    pool = ThreadPool(num_threads=2)
+    result = []
+
+    def parent():
+        time.sleep(0.05)
+        pool.enqueue(lambda: result.append("child"))
+
+    pool.enqueue(parent)
+    pool.shutdown(timeout=5)
+    assert result == ["child"]
+
+
+def test_context_manager():
+    result = []
+    with ThreadPool(num_threads=2) as pool:
+        for i in range(5):
+            pool.enqueue(lambda i=i: result.append(i))
+    assert sorted(result) == list(range(5))
+    assert all(not thread.is_alive() for thread in pool.threads)
+
+
+def test_dispose_cancels_queued_futures():
+    pool = ThreadPool(num_threads=1)
+    gate = threading.Event()
+    pool.enqueue(gate.wait)
+    time.sleep(0.05)
+    future = pool.submit(lambda: 1)
+    threading.Timer(0.05, gate.set).start()
+    pool.dispose()
+    pool.dispose()  # a second call does nothing
+    assert future.cancelled()
+
+
+def test_run_awaits_result(thread_pool):
+    async def main():
+        loop_thread = threading.get_ident()
+        results = await asyncio.gather(
+            thread_pool.run(threading.get_ident),
+            thread_pool.run(pow, 2, 10),
+            thread_pool.run(int, "ff", base=16),
+        )
+        return loop_thread, results
+
+    loop_thread, (worker_thread, power, number) = asyncio.run(main())
+    assert worker_thread != loop_thread
+    assert (power, number) == (1024, 255)
+
+
+def test_run_exception(thread_pool):
+    async def main():
+        await thread_pool.run(lambda: 1 / 0)
+
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(main())
+
+
+def test_run_does_not_block_loop(thread_pool):
+    async def main():
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(thread_pool.run(time.sleep, 0.1), ticker())
+        return ticks
+
+    ticks = asyncio.run(main())
+    assert len(ticks) == 5
+    assert ticks[-1] - ticks[0] < 0.1
+
+
+def test_amap_bounded_in_flight():
+    pool = ThreadPool(num_threads=4)
+    lock = threading.Lock()
+    running = [0, 0]  # current, maximum
+
+    def work(x):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return x * x
+
+    async def main():
+        return [result async for result in pool.amap(work, range(20), max_in_flight=2)]
+
+    results = asyncio.run(main())
+    pool.dispose()
+    assert sorted(results) == [x * x for x in range(20)]
+    assert running[1] <= 2
+
+
+def test_amap_yields_in_completion_order(thread_pool):
+    async def main():
+        return [
+            x
+            async for x in thread_pool.amap(lambda x: (time.sleep(x), x)[1], [0.2, 0.0])
+        ]
+
+    assert asyncio.run(main()) == [0.0, 0.2]
+
+
+def test_amap_exception_cancels_pending():
+    pool = ThreadPool(num_threads=1)
+    result = []
+
+    def work(x):
+        if x == 0:
+            raise ValueError(x)
+        result.append(x)
+
+    async def main():
+        async for _ in pool.amap(work, range(10), max_in_flight=5):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(main())
+    pool.shutdown()
+    assert len(result) < 9
+
+
+def test_enqueue_many(thread_pool):
+    result = []
+    lock = threading.Lock()
+
+    def make_task(i):
+        def task():
+            with lock:
+                result.append(i)
+
+        return task
+
+    thread_pool.enqueue_many(make_task(i) for i in range(100))
+    assert thread_pool.join(timeout=5)
+    assert sorted(result) == list(range(100))
+    assert thread_pool.snapshot()["enqueued"] == 100
+
+
+def test_enqueue_many_bounded_queue():
+    pool = ThreadPool(num_threads=1, max_queue_size=3)
+    gate = threading.Event()
+    result = []
+    pool.enqueue(gate.wait)
+    time.sleep(0.05)
+    with pytest.raises(queue.Full):
+        pool.enqueue_many([lambda: None] * 4, block=False)
+    assert len(pool.tasks) == 0  # nothing is added if the batch does not fit
+    threading.Timer(0.05, gate.set).start()
+    pool.enqueue_many(lambda i=i: result.append(i) for i in range(10))
+    assert pool.join(timeout=5)
+    pool.dispose()
+    assert result == list(range(10))
+
+
+def test_enqueue_many_priority():
+    pool = ThreadPool(num_threads=1, scheduling="priority")
+    gate = threading.Event()
+    order = []
+    pool.enqueue(gate.wait)
+    time.sleep(0.05)
+    pool.enqueue_many([lambda: order.append("low")] * 2, priority=5)
+    pool.enqueue(lambda: order.append("high"), priority=1)
+    gate.set()
+    assert pool.join(timeout=5)
+    pool.dispose()
+    assert order == ["high", "low", "low"]
+
+
+def test_enqueue_many_work_stealing():
+    pool = ThreadPool(num_threads=2, work_stealing=True)
+    result = []
+
+    def parent():
+        pool.enqueue_many(lambda i=i: result.append(i) for i in range(10))
+
+    pool.enqueue(parent)
+    assert pool.join(timeout=5)
+    pool.dispose()
+    assert sorted(result) == list(range(10))
+
+
+def test_batch_size():
+    pool = ThreadPool(num_threads=2, batch_size=8)
+    result = []
+    gate = threading.Event()
+    pool.enqueue_many([gate.wait] * 2)
+    time.sleep(0.05)
+    pool.enqueue_many(lambda i=i: result.append(i) for i in range(100))
+    gate.set()
+    assert pool.join(timeout=5)
+    pool.dispose()
+    assert sorted(result) == list(range(100))
+
+
+def test_batch_size_shutdown_cancels_taken_tasks():
+    pool = ThreadPool(num_threads=1, batch_size=4)
+    gate = threading.Event()
+    futures = [pool.submit(gate.wait)] + [pool.submit(lambda: 1) for _ in range(3)]
+    time.sleep(0.05)
+    threading.Timer(0.05, gate.set).start()
+    pool.dispose()
+    assert futures[0].result(timeout=0)
+    assert all(future.cancelled() for future in futures[1:])
+    with pytest.raises(ValueError):
+        ThreadPool(num_threads=1, batch_size=0)
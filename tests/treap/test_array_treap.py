@@ -0,0 +1,100 @@
+import pytest
+import random
+from collections.abc import MutableMapping
+from project.treap.array_treap import ArrayTreap
+
+
+@pytest.fixture
+def sample_treap():
+    """Creates a test array treap with some elements."""
+    treap = ArrayTreap()
+    treap[10] = "A"
+    treap[20] = "B"
+    treap[5] = "C"
+    treap[15] = "D"
+    return treap
+
+
+@pytest.mark.parametrize(
+    "key,value",
+    [
+        (10, "A"),
+        (20, "B"),
+        (5, "C"),
+        (15, "D"),
+    ],
+)
+def test_getitem(sample_treap, key, value):
+    """Tests retrieving an element by key."""
+    assert sample_treap[key] == value
+
+
+@pytest.mark.parametrize("key", [10, 20, 5, 15])
+def test_delitem(sample_treap, key):
+    """Tests deleting an element from the treap."""
+    del sample_treap[key]
+    assert key not in sample_treap
+    assert len(sample_treap) == 3
+
+
+def test_update_existing_key(sample_treap):
+    """Tests that setting an existing key replaces the value."""
+    sample_treap[10] = "Updated"
+    assert sample_treap[10] == "Updated"
+    assert len(sample_treap) == 4
+
+
+def test_iteration(sample_treap):
+    """Tests forward and reverse traversal of the treap."""
+    assert list(sample_treap) == [5, 10, 15, 20]
+    assert list(reversed(sample_treap)) == [20, 15, 10, 5]
+
+
+def test_key_errors(sample_treap):
+    """Tests KeyError for missing keys."""
+    with pytest.raises(KeyError):
+        _ = sample_treap[100]
+    with pytest.raises(KeyError):
+        del sample_treap[100]
+
+
+def test_mutable_mapping(sample_treap):
+    """Tests that the array treap is a valid MutableMapping."""
+    assert isinstance(sample_treap, MutableMapping)
+    assert dict(sample_treap.items()) == {5: "C", 10: "A", 15: "D", 20: "B"}
+
+
+def test_free_list_reuses_slots(sample_treap):
+    """Tests that deleted slots are reused instead of growing the columns."""
+    capacity = len(sample_treap._keys)
+    del sample_treap[10]
+    del sample_treap[20]
+    sample_treap[30] = "E"
+    sample_treap[40] = "F"
+    assert len(sample_treap._keys) == capacity
+    assert list(sample_treap) == [5, 15, 30, 40]
+
+
+def test_clear(sample_treap):
+    """Tests that clear empties the treap."""
+    sample_treap.clear()
+    assert len(sample_treap) == 0
+    assert list(sample_treap) == []
+
+
+def test_matches_dict():
+    """Tests a random sequence of operations against a dict."""
+    rng = random.Random(42)
+    treap = ArrayTreap()
+    expected = {}
+    for _ in range(2000):
+        key = rng.randint(-100, 100)
+        if rng.random() < 0.3 and key in expected:
+            del treap[key]
+            del expected[key]
+        else:
+            treap[key] = str(key)
+            expected[key] = str(key)
+    assert len(treap) == len(expected)
+    assert list(treap) == sorted(expected)
+    assert all(treap[key] == value for key, value in expected.items())
@@ -0,0 +1,103 @@
+import pytest
+from collections.abc import Mapping
+from project.treap.treap import Treap, Aggregate
+from project.treap.mapped_treap import MappedTreap
+
+
+@pytest.fixture
+def sample_treap():
+    """Creates a test treap with some elements."""
+    return Treap.from_items({10: "A", 20: "B", 5: "C", 15: "D", 7: "ключ"})
+
+
+@pytest.fixture
+def saved_path(sample_treap, tmp_path):
+    """Saves the sample treap and returns the path of the file."""
+    path = str(tmp_path / "treap.bin")
+    sample_treap.save(path)
+    return path
+
+
+def in_order_nodes(node):
+    """Returns (key, priority) pairs of the subtree in sorted order."""
+    if node is None:
+        return []
+    return (
+        in_order_nodes(node.left)
+        + [(node.key, node.priority)]
+        + in_order_nodes(node.right)
+    )
+
+
+def test_load_restores_structure(sample_treap, saved_path):
+    """Tests that loading restores the items and the priorities."""
+    loaded = Treap.load(saved_path)
+    assert isinstance(loaded, Treap)
+    assert dict(loaded.items()) == dict(sample_treap.items())
+    assert in_order_nodes(loaded.root) == in_order_nodes(sample_treap.root)
+    assert loaded.root.key == sample_treap.root.key
+    loaded[30] = "E"
+    assert len(loaded) == 6
+
+
+def test_load_with_aggregate(tmp_path):
+    """Tests loading into a treap with an aggregate."""
+    path = str(tmp_path / "treap.bin")
+    Treap.from_items({1: "a", 2: "bc", 3: "d"}).save(path)
+    loaded = Treap.load(path, aggregate=Aggregate(lambda a, b: a + b, ""))
+    assert loaded.aggregate(2, 3) == "bcd"
+
+
+def test_mapped_load(sample_treap, saved_path):
+    """Tests serving lookups and ranges from the memory-mapped file."""
+    with Treap.load(saved_path, mmap=True) as mapped:
+        assert isinstance(mapped, MappedTreap)
+        assert isinstance(mapped, Mapping)
+        assert len(mapped) == 5
+        assert list(mapped) == [5, 7, 10, 15, 20]
+        assert list(reversed(mapped)) == [20, 15, 10, 7, 5]
+        assert mapped[7] == "ключ"
+        assert dict(mapped.items()) == dict(sample_treap.items())
+        assert 6 not in mapped
+        with pytest.raises(KeyError):
+            _ = mapped[6]
+
+
+@pytest.mark.parametrize(
+    "minimum,maximum,inclusive,reverse,keys",
+    [
+        (None, None, (True, True), False, [5, 7, 10, 15, 20]),
+        (7, 15, (True, True), False, [7, 10, 15]),
+        (7, 15, (False, False), False, [10]),
+        (6, None, (True, True), True, [20, 15, 10, 7]),
+        (21, None, (True, True), False, []),
+    ],
+)
+def test_mapped_irange(saved_path, minimum, maximum, inclusive, reverse, keys):
+    """Tests range iteration over the memory-mapped file."""
+    with MappedTreap(saved_path) as mapped:
+        assert list(mapped.irange(minimum, maximum, inclusive, reverse)) == keys
+
+
+def test_empty_treap(tmp_path):
+    """Tests saving and loading an empty treap."""
+    path = str(tmp_path / "empty.bin")
+    Treap().save(path)
+    assert len(Treap.load(path)) == 0
+    with Treap.load(path, mmap=True) as mapped:
+        assert list(mapped) == []
+
+
+def test_save_rejects_non_str_values(tmp_path):
+    """Tests TypeError for values that cannot be saved."""
+    with pytest.raises(TypeError):
+        Treap.from_items({1: 2}).save(str(tmp_path / "treap.bin"))
+
+
+@pytest.mark.parametrize("content", [b"", b"not a treap file at all, really!"])
+def test_load_rejects_other_files(tmp_path, content):
+    """Tests ValueError for files that are not treap files."""
+    path = tmp_path / "other.bin"
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        Treap.load(str(path))
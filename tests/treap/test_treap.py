@@ -1,6 +1,9 @@
+import operator
 import pytest
+import random
+import threading
 from collections.abc import MutableMapping
-from project.treap.treap import Treap
+from project.treap.treap import Treap, Aggregate, SUM, MIN, MAX, COUNT
 
 
 @pytest.fixture
@@ -153,3 +156,499 @@ def test_remove_existing_elements(sample_treap, key):
     """Tests removing elements from the treap."""
     del sample_treap[key]
     assert key not in sample_treap
+
+
+# tests for subtree sizes and order statistics
+
+
+def check_sizes(node):
+    """Recursively checks the stored subtree sizes and returns the real size."""
+    if node is None:
+        return 0
+    size = 1 + check_sizes(node.left) + check_sizes(node.right)
+    assert node.size == size
+    return size
+
+
+def test_sizes_after_updates(sample_treap):
+    """Tests that subtree sizes stay consistent after inserts and deletes."""
+    for key in range(30, 60):
+        sample_treap[key] = str(key)
+    for key in range(30, 60, 3):
+        del sample_treap[key]
+    sample_treap[10] = "Updated"
+    assert check_sizes(sample_treap.root) == len(sample_treap) == 24
+
+
+@pytest.mark.parametrize(
+    "index,key",
+    [(0, 5), (1, 10), (2, 15), (3, 20), (-1, 20), (-4, 5)],
+)
+def test_select(sample_treap, index, key):
+    """Tests selecting the k-th smallest key."""
+    assert sample_treap.select(index) == key
+
+
+@pytest.mark.parametrize("index", [4, -5])
+def test_select_out_of_range(sample_treap, index):
+    """Tests IndexError for positions outside of the treap."""
+    with pytest.raises(IndexError, match=f"Index {index} out of range"):
+        sample_treap.select(index)
+
+
+@pytest.mark.parametrize(
+    "key,rank",
+    [(1, 0), (5, 0), (6, 1), (15, 2), (20, 3), (100, 4)],
+)
+def test_rank(sample_treap, key, rank):
+    """Tests counting the keys less than a given key."""
+    assert sample_treap.rank(key) == rank
+
+
+@pytest.mark.parametrize(
+    "start,stop,reverse,keys",
+    [
+        (None, None, False, [5, 10, 15, 20]),
+        (1, 3, False, [10, 15]),
+        (1, 3, True, [15, 10]),
+        (-2, None, False, [15, 20]),
+        (None, -3, True, [5]),
+        (3, 1, False, []),
+    ],
+)
+def test_islice(sample_treap, start, stop, reverse, keys):
+    """Tests positional slicing of the keys."""
+    assert list(sample_treap.islice(start, stop, reverse)) == keys
+
+
+# tests for bulk loading
+
+
+def check_treap(node, low=None, high=None):
+    """Recursively checks the search tree and heap properties."""
+    if node is None:
+        return
+    assert low is None or node.key > low
+    assert high is None or node.key < high
+    for child in (node.left, node.right):
+        assert child is None or child.priority <= node.priority
+    check_treap(node.left, low, node.key)
+    check_treap(node.right, node.key, high)
+
+
+def test_from_sorted():
+    """Tests bulk loading from sorted pairs."""
+    treap = Treap.from_sorted((key, str(key)) for key in range(1000))
+    check_treap(treap.root)
+    assert check_sizes(treap.root) == len(treap) == 1000
+    assert list(treap) == list(range(1000))
+    assert treap[500] == "500"
+
+
+def test_from_sorted_empty():
+    """Tests bulk loading from no pairs."""
+    treap = Treap.from_sorted([])
+    assert treap.root is None
+    assert len(treap) == 0
+
+
+@pytest.mark.parametrize("keys", [[1, 3, 2], [1, 2, 2]])
+def test_from_sorted_unsorted_keys(keys):
+    """Tests ValueError for keys not in strictly increasing order."""
+    with pytest.raises(ValueError):
+        Treap.from_sorted((key, "v") for key in keys)
+
+
+def test_from_items():
+    """Tests bulk loading from unsorted pairs with duplicate keys."""
+    treap = Treap.from_items([(15, "D"), (5, "C"), (10, "X"), (20, "B"), (10, "A")])
+    check_treap(treap.root)
+    assert list(treap) == [5, 10, 15, 20]
+    assert treap[10] == "A"
+    treap[12] = "E"
+    del treap[5]
+    assert list(treap) == [10, 12, 15, 20]
+    assert len(treap) == 4
+
+
+def test_sequential_keys_do_not_hit_recursion_limit():
+    """Tests that many sorted inserts and deletes work without recursion."""
+    treap = Treap()
+    for key in range(20000):
+        treap[key] = "v"
+    assert len(treap) == 20000
+    assert list(treap) == list(range(20000))
+    assert next(reversed(treap)) == 19999
+    for key in range(0, 20000, 2):
+        del treap[key]
+    assert check_sizes(treap.root) == len(treap) == 10000
+    assert list(treap.islice(0, 3)) == [1, 3, 5]
+
+
+# tests for range queries
+
+
+@pytest.mark.parametrize(
+    "minimum,maximum,inclusive,reverse,keys",
+    [
+        (None, None, (True, True), False, [5, 10, 15, 20]),
+        (10, 15, (True, True), False, [10, 15]),
+        (10, 15, (False, True), False, [15]),
+        (10, 15, (True, False), False, [10]),
+        (6, 19, (True, True), True, [15, 10]),
+        (None, 12, (True, True), True, [10, 5]),
+        (12, None, (True, True), False, [15, 20]),
+        (21, 30, (True, True), False, []),
+        (15, 10, (True, True), False, []),
+    ],
+)
+def test_irange(sample_treap, minimum, maximum, inclusive, reverse, keys):
+    """Tests iterating over the keys within bounds."""
+    assert list(sample_treap.irange(minimum, maximum, inclusive, reverse)) == keys
+
+
+@pytest.mark.parametrize(
+    "key,floor,ceiling",
+    [(1, None, 5), (5, 5, 5), (12, 10, 15), (20, 20, 20), (25, 20, None)],
+)
+def test_floor_ceiling(sample_treap, key, floor, ceiling):
+    """Tests finding the nearest keys around a given key."""
+    assert sample_treap.floor(key) == floor
+    assert sample_treap.ceiling(key) == ceiling
+
+
+@pytest.mark.parametrize(
+    "key,left,right",
+    [(1, 0, 0), (10, 1, 2), (12, 2, 2), (25, 4, 4)],
+)
+def test_bisect(sample_treap, key, left, right):
+    """Tests the insertion positions of keys."""
+    assert sample_treap.bisect_left(key) == left
+    assert sample_treap.bisect_right(key) == right
+
+
+def test_min_max(sample_treap):
+    """Tests the smallest and the largest keys."""
+    assert sample_treap.min() == 5
+    assert sample_treap.max() == 20
+
+
+def test_pop_min_max(sample_treap):
+    """Tests removing the items with the smallest and the largest keys."""
+    assert sample_treap.pop_min() == (5, "C")
+    assert sample_treap.pop_max() == (20, "B")
+    assert list(sample_treap) == [10, 15]
+    assert check_sizes(sample_treap.root) == 2
+    assert sample_treap.pop_min() == (10, "A")
+    assert sample_treap.pop_max() == (15, "D")
+    assert len(sample_treap) == 0
+
+
+def test_empty_min_max():
+    """Tests errors for the extreme keys of an empty treap."""
+    treap = Treap()
+    with pytest.raises(ValueError):
+        treap.min()
+    with pytest.raises(ValueError):
+        treap.max()
+    with pytest.raises(KeyError):
+        treap.pop_min()
+    with pytest.raises(KeyError):
+        treap.pop_max()
+
+
+# tests for set algebra
+
+
+def random_items(seed, size, low, high):
+    """Returns a dict with random keys in [low, high] and tagged values."""
+    rng = random.Random(seed)
+    return {rng.randint(low, high): f"{seed}:{i}" for i in range(size)}
+
+
+@pytest.mark.parametrize(
+    "first,second",
+    [
+        (random_items(1, 200, 0, 300), random_items(2, 150, 100, 500)),
+        (random_items(3, 20, 0, 1000), random_items(4, 500, 0, 1000)),
+        (random_items(5, 300, 0, 100), {}),
+        ({}, random_items(6, 50, 0, 100)),
+    ],
+)
+def test_set_operations(first, second):
+    """Tests union, intersection and difference against dicts."""
+    other = Treap.from_items(second)
+    expected = {
+        "union": {**first, **second},
+        "intersection": {k: v for k, v in first.items() if k in second},
+        "difference": {k: v for k, v in first.items() if k not in second},
+    }
+    for operation, result in expected.items():
+        treap = Treap.from_items(first)
+        combined = getattr(treap, operation)(other)
+        check_treap(combined.root)
+        assert check_sizes(combined.root) == len(result)
+        assert dict(combined.items()) == result
+        assert dict(treap.items()) == first
+        assert dict(other.items()) == second
+
+
+def nodes(node):
+    """Returns the nodes of a subtree."""
+    return [node] + nodes(node.left) + nodes(node.right) if node else []
+
+
+def test_set_operations_share_nodes():
+    """Tests that a small operand copies only the changed paths of a large one."""
+    large = Treap.from_items((key, "large") for key in range(10_000))
+    small = Treap.from_items([(5, "small"), (20_000, "new")])
+    large_nodes = {id(node) for node in nodes(large.root)}
+    for combined in [large.union(small), large.difference(small)]:
+        copied = [node for node in nodes(combined.root) if id(node) not in large_nodes]
+        assert len(copied) < 200
+
+
+def test_set_operations_are_independent():
+    """Tests that the operands and the result can be modified independently."""
+    first = Treap.from_items((key, "first") for key in range(0, 100, 2))
+    second = Treap.from_items((key, "second") for key in range(0, 100, 3))
+    union = first.union(second)
+    expected = [dict(first.items()), dict(second.items()), dict(union.items())]
+    for treap in [first, second, union]:
+        for key in range(0, 100, 6):
+            treap[key] = "changed"
+        del treap[12]
+        treap.delete_batch(range(30, 40))
+        treap.update_batch((key, "batch") for key in range(50, 60))
+    for treap, items in zip([first, second, union], expected):
+        for key in range(0, 100, 6):
+            items[key] = "changed"
+        del items[12]
+        for key in range(30, 40):
+            items.pop(key, None)
+        items.update((key, "batch") for key in range(50, 60))
+        check_treap(treap.root)
+        assert check_sizes(treap.root) == len(items)
+        assert dict(treap.items()) == items
+
+
+# tests for persistent snapshots
+
+
+def test_snapshot_requires_persistent_mode(sample_treap):
+    """Tests that a regular treap refuses to take snapshots."""
+    with pytest.raises(ValueError):
+        sample_treap.snapshot()
+
+
+def test_snapshot_is_isolated_from_updates():
+    """Tests that every kind of modification leaves snapshots unchanged."""
+    treap = Treap(persistent=True)
+    expected = {key: str(key) for key in range(0, 200, 2)}
+    for key, value in expected.items():
+        treap[key] = value
+    snapshots = []
+
+    def take_snapshot():
+        snapshots.append((treap.snapshot(), dict(treap.items())))
+
+    take_snapshot()
+    for key in range(1, 200, 4):
+        treap[key] = "new"
+    take_snapshot()
+    treap[10] = "updated"
+    del treap[20]
+    take_snapshot()
+    treap.pop_min()
+    treap.pop_max()
+    take_snapshot()
+    treap = treap.union(Treap.from_items((key, "u") for key in range(100, 300, 3)))
+    take_snapshot()
+    treap = treap.intersection(Treap.from_items((key, "i") for key in range(0, 250, 2)))
+    take_snapshot()
+    treap = treap.difference(Treap.from_items((key, "d") for key in range(0, 300, 5)))
+
+    for snapshot, items in snapshots:
+        check_treap(snapshot.root)
+        assert check_sizes(snapshot.root) == len(items)
+        assert dict(snapshot.items()) == items
+    check_treap(treap.root)
+    assert check_sizes(treap.root) == len(treap)
+
+
+def test_snapshot_is_read_only(sample_treap):
+    """Tests that a snapshot exposes the read-only mapping interface."""
+    treap = Treap.from_items(sample_treap)
+    treap.persistent = True
+    snapshot = treap.snapshot()
+    assert not isinstance(snapshot, MutableMapping)
+    assert list(snapshot.irange(6, 20)) == [10, 15, 20]
+    assert snapshot.select(1) == 10
+    with pytest.raises(TypeError):
+        snapshot[1] = "X"
+
+
+def test_snapshot_read_while_writing():
+    """Tests reading a snapshot from another thread while the treap changes."""
+    treap = Treap(persistent=True)
+    for key in range(1000):
+        treap[key] = "v"
+    snapshot = treap.snapshot()
+    results = []
+
+    def reader():
+        for _ in range(20):
+            results.append(list(snapshot) == list(range(1000)))
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    for key in range(1000, 3000):
+        treap[key] = "v"
+        del treap[key - 1000]
+    thread.join()
+    assert all(results)
+    assert list(treap) == list(range(2000, 3000))
+
+
+# tests for batched updates
+
+
+def test_update_batch(sample_treap):
+    """Tests inserting and updating many keys at once."""
+    sample_treap.update_batch([(30, "E"), (10, "X"), (1, "F"), (30, "G")])
+    check_treap(sample_treap.root)
+    assert check_sizes(sample_treap.root) == 6
+    assert dict(sample_treap.items()) == {
+        1: "F",
+        5: "C",
+        10: "X",
+        15: "D",
+        20: "B",
+        30: "G",
+    }
+
+
+def test_delete_batch(sample_treap):
+    """Tests deleting many keys at once, ignoring missing keys."""
+    sample_treap.delete_batch([20, 100, 5, 20])
+    check_treap(sample_treap.root)
+    assert check_sizes(sample_treap.root) == 2
+    assert list(sample_treap) == [10, 15]
+
+
+def test_batches_match_dict():
+    """Tests random batches against a dict."""
+    rng = random.Random(7)
+    treap = Treap()
+    expected = {}
+    for _ in range(20):
+        items = [(rng.randint(0, 2000), str(rng.random())) for _ in range(300)]
+        treap.update_batch(items)
+        expected.update(items)
+        keys = [rng.randint(0, 2000) for _ in range(200)]
+        treap.delete_batch(keys)
+        for key in keys:
+            expected.pop(key, None)
+    check_treap(treap.root)
+    assert check_sizes(treap.root) == len(expected)
+    assert dict(treap.items()) == expected
+
+
+# tests for aggregates
+
+
+def check_aggregates(node, aggregate):
+    """Recursively checks the stored aggregates and returns the real one."""
+    if node is None:
+        return aggregate.identity
+    result = aggregate.combine(
+        aggregate.combine(
+            check_aggregates(node.left, aggregate), aggregate.lift(node.value)
+        ),
+        check_aggregates(node.right, aggregate),
+    )
+    assert node.aggregate == result
+    return result
+
+
+@pytest.fixture
+def sum_treap():
+    """Creates a treap of squares that maintains the sum of values."""
+    treap = Treap(aggregate=SUM)
+    for key in range(20):
+        treap[key] = key * key
+    return treap
+
+
+@pytest.mark.parametrize(
+    "minimum,maximum",
+    [(None, None), (3, 7), (5, 5), (-10, 4), (15, None), (8, 3), (30, 40)],
+)
+def test_aggregate_sum(sum_treap, minimum, maximum):
+    """Tests range sums of values."""
+    low = 0 if minimum is None else max(minimum, 0)
+    high = 19 if maximum is None else min(maximum, 19)
+    expected = sum(key * key for key in range(low, high + 1))
+    assert sum_treap.aggregate(minimum, maximum) == expected
+
+
+def test_aggregate_after_updates(sum_treap):
+    """Tests that aggregates follow every kind of modification."""
+    sum_treap[3] = 1000
+    del sum_treap[4]
+    sum_treap.pop_min()
+    sum_treap.update_batch([(25, 1), (10, 2)])
+    sum_treap.delete_batch([11, 12])
+    sum_treap = sum_treap.union(Treap.from_items([(13, 7), (40, 5)]))
+    sum_treap.delete_batch([15, 99])
+    check_aggregates(sum_treap.root, SUM)
+    expected = {key: sum_treap[key] for key in sum_treap}
+    assert sum_treap.aggregate() == sum(expected.values())
+    assert sum_treap.aggregate(3, 13) == sum(
+        value for key, value in expected.items() if 3 <= key <= 13
+    )
+
+
+def test_aggregate_ignores_removed_key_values():
+    """Tests that trees that only provide keys do not lift their values."""
+    floats = Aggregate(operator.add, 0.0, float)
+    treap = Treap.from_items(((key, str(key)) for key in range(10)), aggregate=floats)
+    treap.delete_batch([2, 7, 20])
+    names = Treap.from_items([(3, "three"), (5, None), (11, "x")])
+    difference = treap.difference(names)
+    intersection = treap.intersection(names)
+    for result, keys in [
+        (treap, {0, 1, 3, 4, 5, 6, 8, 9}),
+        (difference, {0, 1, 4, 6, 8, 9}),
+        (intersection, {3, 5}),
+    ]:
+        check_aggregates(result.root, floats)
+        assert result.aggregate() == float(sum(keys))
+
+
+@pytest.mark.parametrize(
+    "aggregate,expected",
+    [(MIN, 16), (MAX, 100), (COUNT, 7)],
+)
+def test_aggregate_kinds(sum_treap, aggregate, expected):
+    """Tests the predefined aggregates."""
+    treap = Treap.from_items(sum_treap, aggregate=aggregate)
+    assert treap.aggregate(4, 10) == expected
+
+
+def test_aggregate_is_ordered():
+    """Tests that a non-commutative aggregate combines values in key order."""
+    concat = Aggregate(lambda a, b: a + b, "")
+    treap = Treap(persistent=True, aggregate=concat)
+    for key in [5, 1, 4, 2, 3]:
+        treap[key] = str(key)
+    snapshot = treap.snapshot()
+    treap[6] = "6"
+    assert treap.aggregate(2) == "23456"
+    assert snapshot.aggregate(None, 4) == "1234"
+
+
+def test_aggregate_requires_aggregate(sample_treap):
+    """Tests ValueError for a treap created without an aggregate."""
+    with pytest.raises(ValueError):
+        sample_treap.aggregate()